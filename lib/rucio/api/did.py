@@ -90,9 +90,11 @@ def add_dids(dids, issuer):
     :param dids: A list of dids.
     :param issuer: The issuer account.
     """
-    kwargs = {'issuer': issuer, 'dids': dids}
-    if not rucio.api.permission.has_permission(issuer=issuer, action='add_dids', kwargs=kwargs):
-        raise rucio.common.exception.AccessDenied('Account %s can not bulk add data identifier' % (issuer))
+    kwargs_list = [{'issuer': issuer, 'dids': [d]} for d in dids] or [{'issuer': issuer, 'dids': dids}]
+    decisions = rucio.api.permission.has_permissions(issuer=issuer, action='add_dids', kwargs_list=kwargs_list)
+    if not all(decisions):
+        denied = ['%s:%s' % (d.get('scope'), d.get('name')) for d, allowed in zip(dids, decisions) if not allowed]
+        raise rucio.common.exception.AccessDenied('Account %s can not bulk add data identifier %s' % (issuer, ', '.join(denied)))
 
     return did.add_dids(dids, account=issuer)
 
@@ -124,8 +126,11 @@ def attach_dids_to_dids(attachments, issuer, ignore_duplicate=False):
     """
     validate_schema(name='attachments', obj=attachments)
 
-    if not rucio.api.permission.has_permission(issuer=issuer, action='attach_dids_to_dids', kwargs={'attachments': attachments}):
-        raise rucio.common.exception.AccessDenied('Account %s can not add data identifiers' % (issuer))
+    kwargs_list = [{'attachments': [attachment]} for attachment in attachments] or [{'attachments': attachments}]
+    decisions = rucio.api.permission.has_permissions(issuer=issuer, action='attach_dids_to_dids', kwargs_list=kwargs_list)
+    if not all(decisions):
+        denied = ['%s:%s' % (a['scope'], a['name']) for a, allowed in zip(attachments, decisions) if not allowed]
+        raise rucio.common.exception.AccessDenied('Account %s can not add data identifiers to %s' % (issuer, ', '.join(denied)))
 
     return did.attach_dids_to_dids(attachments=attachments, account=issuer,
                                    ignore_duplicate=ignore_duplicate)
@@ -253,6 +258,15 @@ def get_metadata(scope, name):
     return did.get_metadata(scope=scope, name=name)
 
 
+def get_metadata_bulk(dids):
+    """
+    Get metadata for a list of data identifiers
+
+    :param dids: A list of dids (dictionaries with scope and name).
+    """
+    return did.get_metadata_bulk(dids=dids)
+
+
 def set_status(scope, name, issuer, **kwargs):
     """
     Set data identifier status
@@ -26,3 +26,16 @@ def has_permission(issuer, action, kwargs):
     :returns: True if account is allowed to call the API call, otherwise False
     """
     return permission.has_permission(issuer=issuer, action=action, kwargs=kwargs)
+
+
+def has_permissions(issuer, action, kwargs_list):
+    """
+    Checks if an account has the specified permission to
+    execute an action with each set of parameters.
+
+    :param issuer: The Account issuer.
+    :param action: The action (API call) called by the account.
+    :param kwargs_list: List of arguments for the action, one per item.
+    :returns: List of True/False, one per item.
+    """
+    return permission.has_permissions(issuer=issuer, action=action, kwargs_list=kwargs_list)
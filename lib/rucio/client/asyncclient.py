@@ -0,0 +1,223 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Client class issuing concurrent requests to the Rucio system
+
+The requests of the client methods run in a bounded pool of worker threads
+sharing the pooled connections and the token of one HTTP session. submit
+returns a future of one call, map and stream run many calls of a method with
+at most max_workers requests in flight and yield their results as they
+complete, streaming bounded by buffer_size items waiting to be consumed.
+"""
+
+import threading
+
+from collections import deque
+from itertools import islice
+from Queue import Queue, Full
+from types import GeneratorType
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+
+from rucio.client.client import Client
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_BUFFER_SIZE = 1000
+
+
+class AsyncClient(Client):
+
+    """Client class running the requests of the Rucio client methods concurrently."""
+
+    def __init__(self, rucio_host=None, auth_host=None, account=None, ca_cert=None, auth_type=None, creds=None, timeout=None, user_agent='rucio-clients', max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Constructor for the concurrent Rucio client class.
+
+        :param rucio_host: the host of the rucio system.
+        :param auth_host: the host of the rucio authentication server.
+        :param account: the rucio account that should be used to interact with the rucio system.
+        :param ca_cert: the certificate to verify the server.
+        :param auth_type: the type of authentication to use (e.g. userpass, x509 ...)
+        :param creds: credentials needed for authentication.
+        :param timeout: Float describes the timeout of the request (in seconds).
+        :param max_workers: the maximum number of concurrent requests, and of pooled connections per host.
+        """
+        self.max_workers = max_workers
+        super(AsyncClient, self).__init__(rucio_host=rucio_host, auth_host=auth_host, account=account, ca_cert=ca_cert, auth_type=auth_type, creds=creds, timeout=timeout, user_agent=user_agent)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Waits for the pending requests and closes the worker threads and the connections.
+        """
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def _new_session(self):
+        """
+        Returns a new HTTP session keeping up to max_workers connections per host.
+        """
+        new_session = super(AsyncClient, self)._new_session()
+        adapter = HTTPAdapter(pool_maxsize=self.max_workers)
+        new_session.mount('http://', adapter)
+        new_session.mount('https://', adapter)
+        return new_session
+
+    def __call(self, method, args, kwargs):
+        result = getattr(self, method)(*args, **kwargs)
+        if isinstance(result, GeneratorType):
+            result = list(result)
+        return result
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Calls a client method in a worker thread.
+
+        :param method: the name of the client method, e.g. get_metadata.
+        :param args: the positional arguments of the method.
+        :param kwargs: the keyword arguments of the method.
+        :returns: a future of the result, a list for the methods returning generators.
+        """
+        return self.executor.submit(self.__call, method, args, kwargs)
+
+    def map(self, method, calls, ordered=True, return_exceptions=False):
+        """
+        Calls a client method concurrently, with at most max_workers calls in flight.
+
+        :param method: the name of the client method, e.g. get_metadata.
+        :param calls: an iterable of the keyword arguments of every call, consumed as the calls complete.
+        :param ordered: yield the results in the order of the calls, else as soon as they complete.
+        :param return_exceptions: yield the exception of a failed call as its result instead of raising it.
+        :returns: a generator of (call, result) tuples, the result being a list for the methods returning generators.
+        """
+        calls = iter(calls)
+        pending = deque()
+        try:
+            for call in islice(calls, self.max_workers):
+                pending.append((call, self.submit(method, **call)))
+            while pending:
+                if ordered:
+                    call, future = pending.popleft()
+                else:
+                    done = wait([future for _, future in pending], return_when=FIRST_COMPLETED)[0]
+                    call, future = next((call, future) for call, future in pending if future in done)
+                    pending.remove((call, future))
+                for next_call in islice(calls, 1):
+                    pending.append((next_call, self.submit(method, **next_call)))
+                error = future.exception()
+                if error is not None and not return_exceptions:
+                    raise error
+                yield call, error if error is not None else future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def stream(self, method, calls, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Calls a client method returning a generator concurrently, with at most max_workers calls in flight,
+        and yields the items as they are received. The workers wait while buffer_size items are not consumed.
+
+        :param method: the name of the client method, e.g. list_replicas.
+        :param calls: an iterable of the keyword arguments of every call, consumed as the calls complete.
+        :param buffer_size: the maximum number of received items waiting to be consumed.
+        :returns: a generator of (call, item) tuples.
+        """
+        items = Queue(maxsize=buffer_size)
+        stopped = threading.Event()
+        done = object()
+
+        def put(entry):
+            while not stopped.is_set():
+                try:
+                    items.put(entry, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def produce(call):
+            try:
+                for item in getattr(self, method)(**call):
+                    if not put((call, item, None)):
+                        return
+            except Exception as error:
+                put((call, done, error))
+            else:
+                put((call, done, None))
+
+        calls = iter(calls)
+        running = 0
+        try:
+            for call in islice(calls, self.max_workers):
+                self.executor.submit(produce, call)
+                running += 1
+            while running:
+                call, item, error = items.get()
+                if item is not done:
+                    yield call, item
+                    continue
+                running -= 1
+                if error is not None:
+                    raise error
+                for next_call in islice(calls, 1):
+                    self.executor.submit(produce, next_call)
+                    running += 1
+        finally:
+            stopped.set()
+
+    def get_metadata_bulk(self, dids, ordered=True):
+        """
+        Gets the metadata of many data identifiers concurrently.
+
+        :param dids: an iterable of data identifiers like {'scope': <scope>, 'name': <name>}.
+        :param ordered: yield the metadata in the order of the dids, else as soon as they are received.
+        :returns: a generator of (did, metadata) tuples.
+        """
+        calls = ({'scope': did['scope'], 'name': did['name']} for did in dids)
+        return self.map('get_metadata', calls, ordered=ordered)
+
+    def list_files_bulk(self, dids, long=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        """
+        Lists the files of many data identifiers concurrently.
+
+        :param dids: an iterable of data identifiers like {'scope': <scope>, 'name': <name>}.
+        :param long: A boolean to choose if GUID is returned or not.
+        :param buffer_size: the maximum number of received files waiting to be consumed.
+        :returns: a generator of (did, file) tuples.
+        """
+        calls = ({'scope': did['scope'], 'name': did['name'], 'long': long} for did in dids)
+        for call, item in self.stream('list_files', calls, buffer_size=buffer_size):
+            yield {'scope': call['scope'], 'name': call['name']}, item
+
+    def list_replicas_bulk(self, dids, chunk_size=100, buffer_size=DEFAULT_BUFFER_SIZE, **kwargs):
+        """
+        Lists the file replicas of many data identifiers concurrently, in calls of list_replicas of chunk_size dids.
+
+        :param dids: an iterable of data identifiers like {'scope': <scope>, 'name': <name>}.
+        :param chunk_size: the number of dids listed by one call.
+        :param buffer_size: the maximum number of received replicas waiting to be consumed.
+        :param kwargs: the other arguments of list_replicas, e.g. schemes or rse_expression.
+        :returns: a generator of the dictionaries with replica information.
+        """
+        def chunks():
+            iterator = iter(dids)
+            chunk = list(islice(iterator, chunk_size))
+            while chunk:
+                call = dict(kwargs, dids=chunk)
+                yield call
+                chunk = list(islice(iterator, chunk_size))
+
+        for _, item in self.stream('list_replicas', chunks(), buffer_size=buffer_size):
+            yield item
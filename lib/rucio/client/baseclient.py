@@ -33,19 +33,21 @@ from __future__ import print_function
 import imp
 import random
 import sys
+import threading
 
 from rucio.common import exception
 from rucio.common.config import config_get
 from rucio.common.exception import (CannotAuthenticate, ClientProtocolNotSupported,
                                     NoAuthInformation, MissingClientParameter,
                                     MissingModuleException)
-from rucio.common.utils import build_url, get_tmp_dir, my_key_generator, parse_response, ssh_sign
+from rucio.common.utils import build_url, get_tmp_dir, parse_response, ssh_sign
 from rucio import version
 
 from logging import getLogger, StreamHandler, ERROR
 from os import environ, fdopen, path, makedirs, geteuid
 from shutil import move
 from tempfile import mkstemp
+from time import sleep, time
 try:
     # Python 2
     from urlparse import urlparse
@@ -54,7 +56,6 @@ except ImportError:
     # Python 3
     from urllib.parse import urlparse
     from configparser import NoOptionError, NoSectionError
-from dogpile.cache import make_region
 from requests import session
 from requests.status_codes import codes, _codes
 from requests.exceptions import ConnectionError
@@ -81,21 +82,24 @@ SH.setLevel(ERROR)
 LOG.addHandler(SH)
 
 
-REGION = make_region(function_key_generator=my_key_generator).configure(
-    'dogpile.cache.memory',
-    expiration_time=60,
-)
+# hosts -> (chosen host, expiration time), a dict rather than a dogpile region, which is slow to import
+HOST_CHOICES = {}
+HOST_CHOICE_EXPIRATION_TIME = 60
 
 
-@REGION.cache_on_arguments(namespace='host_to_choose')
 def choice(hosts):
     """
-    Select randomly a host
+    Select randomly a host, and keep it for the next 60 seconds
 
     :param hosts: Lost of hosts
     :return: A randomly selected host.
     """
-    return random.choice(hosts)
+    key = tuple(hosts)
+    host, expiration_time = HOST_CHOICES.get(key, (None, 0))
+    if time() >= expiration_time:
+        host = random.choice(hosts)
+        HOST_CHOICES[key] = (host, time() + HOST_CHOICE_EXPIRATION_TIME)
+    return host
 
 
 class BaseClient(object):
@@ -103,6 +107,7 @@ class BaseClient(object):
     """Main client class for accessing Rucio resources. Handles the authentication."""
 
     AUTH_RETRIES, REQUEST_RETRIES = 2, 3
+    UNAVAILABLE_WAIT, UNAVAILABLE_MAX_WAIT = 1, 30  # seconds
     TOKEN_PATH_PREFIX = get_tmp_dir() + '/.rucio_'
     TOKEN_PREFIX = 'auth_token_'
 
@@ -124,7 +129,8 @@ class BaseClient(object):
         self.host = rucio_host
         self.list_hosts = []
         self.auth_host = auth_host
-        self.session = session()
+        self.session = self._new_session()
+        self.token_lock = threading.Lock()
         self.user_agent = "%s/%s" % (user_agent, version.version_string())  # e.g. "rucio-clients/0.2.13"
         sys.argv[0] = sys.argv[0].split('/')[-1]
         self.script_id = '::'.join(sys.argv[0:2])
@@ -274,9 +280,38 @@ class BaseClient(object):
         else:  # Exception ?
             yield response.text
 
+    def _new_session(self):
+        """
+        Returns a new HTTP session, also used after an unauthorized error.
+        """
+        return session()
+
     def _send_request(self, url, headers=None, type='GET', data=None, params=None):
         """
         Helper method to send requests to the rucio server. Gets a new token and retries if an unauthorized error is returned.
+        Retries up to request_retries times with an exponential backoff if the server is unavailable.
+
+        :param url: the http url to use.
+        :param headers: additional http headers to send.
+        :param type: the http request type to use.
+        :param data: post data.
+        :param params: (optional) Dictionary or bytes to be sent in the url query string.
+        :return: the HTTP return body.
+        """
+        for retry in range(self.request_retries + 1):
+            result = self.__send_request(url, headers=headers, type=type, data=data, params=params)
+            if result is None or result.status_code != codes.service_unavailable or retry == self.request_retries:  # pylint: disable-msg=E1101
+                return result
+            try:
+                wait = float(result.headers['Retry-After'])
+            except (KeyError, ValueError):
+                wait = random.uniform(0, min(self.UNAVAILABLE_MAX_WAIT, self.UNAVAILABLE_WAIT * 2 ** retry))
+            LOG.warning('Server unavailable, retrying in %.1f seconds' % wait)
+            sleep(wait)
+
+    def __send_request(self, url, headers=None, type='GET', data=None, params=None):
+        """
+        Sends a request to the rucio server once, or again with a new token if an unauthorized error is returned.
 
         :param url: the http url to use.
         :param headers: additional http headers to send.
@@ -313,8 +348,11 @@ class BaseClient(object):
                 continue
 
             if result is not None and result.status_code == codes.unauthorized:  # pylint: disable-msg=E1101
-                self.session = session()
-                self.__get_token()
+                with self.token_lock:
+                    # The token may have been renewed meanwhile by a concurrent request
+                    if hds['X-Rucio-Auth-Token'] == self.auth_token:
+                        self.session = self._new_session()
+                        self.__get_token()
                 hds['X-Rucio-Auth-Token'] = self.auth_token
             else:
                 break
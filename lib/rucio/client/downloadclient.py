@@ -27,9 +27,10 @@ import requests
 import json
 import socket
 import signal
+import xml.etree.ElementTree as ET
 
 from rucio.client.baseclient import BaseClient
-from rucio.common.exception import FileConsistencyMismatch, RSEProtocolNotSupported, RSENotFound, RucioException
+from rucio.common.exception import FileConsistencyMismatch, RSEProtocolNotSupported, RSENotFound, RucioException, ServiceUnavailable
 from rucio.common.utils import sizefmt
 from rucio.common.utils import generate_uuid
 
@@ -48,6 +49,8 @@ FAILURE = 1
 DEFAULT_SECURE_PORT = 443
 DEFAULT_PORT = 80
 
+METALINK_NS = '{urn:ietf:params:xml:ns:metalink}'
+
 
 class DownloadClient(BaseClient):
     """ This class cover all functionality related to file uploads into Rucio."""
@@ -63,7 +66,13 @@ class DownloadClient(BaseClient):
         self.trace_taskid = os.environ.get('RUCIO_TRACE_TASKID', None),
         self.trace_usrdn = os.environ.get('RUCIO_TRACE_USRDN', None)
 
-    def download(self, dids, rse, protocol='srm', pfn=None, nrandom=None, nprocs=None, user_agent='rucio_clients', dir='.', no_subd=False):
+    def download(self, dids, rse, protocol='srm', pfn=None, nrandom=None, nprocs=None, user_agent='rucio_clients', dir='.', no_subd=False, sort=None, nsegments=None):
+        """
+        Download the files of the given dids.
+
+        :param sort: Try the replicas of each file in this order (geoip, closeness, ...) instead of randomly.
+        :param nsegments: Download large files in up to nsegments parallel byte ranges where the protocol supports it.
+        """
 
         trace_endpoint = client.host
         trace_pattern = {'hostname': socket.getfqdn(),
@@ -141,10 +150,17 @@ class DownloadClient(BaseClient):
                     return FAILURE
 
                 try:
-                    files_with_replicas = client.list_replicas([arg_did],
-                                                               schemes=None,
-                                                               rse_expression=rse_expression,
-                                                               metalink=None)
+                    if sort:
+                        files_with_replicas = self._parse_metalink(client.list_replicas([arg_did],
+                                                                                        schemes=None,
+                                                                                        rse_expression=rse_expression,
+                                                                                        metalink=True,
+                                                                                        sort=sort))
+                    else:
+                        files_with_replicas = client.list_replicas([arg_did],
+                                                                   schemes=None,
+                                                                   rse_expression=rse_expression,
+                                                                   metalink=None)
                 except:
                     logger.error('Failed to get list of files with their replicas for DID %s' % arg_didstr)
                     return FAILURE
@@ -221,7 +237,7 @@ class DownloadClient(BaseClient):
                     input_queue.put(f)
 
         try:
-            self.download_rucio(pfn, protocol, input_queue, output_queue, trace_pattern, trace_endpoint, nprocs, user_agent, dir, no_subd)
+            self.download_rucio(pfn, protocol, input_queue, output_queue, trace_pattern, trace_endpoint, nprocs, user_agent, dir, no_subd, nsegments)
         except Exception as error:
             logger.error('Exception during download: %s' % str(error))
 
@@ -246,7 +262,7 @@ class DownloadClient(BaseClient):
             except Empty:
                 break
 
-    def download_rucio(self, pfn, protocol, input_queue, output_queue, trace_pattern, trace_endpoint, ndownloader, user_agent, dir='.', no_subdir=False):
+    def download_rucio(self, pfn, protocol, input_queue, output_queue, trace_pattern, trace_endpoint, ndownloader, user_agent, dir='.', no_subdir=False, nsegments=None):
 
         total_workers = 1
         if ndownloader and not pfn:
@@ -270,7 +286,8 @@ class DownloadClient(BaseClient):
                       'threadnb': worker + 1,
                       'total_threads': total_workers,
                       'trace_endpoint': trace_endpoint,
-                      'trace_pattern': trace_pattern}
+                      'trace_pattern': trace_pattern,
+                      'nsegments': nsegments}
             try:
                 thread = Thread(target=self._downloader, kwargs=kwargs)
                 thread.start()
@@ -288,7 +305,7 @@ class DownloadClient(BaseClient):
                 thread.kill_received = True
         logger.debug('All threads finished')
 
-    def _downloader(self, pfn, protocol, human, input_queue, output_queue, user_agent, threadnb, total_threads, trace_endpoint, trace_pattern):
+    def _downloader(self, pfn, protocol, human, input_queue, output_queue, user_agent, threadnb, total_threads, trace_endpoint, trace_pattern, nsegments=None):
 
         rse_dict = {}
         thread_prefix = 'Thread %s/%s' % (threadnb, total_threads)
@@ -308,6 +325,7 @@ class DownloadClient(BaseClient):
             dlfile['name'] = file_name
             dlfile['scope'] = file_scope
             dlfile['adler32'] = file['adler32']
+            dlfile['bytes'] = file['bytes']
             ignore_checksum = True if pfn else False
             if pfn:
                 dlfile['pfn'] = pfn
@@ -327,7 +345,14 @@ class DownloadClient(BaseClient):
                 self.send_trace(trace, trace_endpoint, user_agent)
                 input_queue.task_done()
                 continue
-            random.shuffle(rses)
+            if file.get('sources'):
+                # sorted replicas are popped from the end
+                rses = []
+                for rse_name, _ in file['sources']:
+                    if rse_name not in rses:
+                        rses.insert(0, rse_name)
+            else:
+                random.shuffle(rses)
 
             logger.debug('%s : Potential sources : %s' % (thread_prefix, str(rses)))
             success = False
@@ -384,7 +409,8 @@ class DownloadClient(BaseClient):
                                             files=[dlfile],
                                             dest_dir=dest_dir,
                                             force_scheme=protocol_retry['scheme'],
-                                            ignore_checksum=ignore_checksum)
+                                            ignore_checksum=ignore_checksum,
+                                            segments=nsegments or 1)
 
                             trace['transferEnd'] = time.time()
                             trace['clientState'] = 'DONE'
@@ -412,6 +438,12 @@ class DownloadClient(BaseClient):
                                 logger.debug('%s : %s' % (thread_prefix, str(error)))
                             trace['clientState'] = 'FAIL_VALIDATE'
                             logger.debug('%s : Failed attempt %s/%s' % (thread_prefix, attempt, retries))
+                        except ServiceUnavailable as error:
+                            # the source is unreachable or stalled, continue with the next one
+                            logger.warning(str(error))
+                            trace['clientState'] = str(type(error).__name__)
+                            logger.debug('%s : Failed attempt %s/%s, trying the next source' % (thread_prefix, attempt, retries))
+                            break
                         except Exception as error:
                             logger.warning(str(error))
                             trace['clientState'] = str(type(error).__name__)
@@ -434,6 +466,32 @@ class DownloadClient(BaseClient):
 
             input_queue.task_done()
 
+    def _parse_metalink(self, metalink):
+        """
+        Convert a metalink document of replicas into the dictionaries returned by list_replicas.
+
+        The sources of each file are kept in the order of their priority in 'sources'.
+
+        :param metalink: The metalink4+xml document.
+        :returns: A list of dictionaries with replica information.
+        """
+        files = []
+        for file_element in ET.fromstring(metalink.encode('utf-8')).findall(METALINK_NS + 'file'):
+            scope, name = file_element.findtext(METALINK_NS + 'identity').split(':', 1)
+            file = {'scope': scope, 'name': name, 'adler32': None, 'md5': None,
+                    'bytes': int(file_element.findtext(METALINK_NS + 'size')),
+                    'pfns': {}, 'rses': {}, 'sources': []}
+            for hash_element in file_element.findall(METALINK_NS + 'hash'):
+                file[hash_element.get('type')] = hash_element.text
+            urls = sorted(file_element.findall(METALINK_NS + 'url'), key=lambda url: int(url.get('priority')))
+            for url in urls:
+                rse_name, replica = url.get('location'), url.text
+                file['sources'].append((rse_name, replica))
+                file['pfns'][replica] = {'rse': rse_name}
+                file['rses'].setdefault(rse_name, []).append(replica)
+            files.append(file)
+        return files
+
     def extract_scope(self, did):
         # Try to extract the scope from the DSN
         if did.find(':') > -1:
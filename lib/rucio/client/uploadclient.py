@@ -28,11 +28,15 @@ import socket
 import logging
 import time
 
+from Queue import Queue, Empty
+from threading import Thread
+
 from rucio.client.client import Client
 from rucio.common.exception import (RucioException, RSEBlacklisted, DataIdentifierAlreadyExists,
                                     DataIdentifierNotFound, ServiceUnavailable,
-                                    ResourceTemporaryUnavailable, InputValidationError)
-from rucio.common.utils import adler32, execute, generate_uuid, md5, send_trace
+                                    ResourceTemporaryUnavailable, InputValidationError,
+                                    NotAllFilesUploaded)
+from rucio.common.utils import calculate_checksums, calculate_checksums_parallel, execute, generate_uuid, send_trace
 from rucio.rse import rsemanager as rsemgr
 from rucio import version
 
@@ -77,15 +81,16 @@ class UploadClient:
             guid = generate_uuid()
         return guid
 
-    def collect_file_info(self, filepath, settings):
+    def collect_file_info(self, filepath, settings, checksums=None):
         file = copy.deepcopy(settings)
         file['path'] = filepath
         file['dirname'] = os.path.dirname(filepath)
         file['basename'] = os.path.basename(filepath)
 
         file['bytes'] = os.stat(filepath).st_size
-        file['adler32'] = adler32(filepath)
-        file['md5'] = md5(filepath)
+        checksums = checksums or calculate_checksums(filepath, algorithms=('adler32', 'md5'))
+        file['adler32'] = checksums['adler32']
+        file['md5'] = checksums['md5']
         file['meta'] = {'guid': self.get_file_guid(file)}
         file['state'] = 'C'
         file.setdefault('did_scope', self.default_file_scope)
@@ -94,8 +99,10 @@ class UploadClient:
 
         return file
 
-    def collect_and_validate_file_info(self, sources_with_settings):
+    def collect_and_validate_file_info(self, sources_with_settings, compute_checksums=True):
         logger = self.logger
+        # without compute_checksums the checksums are left to the upload workers
+        no_checksums = None if compute_checksums else {'adler32': None, 'md5': None}
         files = []
         for settings in sources_with_settings:
             path = settings.get('path')
@@ -119,15 +126,18 @@ class UploadClient:
 
             if os.path.isdir(path):
                 dname, subdirs, fnames = os.walk(path).next()
-                for fname in fnames:
-                    file = self.collect_file_info(os.path.join(dname, fname), settings)
+                filepaths = [os.path.join(dname, fname) for fname in fnames]
+                if compute_checksums:
+                    checksums = calculate_checksums_parallel(filepaths, algorithms=('adler32', 'md5'))
+                for filepath in filepaths:
+                    file = self.collect_file_info(filepath, settings, checksums=checksums[filepath] if compute_checksums else no_checksums)
                     files.append(file)
                 if not len(fnames) and not len(subdirs):
                     logger.warning('Skipping %s because it is empty.' % dname)
                 elif not len(fnames):
                     logger.warning('Skipping %s because it has no files in it. Subdirectories are not supported.' % dname)
             elif os.path.isfile(path):
-                file = self.collect_file_info(path, settings)
+                file = self.collect_file_info(path, settings, checksums=no_checksums)
                 files.append(file)
             else:
                 logger.warning('No such file or directory: %s' % path)
@@ -148,7 +158,7 @@ class UploadClient:
         replica['state'] = file['state']
         return replica
 
-    def upload(self, sources_with_settings, summary_file_path=None):
+    def upload(self, sources_with_settings, summary_file_path=None, threads=1):
         """
         List of dictionaries of file descriptions. None means optional
         [{'path': 'file1',
@@ -173,15 +183,19 @@ class UploadClient:
           'no_register': None,
           'lifetime': None }]
 
+        With more than one thread the files are checksummed and transferred by a pool
+        of worker threads while the transferred files are registered in bulk.
+
           raises InputValidationError
           raises RSEBlacklisted
+          raises NotAllFilesUploaded (only with more than one thread)
         """
         logger = self.logger
 
         self.trace['uuid'] = generate_uuid()
 
         # check given sources, resolve dirs into files, and collect meta infos
-        files = self.collect_and_validate_file_info(sources_with_settings)
+        files = self.collect_and_validate_file_info(sources_with_settings, compute_checksums=threads <= 1)
 
         # check if RSE of every file is available for writing
         # and cache rse settings
@@ -207,15 +221,17 @@ class UploadClient:
         if len(wrong_dids):
             raise InputValidationError('DIDs used to address both files and datasets: %s' % str(wrong_dids))
 
+        if threads > 1:
+            return self._upload_pipelined(files, threads, summary_file_path)
+
         # clear this set again to ensure that we only try to register datasets once
         registered_dataset_dids = set()
+        summary = []
         for file in files:
             basename = file['basename']
             logger.info('Preparing upload for file %s' % basename)
 
             no_register = file.get('no_register')
-            pfn = file.get('pfn')
-            scheme = file.get('scheme')
 
             self.trace['scope'] = file['did_scope']
             self.trace['datasetScope'] = file.get('dataset_scope', '')
@@ -235,18 +251,7 @@ class UploadClient:
             # register a dataset if we need to
             if dataset_did_str and dataset_did_str not in registered_dataset_dids and not no_register:
                 registered_dataset_dids.add(dataset_did_str)
-                try:
-                    self.client.add_dataset(scope=file['dataset_scope'],
-                                            name=file['dataset_name'],
-                                            rules=[{'account': self.account,
-                                                    'copies': 1,
-                                                    'rse_expression': rse,
-                                                    'grouping': 'DATASET',
-                                                    'lifetime': file['lifetime']}])
-                    logger.info('Dataset %s successfully created' % dataset_did_str)
-                except DataIdentifierAlreadyExists:
-                    # TODO: Need to check the rules thing!!
-                    logger.info("Dataset %s already exists" % dataset_did_str)
+                self._register_dataset(file)
 
             replica_for_api = self.convert_file_for_api(file)
             try:
@@ -273,40 +278,7 @@ class UploadClient:
 
             # if file already exists on RSE we're done
             if not rsemgr.exists(rse_settings, file_did):
-                protocols = rsemgr.get_protocols_ordered(rse_settings=rse_settings, operation='write', scheme=scheme)
-                protocols.reverse()
-                success = False
-                summary = []
-                while not success and len(protocols):
-                    protocol = protocols.pop()
-                    logger.info('Trying upload to %s with protocol %s' % (rse, protocol['scheme']))
-                    lfn = {}
-                    lfn['filename'] = file['basename']
-                    lfn['scope'] = file['did_scope']
-                    lfn['name'] = file['did_name']
-                    lfn['adler32'] = file['adler32']
-                    lfn['filesize'] = file['bytes']
-
-                    self.trace['protocol'] = protocol['scheme']
-                    self.trace['transferStart'] = time.time()
-                    try:
-                        state = rsemgr.upload(rse_settings=rse_settings,
-                                              lfns=lfn,
-                                              source_dir=file['dirname'],
-                                              force_scheme=protocol['scheme'],
-                                              force_pfn=pfn)
-                        success = True
-                        file['upload_result'] = state
-                    except (ServiceUnavailable, ResourceTemporaryUnavailable) as error:
-                        logger.warning('Upload attempt failed')
-                        logger.debug('Exception: %s' % str(error))
-
-                if success:
-                    self.trace['transferEnd'] = time.time()
-                    self.trace['clientState'] = 'DONE'
-                    file['state'] = 'A'
-                    logger.info('File %s successfully uploaded' % basename)
-                    send_trace(self.trace, self.client.host, self.user_agent, logger=logger)
+                if self._transfer_file(file, rse_settings, self.trace):
                     if summary_file_path:
                         summary.append(copy.deepcopy(file))
                 else:
@@ -331,18 +303,314 @@ class UploadClient:
                 self.client.update_replicas_states(rse, files=[replica_for_api])
 
         if summary_file_path:
-            final_summary = {}
-            for file in summary:
-                file_scope = file['did_scope']
-                file_name = file['did_name']
-                file_did_str = '%s:%s' % (file_scope, file_name)
-                final_summary[file_did_str] = {'scope': file['scope'],
-                                               'name': file['name'],
-                                               'bytes': file['bytes'],
-                                               'rse': file['rse'],
-                                               'pfn': file['upload_result']['pfn'],
-                                               'guid': file['meta']['guid'],
-                                               'adler32': file['adler32'],
-                                               'md5': file['md5']}
-            with open(summary_file_path, 'wb') as summary_file:
-                json.dump(final_summary, summary_file, sort_keys=True, indent=1)
+            self._write_summary(summary, summary_file_path)
+
+    def _register_dataset(self, file):
+        """
+        Register the dataset of a file with a rule on the RSE of the file.
+
+        :param file: The file description.
+        """
+        dataset_did_str = file['dataset_did_str']
+        try:
+            self.client.add_dataset(scope=file['dataset_scope'],
+                                    name=file['dataset_name'],
+                                    rules=[{'account': self.account,
+                                            'copies': 1,
+                                            'rse_expression': file['rse'],
+                                            'grouping': 'DATASET',
+                                            'lifetime': file['lifetime']}])
+            self.logger.info('Dataset %s successfully created' % dataset_did_str)
+        except DataIdentifierAlreadyExists:
+            # TODO: Need to check the rules thing!!
+            self.logger.info("Dataset %s already exists" % dataset_did_str)
+
+    def _transfer_file(self, file, rse_settings, trace):
+        """
+        Upload a file to its RSE, trying the write protocols of the RSE in order.
+
+        :param file: The file description, updated with the upload result and state.
+        :param rse_settings: The RSE settings from rsemanager.
+        :param trace: The trace to send on success.
+        :returns: True if the file has been uploaded, False otherwise.
+        """
+        logger = self.logger
+        rse = file['rse']
+        protocols = rsemgr.get_protocols_ordered(rse_settings=rse_settings, operation='write', scheme=file.get('scheme'))
+        protocols.reverse()
+        success = False
+        while not success and len(protocols):
+            protocol = protocols.pop()
+            logger.info('Trying upload to %s with protocol %s' % (rse, protocol['scheme']))
+            lfn = {}
+            lfn['filename'] = file['basename']
+            lfn['scope'] = file['did_scope']
+            lfn['name'] = file['did_name']
+            lfn['adler32'] = file['adler32']
+            lfn['filesize'] = file['bytes']
+
+            trace['protocol'] = protocol['scheme']
+            trace['transferStart'] = time.time()
+            try:
+                state = rsemgr.upload(rse_settings=rse_settings,
+                                      lfns=lfn,
+                                      source_dir=file['dirname'],
+                                      force_scheme=protocol['scheme'],
+                                      force_pfn=file.get('pfn'))
+                success = True
+                file['upload_result'] = state
+            except (ServiceUnavailable, ResourceTemporaryUnavailable) as error:
+                logger.warning('Upload attempt failed')
+                logger.debug('Exception: %s' % str(error))
+
+        if success:
+            trace['transferEnd'] = time.time()
+            trace['clientState'] = 'DONE'
+            file['state'] = 'A'
+            logger.info('File %s successfully uploaded' % file['basename'])
+            send_trace(trace, self.client.host, self.user_agent, logger=logger)
+        return success
+
+    def _upload_pipelined(self, files, threads, summary_file_path=None, batch_size=100):
+        """
+        Upload files with a pool of worker threads and register them in bulk.
+
+        The workers checksum, check and transfer the files while the calling thread
+        registers the transferred files, one batch of up to batch_size files at a time.
+
+        :param files: The file descriptions from collect_and_validate_file_info.
+        :param threads: The number of worker threads.
+        :param summary_file_path: The path of the json summary of the uploaded files.
+        :param batch_size: The maximum number of files registered at once.
+        raises NotAllFilesUploaded
+        """
+        logger = self.logger
+
+        # datasets are registered first so that the workers never wait for them
+        registered_dataset_dids = set()
+        for file in files:
+            dataset_did_str = file.get('dataset_did_str')
+            if dataset_did_str and dataset_did_str not in registered_dataset_dids and not file.get('no_register'):
+                registered_dataset_dids.add(dataset_did_str)
+                self._register_dataset(file)
+
+        input_queue = Queue()
+        output_queue = Queue()
+        for file in files:
+            input_queue.put(file)
+
+        total_workers = min(threads, len(files))
+        logger.debug('Starting %d upload threads' % total_workers)
+        for worker in range(total_workers):
+            kwargs = {'input_queue': input_queue,
+                      'output_queue': output_queue,
+                      'threadnb': worker + 1,
+                      'total_threads': total_workers}
+            thread = Thread(target=self._uploader, kwargs=kwargs)
+            thread.daemon = True
+            thread.start()
+
+        # register whatever has been transferred whenever the workers are busy
+        summary, failed, batch = [], [], []
+        pending = len(files)
+        while pending or batch:
+            try:
+                file = output_queue.get_nowait()
+            except Empty:
+                if batch:
+                    failed.extend(self._register_files(batch))
+                    summary.extend(file for file in batch if 'upload_result' in file and not file.get('error'))
+                    batch = []
+                    continue
+                file = output_queue.get()
+
+            pending -= 1
+            if file.get('error'):
+                failed.append(file)
+            elif file.get('no_register'):
+                if 'upload_result' in file:
+                    summary.append(file)
+            else:
+                batch.append(file)
+                if len(batch) >= batch_size:
+                    failed.extend(self._register_files(batch))
+                    summary.extend(file for file in batch if 'upload_result' in file and not file.get('error'))
+                    batch = []
+
+        if summary_file_path:
+            self._write_summary(summary, summary_file_path)
+
+        if failed:
+            for file in failed:
+                logger.error('Failed to upload file %s: %s' % (file['basename'], file['error']))
+            raise NotAllFilesUploaded('%s of %s files failed: %s' % (len(failed), len(files),
+                                                                     ', '.join('%s:%s' % (file['did_scope'], file['did_name']) for file in failed)))
+
+    def _uploader(self, input_queue, output_queue, threadnb, total_threads):
+        """
+        Upload worker: checksum, check and transfer files until the input queue is empty.
+
+        Every file is put on the output queue, with the key 'error' set if it failed.
+        """
+        logger = self.logger
+        thread_prefix = 'Thread %s/%s' % (threadnb, total_threads)
+        while True:
+            try:
+                file = input_queue.get_nowait()
+            except Empty:
+                return
+
+            try:
+                basename = file['basename']
+                logger.info('%s : Preparing upload for file %s' % (thread_prefix, basename))
+                file_did = {'scope': file['did_scope'], 'name': file['did_name']}
+                rse_settings = self.rses[file['rse']]
+
+                if not file['adler32']:
+                    checksums = calculate_checksums(file['path'], algorithms=('adler32', 'md5'))
+                    file['adler32'] = checksums['adler32']
+                    file['md5'] = checksums['md5']
+
+                # if the remote checksum is different this did must not be used
+                file['registered_rses'] = None
+                try:
+                    meta = self.client.get_metadata(file['did_scope'], file['did_name'])
+                    if meta['adler32'] != file['adler32']:
+                        raise DataIdentifierAlreadyExists('Local checksum %s does not match remote checksum %s' % (file['adler32'], meta['adler32']))
+                    replicas = list(self.client.list_replicas([file_did], all_states=True))
+                    file['registered_rses'] = replicas[0]['rses'] if replicas else {}
+                except DataIdentifierNotFound:
+                    pass
+
+                # if file already exists on RSE we're done
+                if rsemgr.exists(rse_settings, file_did):
+                    logger.info('%s : File already exists on RSE. Skipped upload' % thread_prefix)
+                    # nothing will be transferred, a new replica is registered as available
+                    file['state'] = 'A'
+                else:
+                    trace = copy.deepcopy(self.trace)
+                    trace['scope'] = file['did_scope']
+                    trace['datasetScope'] = file.get('dataset_scope', '')
+                    trace['dataset'] = file.get('dataset_name', '')
+                    trace['remoteSite'] = file['rse']
+                    trace['filesize'] = file['bytes']
+                    if not self._transfer_file(file, rse_settings, trace):
+                        file['error'] = 'all protocols failed'
+            except Exception as error:
+                logger.debug('%s : %s' % (thread_prefix, str(error)))
+                file['error'] = str(error) or error.__class__.__name__
+            output_queue.put(file)
+
+    def _register_files(self, files):
+        """
+        Register transferred files with one call per RSE, rule and dataset.
+
+        A failed bulk call is repeated file by file to find the files it failed for.
+
+        :param files: The file descriptions from the upload workers.
+        :returns: The files which could not be registered, with the key 'error' set.
+        """
+        logger = self.logger
+        new_replicas, states, rules, attachments = {}, {}, {}, {}
+        for file in files:
+            rse = file['rse']
+            replica = self.convert_file_for_api(file)
+            if file['registered_rses'] is None or rse not in file['registered_rses']:
+                new_replicas.setdefault(rse, []).append((file, replica))
+            else:
+                states.setdefault(rse, []).append((file, replica))
+            file_did = {'scope': file['did_scope'], 'name': file['did_name']}
+            if file.get('dataset_did_str'):
+                attachments.setdefault((file['dataset_scope'], file['dataset_name']), []).append((file, file_did))
+            elif file['registered_rses'] is None:
+                # only need to add rules for files if no dataset is given
+                rules.setdefault((rse, file['lifetime']), []).append((file, file_did))
+
+        for rse, replicas in new_replicas.items():
+            logger.info('Adding %s replicas at %s in Rucio catalog' % (len(replicas), rse))
+            for file, error in self._bulk_call(lambda items: self.client.add_replicas(rse=rse, files=items), replicas):
+                # a file transferred by this upload must not stay on the RSE without a replica in the catalog
+                if 'upload_result' in file:
+                    self._delete_transferred_file(file)
+        for (rse, lifetime), dids in rules.items():
+            logger.info('Adding replication rule at %s for %s files' % (rse, len(dids)))
+            self._bulk_call(lambda items: self.client.add_replication_rule(items, copies=1, rse_expression=rse, lifetime=lifetime),
+                            [(file, did) for file, did in dids if not file.get('error')])
+        for (dataset_scope, dataset_name), dids in attachments.items():
+            logger.info('Attaching %s files to dataset %s:%s' % (len(dids), dataset_scope, dataset_name))
+            for file, error in self._bulk_call(lambda items: self.client.attach_dids(dataset_scope, dataset_name, items),
+                                               [(file, did) for file, did in dids if not file.get('error')], fatal=False):
+                logger.warning('Failed to attach file %s to the dataset' % file['basename'])
+                logger.warning(error)
+        for rse, replicas in states.items():
+            logger.info('Setting %s replica states to available at %s' % (len(replicas), rse))
+            self._bulk_call(lambda items: self.client.update_replicas_states(rse, files=items), replicas)
+
+        return [file for file in files if file.get('error')]
+
+    def _delete_transferred_file(self, file):
+        """
+        Delete an uploaded file from its RSE, logging the error if that fails.
+
+        :param file: The file description.
+        """
+        logger = self.logger
+        logger.info('Deleting file %s from %s as it could not be registered' % (file['basename'], file['rse']))
+        try:
+            rsemgr.delete(self.rses[file['rse']], {'scope': file['did_scope'], 'name': file['did_name']})
+            del file['upload_result']
+        except Exception as error:
+            logger.error('Failed to delete file %s from %s: %s' % (file['basename'], file['rse'], str(error)))
+
+    def _bulk_call(self, call, items, fatal=True):
+        """
+        Call a client method with all items at once, or item by item if that fails.
+
+        :param call: Function taking a list of items.
+        :param items: List of (file, item) tuples.
+        :param fatal: Set the key 'error' of the files the call failed for.
+        :returns: List of (file, exception) tuples the call failed for.
+        """
+        if not items:
+            return []
+        try:
+            call([item for _, item in items])
+            return []
+        except Exception as error:
+            if len(items) == 1:
+                failures = [(items[0][0], error)]
+            else:
+                self.logger.debug('Bulk call failed, retrying file by file: %s' % str(error))
+                failures = []
+                for file, item in items:
+                    try:
+                        call([item])
+                    except Exception as error:
+                        failures.append((file, error))
+        if fatal:
+            for file, error in failures:
+                file['error'] = str(error) or error.__class__.__name__
+        return failures
+
+    def _write_summary(self, summary, summary_file_path):
+        """
+        Write the json summary of the uploaded files.
+
+        :param summary: The file descriptions of the uploaded files.
+        :param summary_file_path: The path of the summary file.
+        """
+        final_summary = {}
+        for file in summary:
+            file_scope = file['did_scope']
+            file_name = file['did_name']
+            file_did_str = '%s:%s' % (file_scope, file_name)
+            final_summary[file_did_str] = {'scope': file_scope,
+                                           'name': file_name,
+                                           'bytes': file['bytes'],
+                                           'rse': file['rse'],
+                                           'pfn': file['upload_result']['pfn'],
+                                           'guid': file['meta']['guid'],
+                                           'adler32': file['adler32'],
+                                           'md5': file['md5']}
+        with open(summary_file_path, 'wb') as summary_file:
+            json.dump(final_summary, summary_file, sort_keys=True, indent=1)
@@ -0,0 +1,323 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Two-tier dogpile cache regions.
+
+Every region has a bounded LRU tier with a short expiration time inside the
+process, in front of the distributed tier shared by all processes (memcached,
+or a plain in-memory backend with [cache] backend = memory, e.g. for tests).
+
+The keys of a region are prefixed with its generation, kept in the configs
+table and polled by every process at most every [cache] poll_interval seconds.
+Invalidating a region bumps its generation, which drops its values in all
+processes at once, so the expiration times can be long.
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+
+from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.proxy import ProxyBackend
+
+from rucio.common.config import config_get
+from rucio.common.utils import generate_uuid
+
+CACHE_URL = config_get('cache', 'url', raise_exception=False, default='127.0.0.1:11211')
+CACHE_BACKEND = config_get('cache', 'backend', raise_exception=False, default='memcached')
+LOCAL_SIZE = int(config_get('cache', 'local_size', raise_exception=False, default=1000))
+LOCAL_EXPIRATION_TIME = int(config_get('cache', 'local_expiration_time', raise_exception=False, default=60))
+POLL_INTERVAL = int(config_get('cache', 'poll_interval', raise_exception=False, default=10))
+
+GENERATION_SECTION = 'cache_generation'
+
+REGIONS = {}
+REGIONS_LOCK = threading.Lock()
+
+PENDING = 'cache_pending'  # Key of the callbacks waiting for the commit in the info of a session
+LISTENING = False
+
+
+class Generations(object):
+    """
+    Generations of the regions, shared by all processes through the configs table.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        """
+        :param poll_interval: Seconds between two reads of the generations from the database.
+        """
+        self.poll_interval = poll_interval
+        self.__values = {}
+        self.__polled = 0
+        self.__lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Current generation of a region, read again from the database if the last poll is too old.
+
+        :param name: Name of the region.
+        :returns: The generation.
+        """
+        if time.time() - self.__polled >= self.poll_interval and self.__lock.acquire(False):
+            try:
+                self.poll()
+            finally:
+                self.__lock.release()
+        return self.__values.get(name, '0')
+
+    def poll(self):
+        """ Read the generations of all regions from the database. """
+        from rucio.core.config import items
+        self.__polled = time.time()
+        try:
+            self.__values.update((name, str(value)) for name, value in items(GENERATION_SECTION))
+        except Exception:
+            pass  # Without database, e.g. in tools, the generations known so far are kept
+
+    def bump(self, name, session=None):
+        """
+        Give a region a new generation. Once the session is committed, it is used at once
+        in this process, and by the other processes after their next poll.
+
+        :param name: Name of the region.
+        :param session: The database session in use.
+        """
+        from rucio.core.config import set as config_set
+        generation = generate_uuid()
+        config_set(GENERATION_SECTION, name, generation, session=session)
+        if session is None:  # Already committed by config_set
+            self.__values[name] = generation
+        else:
+            # Before the commit, other threads would cache the old values under the new generation
+            after_commit(session, lambda: self.__values.__setitem__(name, generation))
+
+
+GENERATIONS = Generations()
+
+
+def after_commit(session, callback):
+    """
+    Call a function once the transaction of a session is committed, and drop it if the transaction is rolled back.
+
+    :param session: The database session in use.
+    :param callback: The function, called without arguments.
+    """
+    global LISTENING
+    if not LISTENING:
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        with REGIONS_LOCK:
+            if not LISTENING:
+                event.listen(Session, 'after_commit', __commit_pending)
+                event.listen(Session, 'after_soft_rollback', __rollback_pending)
+                LISTENING = True
+    session.info.setdefault(PENDING, []).append(callback)
+
+
+def __commit_pending(session):
+    if session.transaction is not None and session.transaction.nested:
+        return  # Only a savepoint
+    for callback in session.info.pop(PENDING, []):
+        callback()
+
+
+def __rollback_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(PENDING, None)
+
+
+class LRUCache(object):
+    """
+    Bounded, thread-safe LRU cache with an expiration time, kept in the process.
+    """
+
+    def __init__(self, size, expiration_time):
+        """
+        :param size: Maximum number of values kept.
+        :param expiration_time: Default seconds a value is kept.
+        """
+        self.size = size
+        self.expiration_time = expiration_time
+        self.__values = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: The key.
+        :returns: The value, or NO_VALUE if not cached or expired.
+        """
+        with self.__lock:
+            entry = self.__values.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                self.__values[key] = entry
+                return entry[1]
+        return NO_VALUE
+
+    def set(self, key, value, expiration_time=None):
+        """
+        :param key: The key.
+        :param value: The value.
+        :param expiration_time: Seconds the value is kept, if not the default.
+        """
+        with self.__lock:
+            self.__values.pop(key, None)
+            self.__values[key] = (time.time() + (self.expiration_time if expiration_time is None else expiration_time), value)
+            while len(self.__values) > self.size:
+                self.__values.popitem(last=False)
+
+    def delete(self, keys):
+        """
+        :param keys: List of keys.
+        """
+        with self.__lock:
+            for key in keys:
+                self.__values.pop(key, None)
+
+    def clear(self):
+        """ Drop all values. """
+        with self.__lock:
+            self.__values.clear()
+
+    def __len__(self):
+        return len(self.__values)
+
+
+class LocalCache(ProxyBackend):
+    """
+    Bounded LRU tier with an expiration time, kept in the process in front of the backend of a region.
+    """
+
+    def __init__(self, size=LOCAL_SIZE, expiration_time=LOCAL_EXPIRATION_TIME, generation=None):
+        """
+        :param size: Maximum number of values kept in the process.
+        :param expiration_time: Seconds a value is served from the process without asking the backend.
+        :param generation: Optional function returning the current generation, used as prefix of the keys.
+        """
+        super(LocalCache, self).__init__()
+        self.generation = generation
+        self.stats = {'local_hits': 0, 'hits': 0, 'misses': 0}
+        self.__values = LRUCache(size, expiration_time)
+        self.__lock = threading.Lock()
+
+    def __keys(self, keys):
+        if self.generation is None:
+            return keys
+        generation = self.generation()
+        return ['%s:%s' % (generation, key) for key in keys]
+
+    def __lookup(self, key):
+        value = self.__values.get(key)
+        if value is not NO_VALUE:
+            with self.__lock:
+                self.stats['local_hits'] += 1
+        return value
+
+    def __count(self, value):
+        with self.__lock:
+            self.stats['misses' if value is NO_VALUE else 'hits'] += 1
+
+    def get(self, key):
+        return self.get_multi([key])[0]
+
+    def get_multi(self, keys):
+        keys = self.__keys(keys)
+        values = [self.__lookup(key) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is NO_VALUE]
+        if missing:
+            fetched = dict(zip(missing, self.proxied.get_multi(missing)))
+            for key, value in fetched.items():
+                self.__count(value)
+                if value is not NO_VALUE:
+                    self.__values.set(key, value)
+            values = [fetched.get(key, value) for key, value in zip(keys, values)]
+        return values
+
+    def set(self, key, value):
+        self.set_multi({key: value})
+
+    def set_multi(self, mapping):
+        mapping = dict(zip(self.__keys(mapping.keys()), mapping.values()))
+        self.proxied.set_multi(mapping)
+        for key, value in mapping.items():
+            self.__values.set(key, value)
+
+    def delete(self, key):
+        self.delete_multi([key])
+
+    def delete_multi(self, keys):
+        keys = self.__keys(keys)
+        self.proxied.delete_multi(keys)
+        self.__values.delete(keys)
+
+    def clear(self):
+        """ Drop all values kept in the process. """
+        self.__values.clear()
+
+
+def make_region_memcached(name, expiration_time=3600, function_key_generator=None, local_size=LOCAL_SIZE, local_expiration_time=LOCAL_EXPIRATION_TIME, backend=None):
+    """
+    Make a two-tier cache region with a local tier in front of memcached.
+
+    :param name: Name of the region, for invalidation and statistics.
+    :param expiration_time: Expiration time of the values in seconds.
+    :param function_key_generator: Key generator for cache_on_arguments.
+    :param local_size: Maximum number of values kept in the process.
+    :param local_expiration_time: Seconds a value is served from the process without asking memcached.
+    :param backend: 'memcached' or 'memory', defaults to [cache] backend.
+    :returns: The dogpile region.
+    """
+    local = LocalCache(size=local_size, expiration_time=min(local_expiration_time, expiration_time),
+                       generation=lambda: GENERATIONS.get(name))
+    kwargs = {'function_key_generator': function_key_generator} if function_key_generator else {}
+    if (backend or CACHE_BACKEND) == 'memory':
+        region = make_region(**kwargs).configure('dogpile.cache.memory',
+                                                 expiration_time=expiration_time,
+                                                 wrap=[local])
+    else:
+        region = make_region(**kwargs).configure('dogpile.cache.memcached',
+                                                 expiration_time=expiration_time,
+                                                 arguments={'url': CACHE_URL, 'distributed_lock': True},
+                                                 wrap=[local])
+    region.local_cache = local
+    with REGIONS_LOCK:
+        REGIONS[name] = region
+    return region
+
+
+def invalidate(name, keys=None, session=None):
+    """
+    Invalidate cached values of a region, to be called by the write paths.
+
+    With keys, the values are deleted from both tiers, the local tiers of the other
+    processes keep them until their local expiration. Without, the generation of the
+    region is bumped, which invalidates it in all processes, even those not using it yet.
+
+    :param name: Name of the region.
+    :param keys: Optional list of keys.
+    :param session: The database session in use.
+    """
+    region = REGIONS.get(name)
+    if keys:
+        if region is not None:
+            region.delete_multi(keys)
+        return
+    GENERATIONS.bump(name, session=session)
+    if region is not None:
+        region.local_cache.clear()
+
+
+def cache_stats():
+    """
+    Hit and miss counters of all regions.
+
+    :returns: Dictionary {region: {'local_hits', 'hits', 'misses'}}.
+    """
+    return dict((name, dict(region.local_cache.stats)) for name, region in REGIONS.items())
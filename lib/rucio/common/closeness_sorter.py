@@ -18,25 +18,17 @@ import random
 import traceback
 import urllib2
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 from hashlib import sha256
 
+from rucio.common.cache import make_region_memcached
 from rucio.core import request as request_core
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+REGION = make_region_memcached('closeness', expiration_time=3600)
 
-REGION_SHORT = make_region().configure('dogpile.cache.memcached',
-                                       expiration_time=600,
-                                       arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+REGION_SHORT = make_region_memcached('closeness_short', expiration_time=600)
 
 
-# for local test
-# region = make_region().configure('dogpile.cache.memory',
-#                                  expiration_time=3600)
-
 BIGGEST_DISTANCE = 9999
 
 
@@ -19,9 +19,13 @@
 
 from rucio.common import config
 
+import Queue
+import base64
+import binascii
 import contextlib
 import datetime
 import gzip
+import hashlib
 import json
 import logging
 import magic
@@ -30,6 +34,8 @@ import re
 import requests
 import sys
 import tempfile
+import threading
+import zlib
 
 try:
     import gfal2
@@ -116,6 +122,10 @@ def get_requests_session():
 DUMPS_CACHE_DIR = 'cache'
 RESULTS_DIR = 'results'
 CHUNK_SIZE = 4194304  # 4MiB
+SEGMENT_SIZE = 67108864  # 64MiB
+DOWNLOAD_THREADS = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 60  # seconds to connect, and without receiving data
 
 
 # There are two Python modules with the name `magic`, luckily both do
@@ -283,17 +293,19 @@ def ddmendpoint_url(ddmendpoint):
 #     return 'srm://{hostname}:{port}/{prefix}'.format(pdata)
 
 
-def http_download_to_file(url, file_, session=None):
+def http_download_to_file(url, file_, session=None, timeout=None):
     '''
     Download the file in `url` storing it in the `file_` file-like
     object.
     If given `session` must be a requests.Session instance, and will be
     used to download the file, otherwise requests.get() will be used.
+    If given `timeout` is passed to the request.
     '''
+    kwargs = {} if timeout is None else {'timeout': timeout}
     if session is None:
-        response = requests.get(url, stream=True)
+        response = requests.get(url, stream=True, **kwargs)
     else:
-        response = session.get(url)
+        response = session.get(url, **kwargs)
 
     if response.status_code != 200:
         logging.error(
@@ -307,6 +319,325 @@ def http_download_to_file(url, file_, session=None):
         file_.write(chunk)
 
 
+class DumpWriter(object):
+    '''
+    File-like object wrapping `file_` which computes the size, MD5 and
+    Adler-32 of the bytes written to it and, if `decompress` is True and
+    the stream starts with a gzip or bzip2 header, writes the decompressed
+    data to `file_` instead of the raw bytes.
+
+    The checksums and the size always refer to the raw (possibly
+    compressed) stream, as published by the storage.
+    '''
+    def __init__(self, file_, decompress=True):
+        self.file_ = file_
+        self.decompress = decompress
+        self.size = 0
+        self._md5 = hashlib.md5()
+        self._adler32 = 1
+        self._decompressor = None
+        self._new_decompressor = None
+        self._head = ''
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        self._md5.update(chunk)
+        self._adler32 = zlib.adler32(chunk, self._adler32)
+
+        if self._new_decompressor is None and self.decompress:
+            # Wait for enough bytes to identify the compression format
+            self._head += chunk
+            if len(self._head) < 3:
+                return
+            chunk, self._head = self._head, ''
+            if chunk.startswith('\x1f\x8b'):
+                self._new_decompressor = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+            elif chunk.startswith('BZh'):
+                self._new_decompressor = bz2file.BZ2Decompressor
+            else:
+                self.decompress = False
+            if self.decompress:
+                self._decompressor = self._new_decompressor()
+
+        if self._decompressor is None:
+            self.file_.write(chunk)
+            return
+
+        # gzip and bzip2 files may contain several concatenated streams
+        while chunk:
+            try:
+                self.file_.write(self._decompressor.decompress(chunk))
+            except EOFError:
+                # The previous bzip2 stream ended exactly at the end of the previous chunk
+                self._decompressor = self._new_decompressor()
+                continue
+            chunk = self._decompressor.unused_data
+            if chunk:
+                self._decompressor = self._new_decompressor()
+
+    def close(self):
+        if self._head:
+            self.file_.write(self._head)
+            self._head = ''
+        if hasattr(self._decompressor, 'flush'):
+            self.file_.write(self._decompressor.flush())
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    @property
+    def adler32(self):
+        return '%08x' % (self._adler32 & 0xffffffff)
+
+    def verify(self, url, size=None, md5=None, adler32=None):
+        '''
+        Raises HTTPDownloadFailed if the data written doesn't match the
+        given `size`, `md5` or `adler32`.
+        '''
+        for name, expected, actual in (('size', size, self.size),
+                                       ('md5', md5, self.md5),
+                                       ('adler32', adler32, self.adler32)):
+            if expected is not None and str(expected).lower() != str(actual):
+                raise HTTPDownloadFailed('Downloading {0}: {1} mismatch, expected {2} got {3}'.format(url, name, expected, actual))
+
+
+def http_checksums(headers):
+    '''
+    Returns the (md5, adler32) of the body announced in the `headers` of
+    a response by a Digest (RFC 3230) or Content-MD5 header, or by a
+    strong ETag made of an MD5 alone, with None for those not announced.
+    '''
+    md5 = adler32 = None
+    for digest in headers.get('digest', '').split(','):
+        algorithm, _, value = digest.strip().partition('=')
+        algorithm = algorithm.lower()
+        if algorithm == 'md5' and value:
+            md5 = _b64_to_hex(value)
+        elif algorithm == 'adler32' and value:
+            adler32 = value.lower().zfill(8)
+    if md5 is None and headers.get('content-md5'):
+        md5 = _b64_to_hex(headers['content-md5'])
+    if md5 is None and re.match(r'^"[0-9a-fA-F]{32}"$', headers.get('etag', '')):
+        md5 = headers['etag'].strip('"').lower()
+    return md5, adler32
+
+
+def _b64_to_hex(value):
+    try:
+        digest = base64.b64decode(value)
+    except TypeError:
+        digest = ''
+    if len(digest) != 16:
+        logging.warning('Ignoring the invalid MD5 %s', value)
+        return None
+    return binascii.hexlify(digest)
+
+
+def _load_download_state(state_path, url, size, validator):
+    '''
+    Returns the per-segment progress stored in `state_path` if it belongs
+    to the same version of the file in `url`, else an empty dict.
+    '''
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if state.get('url') != url or state.get('size') != size or state.get('validator') != validator:
+        return {}
+    return dict((int(idx), done) for idx, done in state['done'].items())
+
+
+def _save_download_state(state_path, url, size, validator, done):
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump({'url': url, 'size': size, 'validator': validator, 'done': done}, f)
+    os.rename(state_path + '.tmp', state_path)
+
+
+def _download_segments(url, part_path, state_path, session, segments, done, size, validator, threads, retries):
+    '''
+    Generator downloading `segments` (list of (start, end) tuples) of `url`
+    into `part_path` with `threads` parallel Range requests. Yields the
+    segments in order as soon as each one is complete so the caller can
+    consume the file while the following segments are still in flight.
+    '''
+    logger = logging.getLogger('dumper.__init__')
+    lock = threading.Lock()
+    finished = [threading.Event() for _ in segments]
+    aborted = threading.Event()
+    errors = {}
+    failures = []
+    pending = Queue.Queue()
+    for idx in range(len(segments)):
+        pending.put(idx)
+
+    def download_segment(part, idx):
+        start, end = segments[idx]
+        for attempt in range(retries + 1):
+            offset = start + done.get(idx, 0)
+            if offset > end:
+                break
+            try:
+                response = session.get(url, headers={'Range': 'bytes={0}-{1}'.format(offset, end)}, stream=True,
+                                       timeout=DOWNLOAD_TIMEOUT)
+                if response.status_code != 206:
+                    raise HTTPDownloadFailed('Error downloading range of ' + url, response.status_code)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if aborted.is_set():
+                        return
+                    part.seek(offset)
+                    part.write(chunk)
+                    offset += len(chunk)
+                    with lock:
+                        done[idx] = offset - start
+                        _save_download_state(state_path, url, size, validator, done)
+            except (requests.exceptions.RequestException, HTTPDownloadFailed) as error:
+                logger.warning('Segment %d of %s failed (attempt %d): %s', idx, url, attempt + 1, error)
+                errors[idx] = error
+            else:
+                errors.pop(idx, None)
+        else:
+            if start + done.get(idx, 0) <= end:
+                errors.setdefault(idx, HTTPDownloadFailed('Incomplete segment {0} of {1}'.format(idx, url)))
+        part.flush()
+
+    def fail(error):
+        # Any other error, e.g. a full disk, stops all the workers and the consumer
+        logger.error('Downloading %s failed: %s', url, error)
+        failures.append(error)
+        aborted.set()
+
+    def worker():
+        try:
+            with open(part_path, 'r+b') as part:
+                while not aborted.is_set():
+                    try:
+                        idx = pending.get_nowait()
+                    except Queue.Empty:
+                        return
+                    try:
+                        download_segment(part, idx)
+                    except Exception as error:
+                        fail(error)
+                        return
+                    finally:
+                        finished[idx].set()
+        except Exception as error:
+            fail(error)
+
+    workers = [threading.Thread(target=worker) for _ in range(min(threads, len(segments)))]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for idx, segment in enumerate(segments):
+            while not finished[idx].is_set() and not failures:
+                finished[idx].wait(1)
+            if failures:
+                raise failures[0]
+            if idx in errors:
+                raise errors[idx]
+            yield segment
+    finally:
+        aborted.set()
+        for thread in workers:
+            thread.join()
+
+
+def http_parallel_download(url, directory, final_name, session=None, threads=DOWNLOAD_THREADS,
+                           segment_size=SEGMENT_SIZE, retries=DOWNLOAD_RETRIES, md5=None,
+                           adler32=None, decompress=True):
+    '''
+    Download the file in `url` into `directory`/`final_name` using
+    `threads` parallel HTTP Range requests of `segment_size` bytes.
+
+    The raw data is kept in `final_name`.part together with a
+    `final_name`.part.state progress file, so an interrupted download
+    resumes where it stopped on the next call. The segments are streamed,
+    in order, through a DumpWriter as soon as they are available: gzip and
+    bzip2 dumps are stored decompressed and the size, `md5` and `adler32`
+    of the raw data are verified before the final file is created. The
+    checksums not given are taken from the response of the server, see
+    http_checksums(), and only verified if the server announces them.
+
+    If the server doesn't announce the file size or range support the
+    file is downloaded with a single GET request.
+
+    :returns: the path to the downloaded file.
+    '''
+    logger = logging.getLogger('dumper.__init__')
+    if session is None:
+        session = requests.Session()
+        session.stream = True
+
+    path = os.path.join(directory, final_name)
+    part_path = path + '.part'
+    state_path = part_path + '.state'
+
+    response = session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+    if response.status_code != 200:
+        logger.error('Retrieving %s returned %d status code', url, response.status_code)
+        raise HTTPDownloadFailed('Error downloading ' + url, response.status_code)
+    if response.url and response.url != url:
+        # The ranges are requested from the location the dump was redirected to
+        logger.debug('%s redirected to %s', url, response.url)
+        url = response.url
+
+    size = int(response.headers.get('content-length', 0))
+    validator = response.headers.get('etag', response.headers.get('last-modified'))
+    ranged = response.headers.get('accept-ranges', '').lower() == 'bytes' and size > 0
+    server_md5, server_adler32 = http_checksums(response.headers)
+    md5 = md5 or server_md5
+    adler32 = adler32 or server_adler32
+    if md5 is None and adler32 is None:
+        logger.debug('No checksum announced for %s, only its size is verified', url)
+
+    with temp_file(directory, final_name=final_name) as (tfile, _):
+        writer = DumpWriter(tfile, decompress=decompress)
+        if not ranged:
+            logger.debug('%s does not support ranged requests, using a single stream', url)
+            http_download_to_file(url, writer, session=session, timeout=DOWNLOAD_TIMEOUT)
+            writer.close()
+            writer.verify(url, size=size or None, md5=md5, adler32=adler32)
+            return path
+
+        done = _load_download_state(state_path, url, size, validator)
+        if not done and os.path.exists(part_path):
+            os.unlink(part_path)
+        with open(part_path, 'ab') as part:
+            part.truncate(size)
+
+        segments = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+        logger.debug('Downloading %s in %d segments (%d already complete)', url, len(segments),
+                     sum(1 for idx, (start, end) in enumerate(segments) if start + done.get(idx, 0) > end))
+
+        with open(part_path, 'rb') as part:
+            for start, end in _download_segments(url, part_path, state_path, session, segments, done,
+                                                 size, validator, threads, retries):
+                part.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = part.read(min(CHUNK_SIZE, remaining))
+                    writer.write(chunk)
+                    remaining -= len(chunk)
+        writer.close()
+
+        try:
+            writer.verify(url, size=size, md5=md5, adler32=adler32)
+        except HTTPDownloadFailed:
+            # Corrupted data must not be resumed
+            os.unlink(part_path)
+            os.unlink(state_path)
+            raise
+
+    os.unlink(part_path)
+    if os.path.exists(state_path):
+        os.unlink(state_path)
+    return path
+
+
 def http_download(url, filename):
     '''
     Download the file in `url` storing it in the path given by `filename`.
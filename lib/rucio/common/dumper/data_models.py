@@ -20,12 +20,11 @@ import os
 import re
 import tabulate
 
+from rucio.common.dumper import DOWNLOAD_TIMEOUT
 from rucio.common.dumper import DUMPS_CACHE_DIR
-from rucio.common.dumper import HTTPDownloadFailed
 from rucio.common.dumper import get_requests_session
-from rucio.common.dumper import http_download_to_file
+from rucio.common.dumper import http_parallel_download
 from rucio.common.dumper import smart_open
-from rucio.common.dumper import temp_file
 from rucio.common.dumper import to_datetime
 
 
@@ -151,7 +150,7 @@ class DataModel(object):
         requests_session = get_requests_session()
         if date == 'latest':
             url = ''.join((cls.BASE_URL, cls.URI, '?rse={0}'.format(rse)))
-            request_headers = requests_session.head(url)
+            request_headers = requests_session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
             for field in request_headers.headers['content-disposition'].split(';'):
                 if field.startswith('filename='):
                     date = field.split('=')[1].split('_')[-1].split('.')[0]
@@ -179,17 +178,7 @@ class DataModel(object):
 
         if not os.path.exists(path):
             logger.debug('Trying to download: "%s"', url)
-            response = requests_session.head(url)
-            if response.status_code != 200:
-                logger.error(
-                    'Retrieving %s returned %d status code',
-                    url,
-                    response.status_code,
-                )
-                raise HTTPDownloadFailed('Downloading {0} dump'.format(cls.__name__), code=response.status_code)
-
-            with temp_file(cache_dir, final_name=filename) as (tfile, _):
-                http_download_to_file(url, tfile, session=requests_session)
+            http_parallel_download(url, cache_dir, filename, session=requests_session)
 
         return path
 
@@ -526,6 +526,16 @@ class NotAllFilesDownloaded(RucioException):
         self.error_code = 76
 
 
+class NotAllFilesUploaded(RucioException):
+    """
+    RucioException
+    """
+    def __init__(self, *args, **kwargs):
+        super(NotAllFilesUploaded, self).__init__(*args, **kwargs)
+        self._message = "Not all of the given files have been uploaded."
+        self.error_code = 77
+
+
 class ReplicationRuleCreationTemporaryFailed(RucioException):
     """
     RucioException
@@ -36,9 +36,9 @@ import logging
 import os
 import pwd
 import re
-import requests
 import socket
 import subprocess
+import sys
 import zlib
 
 from getpass import getuser
@@ -67,17 +67,11 @@ except ImportError:
 from rucio.common.config import config_get
 from rucio.common.exception import MissingModuleException
 
-# Extra modules: Only imported if available
+# Extra modules: Only imported if available, and only when used, as the clients import this module too
 EXTRA_MODULES = {'web': False,
                  'paramiko': False,
                  'flask': False}
 
-try:
-    from rucio.db.sqla.enum import EnumSymbol
-    EXTRA_MODULES['rucio.db.sqla.enum'] = True
-except ImportError:
-    EXTRA_MODULES['rucio.db.sqla.enum'] = False
-
 for extra_module in EXTRA_MODULES:
     try:
         imp.find_module(extra_module)
@@ -85,15 +79,6 @@ for extra_module in EXTRA_MODULES:
     except ImportError:
         EXTRA_MODULES[extra_module] = False
 
-if EXTRA_MODULES['web']:
-    from web import HTTPError
-
-if EXTRA_MODULES['paramiko']:
-    from paramiko import RSAKey
-
-if EXTRA_MODULES['flask']:
-    from flask import Response
-
 # HTTP code dictionary. Not complete. Can be extended if needed.
 codes = {
     # Informational.
@@ -158,28 +143,94 @@ def clean_headers(msg):
     return msg
 
 
-def adler32(file):
+CHECKSUM_ALGORITHMS = ('adler32', 'md5', 'sha256')
+CHECKSUM_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def calculate_checksums(file, algorithms=('adler32', 'md5'), block_size=CHECKSUM_BLOCK_SIZE):
     """
-    An Adler-32 checksum is obtained by calculating two 16-bit checksums A and B and concatenating their bits into a 32-bit integer. A is the sum of all bytes in the stream plus one, and B is the sum of the individual values of A from each step.
+    Calculates several checksums of a file, reading it only once in large blocks.
 
-    :returns: Hexified string, padded to 8 values.
+    :param file: file name
+    :param algorithms: any of 'adler32', 'md5' and 'sha256'
+    :param block_size: the size of the blocks read from the file
+    :returns: dictionary {algorithm: hexadecimal digest}, adler32 padded to 8 values
     """
+    unknown = set(algorithms) - set(CHECKSUM_ALGORITHMS)
+    if unknown:
+        raise ValueError('Unsupported checksum algorithms: %s' % ', '.join(sorted(unknown)))
 
     # adler starting value is _not_ 0
     adler = 1
+    hashes = dict((algorithm, hashlib.new(algorithm)) for algorithm in algorithms if algorithm != 'adler32')
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            if 'adler32' in algorithms:
+                adler = zlib.adler32(block, adler)
+            for hasher in hashes.values():
+                hasher.update(block)
+
+    checksums = dict((algorithm, hasher.hexdigest()) for algorithm, hasher in hashes.items())
+    if 'adler32' in algorithms:
+        # backflip on 32bit
+        if adler < 0:
+            adler = adler + 2 ** 32
+        checksums['adler32'] = str('%08x' % adler)
+    return checksums
+
+
+def calculate_checksums_parallel(files, algorithms=('adler32', 'md5'), threads=4, block_size=CHECKSUM_BLOCK_SIZE):
+    """
+    Calculates several checksums of several files, each file in one pass, several files at once.
+
+    :param files: list of file names
+    :param algorithms: any of 'adler32', 'md5' and 'sha256'
+    :param threads: the number of files checksummed at the same time
+    :param block_size: the size of the blocks read from the files
+    :returns: dictionary {file: {algorithm: hexadecimal digest}}
+    """
+    files = list(files)
+    if len(files) < 2 or threads < 2:
+        return dict((file, calculate_checksums(file, algorithms, block_size)) for file in files)
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(threads, len(files)))
+    try:
+        results = pool.map(lambda file: calculate_checksums(file, algorithms, block_size), files)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(files, results))
 
+
+def adler32(file):
+    """
+    An Adler-32 checksum is obtained by calculating two 16-bit checksums A and B and concatenating their bits into a 32-bit integer. A is the sum of all bytes in the stream plus one, and B is the sum of the individual values of A from each step.
+
+    :returns: Hexified string, padded to 8 values.
+    """
     try:
-        openFile = open(file, 'rb')
-        for line in openFile:
-            adler = zlib.adler32(line, adler)
+        return calculate_checksums(file, algorithms=('adler32', ))['adler32']
     except:
         raise Exception('FATAL - could not get checksum of file %s' % file)
 
-    # backflip on 32bit
-    if adler < 0:
-        adler = adler + 2 ** 32
 
-    return str('%08x' % adler)
+def adler32_combine(adler1, adler2, length2):
+    """
+    Combine the Adler-32 checksums of two consecutive blocks of data, as zlib's adler32_combine.
+
+    :param adler1: The checksum of the first block, as integer.
+    :param adler2: The checksum of the second block, as integer.
+    :param length2: The length of the second block in bytes.
+    :returns: The checksum of both blocks, as integer.
+    """
+    base = 65521
+    remainder = length2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % base
+    sum1 = (sum1 + (adler2 & 0xffff) + base - 1) % base
+    sum2 = (sum2 + ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - remainder) % base
+    return (sum2 << 16) | sum1
 
 
 def md5(file):
@@ -189,15 +240,11 @@ def md5(file):
     :param string: file name
     :returns: string of 32 hexadecimal digits
     """
-    hash_md5 = hashlib.md5()
     try:
-        with open(file, "rb") as f:
-            map(hash_md5.update, iter(lambda: f.read(4096), b""))
+        return calculate_checksums(file, algorithms=('md5', ))['md5']
     except:
         raise Exception('FATAL - could not get MD5 checksum of file %s' % file)
 
-    return hash_md5.hexdigest()
-
 
 def str_to_date(string):
     """ Converts a RFC-1123 string to the corresponding datetime value.
@@ -229,7 +276,8 @@ class APIEncoder(json.JSONEncoder):
             return obj.isoformat()
         elif isinstance(obj, datetime.timedelta):
             return obj.days * 24 * 60 * 60 + obj.seconds
-        elif isinstance(obj, EnumSymbol):
+        elif 'rucio.db.sqla.enum' in sys.modules and isinstance(obj, sys.modules['rucio.db.sqla.enum'].EnumSymbol):
+            # Without the database modules there are no enum symbols to encode
             return obj.description
         return json.JSONEncoder.default(self, obj)
 
@@ -281,6 +329,7 @@ def generate_http_error(status_code, exc_cls, exc_msg):
     headers = {'Content-Type': 'application/octet-stream',
                'ExceptionClass': exc_cls,
                'ExceptionMessage': clean_headers(exc_msg)}
+    from web import HTTPError
     try:
         return HTTPError(status, headers=headers, data=render_json(**data))
     except:
@@ -301,6 +350,7 @@ def generate_http_error_flask(status_code, exc_cls, exc_msg):
     # Truncate too long exc_msg
     if len(str(exc_msg)) > 15000:
         exc_msg = str(exc_msg)[:15000]
+    from flask import Response
     resp = Response(response=render_json(**data), status=status_code, content_type='application/octet-stream')
     resp.headers['ExceptionClass'] = exc_cls
     resp.headers['ExceptionMessage'] = clean_headers(exc_msg)
@@ -648,6 +698,7 @@ def ssh_sign(private_key, message):
     """
     if not EXTRA_MODULES['paramiko']:
         raise MissingModuleException('The paramiko module is not installed.')
+    from paramiko import RSAKey
     sio_private_key = StringIO(private_key)
     priv_k = RSAKey.from_private_key(sio_private_key)
     sio_private_key.close()
@@ -692,6 +743,7 @@ def send_trace(trace, trace_endpoint, user_agent, retries=5, logger=None, log_pr
         logger.debug('%spilot detected - not sending trace' % log_prefix)
         return 0
     logger.debug('%ssending trace' % log_prefix)
+    import requests
     for dummy in range(retries):
         try:
             requests.post(trace_endpoint + '/traces/', verify=False, data=json.dumps(trace))
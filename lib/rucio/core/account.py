@@ -26,6 +26,7 @@ from sqlalchemy.orm import exc
 import rucio.core.account_counter
 
 from rucio.common import exception
+from rucio.common.cache import invalidate
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import AccountStatus, AccountType
 from rucio.db.sqla.enum import EnumSymbol
@@ -98,6 +99,7 @@ def del_account(account, session=None):
         raise exception.AccountNotFound('Account with ID \'%s\' cannot be found' % account)
 
     account.update({'status': AccountStatus.DELETED, 'deleted_at': datetime.utcnow()})
+    invalidate('account_attributes', session=session)
 
 
 @read_session
@@ -134,6 +136,7 @@ def set_account_status(account, status, session=None):
         query.update({'status': status, 'suspended_at': datetime.utcnow()})
     elif status == AccountStatus.ACTIVE:
         query.update({'status': status, 'suspended_at': None})
+    invalidate('account_attributes', session=session)
 
 
 @stream_session
@@ -190,7 +193,7 @@ def list_identities(account, session=None):
     return identity_list
 
 
-@read_session
+@read_session(replica=False)
 def list_account_attributes(account, session=None):
     """
     Get all attributes defined for an account.
@@ -214,7 +217,7 @@ def list_account_attributes(account, session=None):
     return attr_list
 
 
-@read_session
+@read_session(replica=False)
 def has_account_attribute(account, key, session=None):
     """
     Indicates whether the named key is present for the account.
@@ -259,6 +262,7 @@ def add_account_attribute(account, key, value, session=None):
             raise exception.Duplicate('Key {0} already exist for account {1}!'.format(key, account))
     except:
         raise exception.RucioException(str(format_exc()))
+    invalidate('account_attributes', session=session)
 
 
 @transactional_session
@@ -274,3 +278,4 @@ def del_account_attribute(account, key, session=None):
     if aid is None:
         raise exception.AccountNotFound('Attribute ({0}) does not exist for the account {1}!'.format(key, account))
     aid.delete(session=session)
+    invalidate('account_attributes', session=session)
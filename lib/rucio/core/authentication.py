@@ -20,14 +20,19 @@ import datetime
 import hashlib
 import random
 import sys
+import threading
+import time
 
 import paramiko
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NO_VALUE
 
+from rucio.common.cache import LRUCache, make_region_memcached
+from rucio.common.config import config_get, config_get_bool
+from rucio.common.exception import ServiceUnavailable
 from rucio.common.utils import generate_uuid
 from rucio.core.account import account_exists
+from rucio.core.monitor import record_counter
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import IdentityType
 from rucio.db.sqla.session import read_session, transactional_session
@@ -41,12 +46,20 @@ def token_key_generator(namespace, fni, **kwargs):
     return generate_key
 
 
-TOKENREGION = make_region(
-    function_key_generator=token_key_generator
-).configure(
-    'dogpile.cache.memory',
-    expiration_time=3600
-)
+# Validated tokens stay in the process unless they are explicitly shared through memcached,
+# which must then not be reachable by anyone who shouldn't read or forge tokens
+TOKEN_CACHE_SHARED = config_get_bool('authentication', 'token_cache_shared', raise_exception=False, default=False)
+TOKENREGION = make_region_memcached('token', expiration_time=3600, function_key_generator=token_key_generator,
+                                    local_expiration_time=3600, backend=None if TOKEN_CACHE_SHARED else 'memory')
+
+# Tokens not found in the database, to answer repeated invalid tokens without querying it again
+INVALID_TOKENS = LRUCache(size=int(config_get('authentication', 'invalid_token_cache_size', raise_exception=False, default=10000)),
+                          expiration_time=int(config_get('authentication', 'invalid_token_cache_time', raise_exception=False, default=60)))
+
+# Maximum rate of token queries to the database per process, 0 for no limit
+TOKEN_QUERY_RATE = float(config_get('authentication', 'token_query_rate', raise_exception=False, default=100))
+TOKEN_QUERIES = {'allowance': TOKEN_QUERY_RATE, 'checked': time.time()}
+TOKEN_QUERIES_LOCK = threading.Lock()
 
 
 @read_session
@@ -285,6 +298,7 @@ def validate_auth_token(token):
     :param session: The database session in use.
 
     :returns: Tuple(account identifier, token lifetime) if successful, None otherwise.
+    :raises ServiceUnavailable: if the token is not cached and the token query rate is exceeded.
     """
     if not token:
         return
@@ -292,18 +306,50 @@ def validate_auth_token(token):
     # Be gentle with bash variables, there can be whitespace
     token = token.strip()
 
+    if INVALID_TOKENS.get(token) is not NO_VALUE:
+        record_counter('core.authentication.validate_auth_token.invalid_cached')
+        return
+
     # Check if token ca be found in cache region
     value = TOKENREGION.get(token)
     if value is NO_VALUE:  # no cached entry found
+        if not token_query_allowed():
+            # The token may be valid, the client has to retry rather than to authenticate again
+            record_counter('core.authentication.validate_auth_token.rate_limited')
+            raise ServiceUnavailable('Too many tokens to validate, please retry later')
+        record_counter('core.authentication.validate_auth_token.query')
         value = query_token(token)
-        value and TOKENREGION.set(token, value)
+        if value:
+            TOKENREGION.set(token, value)
+        else:
+            INVALID_TOKENS.set(token, True)
     elif value.get('lifetime', datetime.datetime(1970, 1, 1)) < datetime.datetime.utcnow():  # check if expired
         TOKENREGION.delete(token)
         return
     return value
 
 
-@read_session
+def token_query_allowed():
+    """
+    Token bucket limiting the rate of token queries to the database, to protect it
+    from clients sending many invalid tokens.
+
+    :returns: True if the token can be queried, False otherwise.
+    """
+    if not TOKEN_QUERY_RATE:
+        return True
+    with TOKEN_QUERIES_LOCK:
+        now = time.time()
+        allowance = min(TOKEN_QUERY_RATE, TOKEN_QUERIES['allowance'] + (now - TOKEN_QUERIES['checked']) * TOKEN_QUERY_RATE)
+        TOKEN_QUERIES['checked'] = now
+        if allowance < 1:
+            TOKEN_QUERIES['allowance'] = allowance
+            return False
+        TOKEN_QUERIES['allowance'] = allowance - 1
+        return True
+
+
+@read_session(replica=False)
 def query_token(token, session=None):
     """
     Validate an authentication token using the database. This method will only be called
@@ -11,20 +11,41 @@
   - Cedric Serfon, <cedric.serfon@cern.ch>, 2017
 '''
 
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from rucio.common.cache import after_commit
+from rucio.common.config import config_get
 from rucio.common.exception import ConfigNotFound
 from rucio.db.sqla import models
 from rucio.db.sqla.session import read_session, transactional_session
 
+# Seconds between two refreshes of the snapshot of the configs table
+SNAPSHOT_INTERVAL = int(config_get('config', 'snapshot_interval', raise_exception=False, default=5))
+# Rows updated this many seconds before the newest known update are read again, for transactions committed late
+SNAPSHOT_OVERLAP = 300
+
+SNAPSHOT = {'values': None, 'version': None, 'refreshed': 0}
+SNAPSHOT_LOCK = threading.Lock()
+
 
 @read_session
-def sections(session=None):
+def sections(use_cache=True, session=None):
     """
     Return a list of the sections available.
 
+    :param use_cache: Read the snapshot of the configuration instead of the database.
     :param session: The database session in use.
     :returns: ['section_name', ...]
     """
 
+    if use_cache:
+        return list(set(section for section, _ in __snapshot()))
+
     all_sections = session.query(models.Config.section).distinct().all()
 
     res = []
@@ -46,30 +67,38 @@ def add_section(section, session=None):
 
 
 @read_session
-def has_section(section, session=None):
+def has_section(section, use_cache=True, session=None):
     """
     Indicates whether the named section is present in the configuration.
 
     :param section: The name of the section.
+    :param use_cache: Read the snapshot of the configuration instead of the database.
     :param session: The database session in use.
     :returns: True/False
     """
 
+    if use_cache:
+        return any(sec == section for sec, _ in __snapshot())
+
     query = session.query(models.Config).filter_by(section=section)
 
     return True if query.first() else False
 
 
 @read_session
-def options(section, session=None):
+def options(section, use_cache=True, session=None):
     """
     Returns a list of options available in the specified section.
 
     :param section: The name of the section.
+    :param use_cache: Read the snapshot of the configuration instead of the database.
     :param session: The database session in use.
     :returns: ['option', ...]
     """
 
+    if use_cache:
+        return [opt for sec, opt in __snapshot() if sec == section]
+
     optns = session.query(models.Config.opt).filter_by(section=section).distinct().all()
 
     res = []
@@ -80,23 +109,27 @@ def options(section, session=None):
 
 
 @read_session
-def has_option(section, option, session=None):
+def has_option(section, option, use_cache=True, session=None):
     """
     Check if the given section exists and contains the given option.
 
     :param section: The name of the section.
     :param option: The name of the option.
+    :param use_cache: Read the snapshot of the configuration instead of the database.
     :param session: The database session in use.
     :returns: True/False
     """
 
+    if use_cache:
+        return (section, option) in __snapshot()
+
     query = session.query(models.Config).filter_by(section=section, opt=option)
 
     return True if query.first() else False
 
 
 @read_session
-def get(section, option, session=None):
+def get(section, option, use_cache=True, session=None):
     """
     Get an option value for the named section. Value can be auto-coerced to string, int, float, bool, None.
 
@@ -105,10 +138,17 @@ def get(section, option, session=None):
 
     :param section: The name of the section.
     :param option: The name of the option.
+    :param use_cache: Read the snapshot of the configuration instead of the database.
     :param session: The database session in use.
     :returns: The auto-coerced value.
     """
 
+    if use_cache:
+        try:
+            return __convert_type(__snapshot()[(section, option)])
+        except KeyError:
+            raise ConfigNotFound()
+
     tmp = session.query(models.Config.value).filter_by(section=section, opt=option).first()
 
     if tmp is not None:
@@ -118,16 +158,19 @@ def get(section, option, session=None):
 
 
 @read_session
-def items(section, session=None):
+def items(section, use_cache=True, session=None):
     """
     Return a list of (option, value) pairs for each option in the given section. Values are auto-coerced as in get().
 
     :param section: The name of the section.
-    :param value: The content of the value.
+    :param use_cache: Read the snapshot of the configuration instead of the database.
     :param session: The database session in use.
     :returns: [('option', auto-coerced value), ...]
     """
 
+    if use_cache:
+        return [(opt, __convert_type(value)) for (sec, opt), value in __snapshot().items() if sec == section]
+
     itms = session.query(models.Config.opt, models.Config.value).filter_by(section=section).all()
 
     res = []
@@ -148,7 +191,7 @@ def set(section, option, value, session=None):
     :param session: The database session in use.
     """
 
-    if not has_option(section=section, option=option, session=session):
+    if not has_option(section=section, option=option, use_cache=False, session=session):
         new_option = models.Config(section=section, opt=option, value=value)
         new_option.save(session=session)
     else:
@@ -158,6 +201,7 @@ def set(section, option, value, session=None):
                                                                                                                 opt=option).first()[0])
         old_option.save(session=session)
         session.query(models.Config).filter_by(section=section, opt=option).update({'value': str(value)})
+    after_commit(session, invalidate_snapshot)
 
 
 @transactional_session
@@ -170,7 +214,7 @@ def remove_section(section, session=None):
     :returns: True/False.
     """
 
-    if not has_section(section=section, session=session):
+    if not has_section(section=section, use_cache=False, session=session):
         return False
     else:
         for old in session.query(models.Config.value).filter_by(section=section).all():
@@ -179,6 +223,7 @@ def remove_section(section, session=None):
                                                                  value=old[2])
             old_option.save(session=session)
         session.query(models.Config).filter_by(section=section).delete()
+        after_commit(session, invalidate_snapshot)
         return True
 
 
@@ -193,7 +238,7 @@ def remove_option(section, option, session=None):
     :returns: True/False
     """
 
-    if not has_option(section=section, option=option, session=session):
+    if not has_option(section=section, option=option, use_cache=False, session=session):
         return False
     else:
         old_option = models.Config.__history_mapper__.class_(section=section,
@@ -202,9 +247,60 @@ def remove_option(section, option, session=None):
                                                                                                                 opt=option).first()[0])
         old_option.save(session=session)
         session.query(models.Config).filter_by(section=section, opt=option).delete()
+        after_commit(session, invalidate_snapshot)
         return True
 
 
+def invalidate_snapshot():
+    """
+    Refresh the snapshot of the configuration at the next read, to be called once changes are committed.
+    """
+    SNAPSHOT['refreshed'] = 0
+
+
+def __snapshot():
+    """
+    Return the snapshot of the configs table, refreshed if older than SNAPSHOT_INTERVAL seconds.
+
+    :returns: Dictionary {(section, option): value}, not to be modified.
+    """
+    if time.time() - SNAPSHOT['refreshed'] >= SNAPSHOT_INTERVAL:
+        with SNAPSHOT_LOCK:
+            if time.time() - SNAPSHOT['refreshed'] >= SNAPSHOT_INTERVAL:
+                __refresh_snapshot()
+    return SNAPSHOT['values']
+
+
+@read_session(replica=False)
+def __refresh_snapshot(session=None):
+    """
+    Refresh the snapshot with the rows updated since the last refresh, or load the
+    whole table when rows have been added or deleted meanwhile. It uses its own
+    session to only see committed changes.
+
+    :param session: The database session in use.
+    """
+    values, version = SNAPSHOT['values'], SNAPSHOT['version']
+    if values is not None:
+        values = dict(values)
+        query = session.query(models.Config.section, models.Config.opt, models.Config.value, models.Config.updated_at).\
+            filter(models.Config.updated_at >= version - timedelta(seconds=SNAPSHOT_OVERLAP))
+        for section, option, value, updated_at in query:
+            values[(section, option)] = value
+            version = max(version, updated_at)
+        if session.query(func.count(models.Config.opt)).scalar() != len(values):
+            values = None
+
+    if values is None:
+        values, version = {}, datetime(1970, 1, 1)
+        query = session.query(models.Config.section, models.Config.opt, models.Config.value, models.Config.updated_at)
+        for section, option, value, updated_at in query:
+            values[(section, option)] = value
+            version = max(version, updated_at)
+
+    SNAPSHOT.update({'values': values, 'version': version, 'refreshed': time.time()})
+
+
 def __convert_type(value):
     '''
     __convert_type
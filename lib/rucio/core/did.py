@@ -37,8 +37,9 @@ import rucio.core.replica  # import add_replicas
 
 from rucio.common import exception
 from rucio.common.config import config_get
-from rucio.common.utils import str_to_date, is_archive
+from rucio.common.utils import chunks, str_to_date, is_archive
 from rucio.core import account_counter, rse_counter
+from rucio.core.did_hierarchy import list_ancestors, list_descendants
 from rucio.core.message import add_message
 from rucio.core.monitor import record_timer_block, record_counter
 from rucio.core.naming_convention import validate_name
@@ -527,18 +528,34 @@ def attach_dids_to_dids(attachments, account, ignore_duplicate=False, session=No
 
 
 @transactional_session
-def delete_dids(dids, account, session=None):
+def delete_dids(dids, account, bulk=False, session=None):
     """
     Delete data identifiers
 
     :param dids: The list of dids to delete.
     :param account: The account.
+    :param bulk: Use set-based statements for the content archival and the rule removal,
+                 and only hold back the dids still attached to a parent instead of the whole list.
     :param session: The database session in use.
     """
     rule_id_clause, content_clause = [], []
     parent_content_clause, did_clause = [], []
     collection_replica_clause, file_clause = [], []
     not_purge_replicas = []
+    archive_content_clause = []
+
+    localgroupdisk_datasets = None
+    if bulk:
+        # Only datasets with a LOCALGROUPDISK lock are affected by the archive policy
+        dataset_clause = [and_(models.DatasetLock.scope == did['scope'], models.DatasetLock.name == did['name'])
+                          for did in dids if did['did_type'] == DIDType.DATASET and did['scope'] != 'archive']
+        localgroupdisk_datasets = set()
+        for chunk in chunks(dataset_clause, 100):
+            query = session.query(models.DatasetLock.scope, models.DatasetLock.name).\
+                join(models.RSE, models.RSE.id == models.DatasetLock.rse_id).\
+                filter(models.RSE.rse.like('%LOCALGROUPDISK%')).\
+                filter(or_(*chunk))
+            localgroupdisk_datasets.update(query)
 
     for did in dids:
         logging.info('Removing did %(scope)s:%(name)s (%(did_type)s)' % did)
@@ -552,14 +569,19 @@ def delete_dids(dids, account, session=None):
 
         # ATLAS LOCALGROUPDISK Archive policy
         if did['did_type'] == DIDType.DATASET and did['scope'] != 'archive':
-            rucio.core.rule.archive_localgroupdisk_datasets(scope=did['scope'], name=did['name'], session=session)
+            if localgroupdisk_datasets is None or (did['scope'], did['name']) in localgroupdisk_datasets:
+                rucio.core.rule.archive_localgroupdisk_datasets(scope=did['scope'], name=did['name'], session=session)
 
         if did['purge_replicas'] is False:
             not_purge_replicas.append((did['scope'], did['name']))
 
             # Archive content
             # Disable for postgres
-            if session.bind.dialect.name != 'postgresql':
+            if bulk:
+                if did['did_type'] != DIDType.FILE:
+                    archive_content_clause.append(and_(models.DataIdentifierAssociation.scope == did['scope'],
+                                                       models.DataIdentifierAssociation.name == did['name']))
+            elif session.bind.dialect.name != 'postgresql':
                 q = session.query(models.DataIdentifierAssociation.scope,
                                   models.DataIdentifierAssociation.name,
                                   models.DataIdentifierAssociation.child_scope,
@@ -592,8 +614,55 @@ def delete_dids(dids, account, session=None):
                               'scope': did['scope'],
                               'name': did['name']},
                     session=session)
+
+    # Archive content in one statement, taking did_created_at from the dids themselves
+    if archive_content_clause and session.bind.dialect.name != 'postgresql':
+        with record_timer_block('undertaker.archive_content'):
+            for chunk in chunks(archive_content_clause, 100):
+                q = session.query(models.DataIdentifierAssociation.scope,
+                                  models.DataIdentifierAssociation.name,
+                                  models.DataIdentifierAssociation.child_scope,
+                                  models.DataIdentifierAssociation.child_name,
+                                  models.DataIdentifierAssociation.did_type,
+                                  models.DataIdentifierAssociation.child_type,
+                                  models.DataIdentifierAssociation.bytes,
+                                  models.DataIdentifierAssociation.adler32,
+                                  models.DataIdentifierAssociation.md5,
+                                  models.DataIdentifierAssociation.guid,
+                                  models.DataIdentifierAssociation.events,
+                                  models.DataIdentifierAssociation.rule_evaluation,
+                                  models.DataIdentifier.created_at,
+                                  models.DataIdentifierAssociation.created_at,
+                                  models.DataIdentifierAssociation.updated_at,
+                                  bindparam('deleted_at', datetime.utcnow())).\
+                    join(models.DataIdentifier, and_(models.DataIdentifier.scope == models.DataIdentifierAssociation.scope,
+                                                     models.DataIdentifier.name == models.DataIdentifierAssociation.name)).\
+                    filter(or_(*chunk))
+                ins = Insert(table=models.DataIdentifierAssociationHistory, inline=True).\
+                    from_select(('scope', 'name', 'child_scope', 'child_name', 'did_type',
+                                 'child_type', 'bytes', 'adler32', 'md5', 'guid', 'events',
+                                 'rule_evaluation', 'did_created_at', 'created_at', 'updated_at',
+                                 'deleted_at'), q)
+                session.execute(ins)
+
     # Delete rules on did
-    if rule_id_clause:
+    if rule_id_clause and bulk:
+        with record_timer_block('undertaker.rules'):
+            purge_rule_ids, not_purge_rule_ids = [], []
+            for chunk in chunks(rule_id_clause, 100):
+                for (rule_id, scope, name) in session.query(models.ReplicationRule.id,
+                                                            models.ReplicationRule.scope,
+                                                            models.ReplicationRule.name).filter(or_(*chunk)):
+                    # Propagate purge_replicas from did to rules
+                    if (scope, name) in not_purge_replicas:
+                        not_purge_rule_ids.append(rule_id)
+                    else:
+                        purge_rule_ids.append(rule_id)
+            for rule_ids, purge_replicas in ((purge_rule_ids, True), (not_purge_rule_ids, False)):
+                for chunk in chunks(rule_ids, 500):
+                    rucio.core.rule.delete_rules(rule_ids=chunk, purge_replicas=purge_replicas, delete_parent=True, nowait=True, session=session)
+        record_counter(counters='undertaker.rules.rowcount', delta=len(purge_rule_ids) + len(not_purge_rule_ids))
+    elif rule_id_clause:
         with record_timer_block('undertaker.rules'):
             for (rule_id, scope, name, rse_expression) in session.query(models.ReplicationRule.id,
                                                                         models.ReplicationRule.scope,
@@ -609,41 +678,56 @@ def delete_dids(dids, account, session=None):
 
     # Detach from parent dids:
     existing_parent_dids = False
+    attached_dids = set()
     if parent_content_clause:
         with record_timer_block('undertaker.parent_content'):
-            for parent_did in session.query(models.DataIdentifierAssociation).filter(or_(*parent_content_clause)):
-                existing_parent_dids = True
-                detach_dids(scope=parent_did.scope, name=parent_did.name, dids=[{'scope': parent_did.child_scope, 'name': parent_did.child_name}], session=session)
+            for chunk in chunks(parent_content_clause, 100):
+                for parent_did in session.query(models.DataIdentifierAssociation).filter(or_(*chunk)):
+                    existing_parent_dids = True
+                    attached_dids.add((parent_did.child_scope, parent_did.child_name))
+                    detach_dids(scope=parent_did.scope, name=parent_did.name, dids=[{'scope': parent_did.child_scope, 'name': parent_did.child_name}], session=session)
 
     # Remove content
     if content_clause:
         with record_timer_block('undertaker.content'):
-            rowcount = session.query(models.DataIdentifierAssociation).filter(or_(*content_clause)).\
-                delete(synchronize_session=False)
+            rowcount = 0
+            for chunk in chunks(content_clause, 100):
+                rowcount += session.query(models.DataIdentifierAssociation).filter(or_(*chunk)).\
+                    delete(synchronize_session=False)
         record_counter(counters='undertaker.content.rowcount', delta=rowcount)
 
     # Remove CollectionReplica
     if collection_replica_clause:
         with record_timer_block('undertaker.dids'):
-            rowcount = session.query(models.CollectionReplica).filter(or_(*collection_replica_clause)).\
-                delete(synchronize_session=False)
+            for chunk in chunks(collection_replica_clause, 100):
+                session.query(models.CollectionReplica).filter(or_(*chunk)).\
+                    delete(synchronize_session=False)
 
     # remove data identifier
-    if existing_parent_dids:
+    if existing_parent_dids and bulk:
+        # Only hold back the detached dids, the rest of the batch can go
+        logging.debug('Keeping %s detached dids for Judge-Evaluator checks' % len(attached_dids))
+        did_clause = [and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name'])
+                      for did in dids if did['did_type'] != DIDType.FILE and (did['scope'], did['name']) not in attached_dids]
+        file_clause = [and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name'])
+                       for did in dids if did['did_type'] == DIDType.FILE and (did['scope'], did['name']) not in attached_dids]
+    elif existing_parent_dids:
         # Exit method early to give Judge time to remove locks (Otherwise, due to foreign keys, did removal does not work
         logging.debug('Leaving delete_dids early for Judge-Evaluator checks')
         return
 
     if did_clause:
         with record_timer_block('undertaker.dids'):
-            rowcount = session.query(models.DataIdentifier).filter(or_(*did_clause)).\
-                filter(or_(models.DataIdentifier.did_type == DIDType.CONTAINER, models.DataIdentifier.did_type == DIDType.DATASET)).\
-                delete(synchronize_session=False)
+            for chunk in chunks(did_clause, 100):
+                session.query(models.DataIdentifier).filter(or_(*chunk)).\
+                    filter(or_(models.DataIdentifier.did_type == DIDType.CONTAINER, models.DataIdentifier.did_type == DIDType.DATASET)).\
+                    delete(synchronize_session=False)
 
     if file_clause:
-        rowcount = session.query(models.DataIdentifier).filter(or_(*file_clause)).\
-            filter(models.DataIdentifier.did_type == DIDType.FILE).\
-            update({'expired_at': None}, synchronize_session=False)
+        for chunk in chunks(file_clause, 100):
+            session.query(models.DataIdentifier).filter(or_(*chunk)).\
+                filter(models.DataIdentifier.did_type == DIDType.FILE).\
+                update({'expired_at': None}, synchronize_session=False)
 
 
 @transactional_session
@@ -793,16 +877,22 @@ def set_new_dids(dids, new_flag, session=None):
     """
     if session.bind.dialect.name == 'postgresql':
         new_flag = bool(new_flag)
+    if not dids:
+        return True
+    did_condition = []
     for did in dids:
-        try:
-
-            rowcount = session.query(models.DataIdentifier).\
-                filter_by(scope=did['scope'], name=did['name']).\
-                update({'is_new': new_flag}, synchronize_session=False)
-            if not rowcount:
+        did_condition.append(and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']))
+    try:
+        rowcount = session.query(models.DataIdentifier).\
+            filter(or_(*did_condition)).\
+            update({'is_new': new_flag}, synchronize_session=False)
+    except DatabaseError as error:
+        raise exception.DatabaseException('%s : Cannot update %s' % (error.args[0], ', '.join(['%s:%s' % (did['scope'], did['name']) for did in dids])))
+    if rowcount != len(set((did['scope'], did['name']) for did in dids)):
+        found = [(row.scope, row.name) for row in session.query(models.DataIdentifier.scope, models.DataIdentifier.name).filter(or_(*did_condition))]
+        for did in dids:
+            if (did['scope'], did['name']) not in found:
                 raise exception.DataIdentifierNotFound("Data identifier '%s:%s' not found" % (did['scope'], did['name']))
-        except DatabaseError as error:
-            raise exception.DatabaseException('%s : Cannot update %s:%s' % (error.args[0], did['scope'], did['name']))
     try:
         session.flush()
     except IntegrityError as error:
@@ -887,12 +977,8 @@ def list_all_parent_dids(scope, name, session=None):
     :rtype:           Generator.
     """
 
-    query = session.query(models.DataIdentifierAssociation.scope,
-                          models.DataIdentifierAssociation.name,
-                          models.DataIdentifierAssociation.did_type).filter_by(child_scope=scope, child_name=name)
-    for did in query.yield_per(5):
-        yield {'scope': did.scope, 'name': did.name, 'type': did.did_type}
-        list_all_parent_dids(scope=did.scope, name=did.name, session=session)
+    for did in list_ancestors(scope=scope, name=name, session=session):
+        yield {'scope': did['scope'], 'name': did['name'], 'type': did['type']}
 
 
 @transactional_session
@@ -907,19 +993,8 @@ def list_child_datasets(scope, name, session=None):
     :rtype:           Generator
     """
 
-    result = []
-    query = session.query(models.DataIdentifierAssociation.child_scope,
-                          models.DataIdentifierAssociation.child_name,
-                          models.DataIdentifierAssociation.child_type).filter(models.DataIdentifierAssociation.scope == scope,
-                                                                              models.DataIdentifierAssociation.name == name,
-                                                                              models.DataIdentifierAssociation.child_type != DIDType.FILE)
-    query = query.with_hint(models.DataIdentifierAssociation, "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
-    for child_scope, child_name, child_type in query.yield_per(5):
-        if child_type == DIDType.CONTAINER:
-            result.extend(list_child_datasets(scope=child_scope, name=child_name, session=session))
-        else:
-            result.append({'scope': child_scope, 'name': child_name, 'type': child_type})
-    return result
+    return [{'scope': did['scope'], 'name': did['name'], 'type': did['type']}
+            for did in list_descendants(scope=scope, name=name, did_types=[DIDType.DATASET], session=session)]
 
 
 @stream_session
@@ -952,64 +1027,18 @@ def list_files(scope, name, long=False, session=None):
                        'adler32': did[3], 'guid': did[4] and did[4].upper(),
                        'events': did[5]}
         else:
-            cnt_query = session.\
-                query(models.DataIdentifierAssociation.child_scope,
-                      models.DataIdentifierAssociation.child_name,
-                      models.DataIdentifierAssociation.child_type).\
-                with_hint(models.DataIdentifierAssociation,
-                          "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
-
-            if long:
-                dst_cnt_query = session.\
-                    query(models.DataIdentifierAssociation.child_scope,
-                          models.DataIdentifierAssociation.child_name,
-                          models.DataIdentifierAssociation.child_type,
-                          models.DataIdentifierAssociation.bytes,
-                          models.DataIdentifierAssociation.adler32,
-                          models.DataIdentifierAssociation.guid,
-                          models.DataIdentifierAssociation.events,
-                          models.DataIdentifier.lumiblocknr).\
-                    with_hint(models.DataIdentifierAssociation,
-                              "INDEX_RS_ASC(DIDS DIDS_PK) INDEX_RS_ASC(CONTENTS CONTENTS_PK) NO_INDEX_FFS(CONTENTS CONTENTS_PK)",
-                              "oracle").\
-                    filter(and_(models.DataIdentifier.scope == models.DataIdentifierAssociation.child_scope,
-                                models.DataIdentifier.name == models.DataIdentifierAssociation.child_name))
-            else:
-                dst_cnt_query = session.\
-                    query(models.DataIdentifierAssociation.child_scope,
-                          models.DataIdentifierAssociation.child_name,
-                          models.DataIdentifierAssociation.child_type,
-                          models.DataIdentifierAssociation.bytes,
-                          models.DataIdentifierAssociation.adler32,
-                          models.DataIdentifierAssociation.guid,
-                          models.DataIdentifierAssociation.events,
-                          bindparam("lumiblocknr", None)).\
-                    with_hint(models.DataIdentifierAssociation,
-                              "INDEX(CONTENTS CONTENTS_PK)", 'oracle')
-
-            dids = [(scope, name, did[7]), ]
-            while dids:
-                s, n, t = dids.pop()
-                if t == DIDType.DATASET:
-                    query = dst_cnt_query.\
-                        filter(and_(models.DataIdentifierAssociation.scope == s,
-                                    models.DataIdentifierAssociation.name == n))
-
-                    for child_scope, child_name, child_type, bytes, adler32, guid, events, lumiblocknr in query.yield_per(500):
-                        if long:
-                            yield {'scope': child_scope, 'name': child_name,
-                                   'bytes': bytes, 'adler32': adler32,
-                                   'guid': guid and guid.upper(),
-                                   'events': events,
-                                   'lumiblocknr': lumiblocknr}
-                        else:
-                            yield {'scope': child_scope, 'name': child_name,
-                                   'bytes': bytes, 'adler32': adler32,
-                                   'guid': guid and guid.upper(),
-                                   'events': events}
+            for child in list_descendants(scope=scope, name=name, did_types=[DIDType.FILE], long=long, session=session):
+                if long:
+                    yield {'scope': child['scope'], 'name': child['name'],
+                           'bytes': child['bytes'], 'adler32': child['adler32'],
+                           'guid': child['guid'] and child['guid'].upper(),
+                           'events': child['events'],
+                           'lumiblocknr': child['lumiblocknr']}
                 else:
-                    for child_scope, child_name, child_type in cnt_query.filter_by(scope=s, name=n).yield_per(500):
-                        dids.append((child_scope, child_name, child_type))
+                    yield {'scope': child['scope'], 'name': child['name'],
+                           'bytes': child['bytes'], 'adler32': child['adler32'],
+                           'guid': child['guid'] and child['guid'].upper(),
+                           'events': child['events']}
 
     except NoResultFound:
         raise exception.DataIdentifierNotFound("Data identifier '%(scope)s:%(name)s' not found" % locals())
@@ -1253,6 +1282,30 @@ def get_metadata(scope, name, session=None):
         raise exception.DataIdentifierNotFound("Data identifier '%(scope)s:%(name)s' not found" % locals())
 
 
+@read_session
+def get_metadata_bulk(dids, session=None):
+    """
+    Get metadata for a list of data identifiers with one query per 100 data identifiers.
+    Data identifiers which don't exist are not part of the result.
+
+    :param dids: A list of dids (dictionaries with scope and name).
+    :param session: The database session in use.
+    :returns: List of metadata dictionaries.
+    """
+    did_condition = []
+    for did in dids:
+        did_condition.append(and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']))
+    result = []
+    for chunk in chunks(did_condition, 100):
+        for row in session.query(models.DataIdentifier).filter(or_(*chunk)).\
+                with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle'):
+            d = {}
+            for column in row.__table__.columns:
+                d[column.name] = getattr(row, column.name)
+            result.append(d)
+    return result
+
+
 @transactional_session
 def set_status(scope, name, session=None, **kwargs):
     """
@@ -0,0 +1,213 @@
+# Copyright 2018 CERN for the benefit of the ATLAS collaboration.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+Traversal of the data identifier hierarchy (the contents table).
+
+Ancestors and descendants are resolved with a single recursive common table
+expression where the database supports it, and with a breadth-first walk
+issuing one query per level and chunk of dids otherwise (MySQL < 8, MariaDB < 10.2,
+SQLite < 3.8.3).
+'''
+
+import sys
+
+from sqlalchemy import and_, or_, func, Integer
+from sqlalchemy.sql.expression import literal, literal_column, null, select
+
+from rucio.common.utils import chunks
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import DIDType
+from rucio.db.sqla.session import stream_session
+
+
+def supports_recursive_cte(session):
+    """
+    Check if the database behind the session supports recursive common table expressions.
+
+    :param session: The database session in use.
+    :returns:       True or False.
+    """
+    dialect = session.bind.dialect
+    version = dialect.server_version_info or ()
+    if dialect.name == 'mysql':
+        if getattr(dialect, '_is_mariadb', False):
+            return version >= (10, 2, 2)
+        return version >= (8, 0)
+    if dialect.name == 'sqlite':
+        # Before Python 3.6 the sqlite3 module commits the open transaction before any
+        # statement not starting with SELECT or a DML keyword, and then returns no rows
+        return version >= (3, 8, 3) and sys.version_info >= (3, 6)
+    return dialect.name in ('oracle', 'postgresql')
+
+
+def __expand(did_type, did_types):
+    """
+    Check if the children of a did of the given type can match did_types.
+    Datasets only contain files, so they are not expanded when files are not wanted.
+    """
+    if did_type == DIDType.CONTAINER:
+        return True
+    return did_type == DIDType.DATASET and (did_types is None or DIDType.FILE in did_types)
+
+
+@stream_session
+def list_ancestors(scope, name, max_depth=None, did_types=None, recursive_cte=None, session=None):
+    """
+    List all parent datasets and containers of a did, no matter on what level.
+
+    :param scope:          The scope.
+    :param name:           The name.
+    :param max_depth:      Only go up max_depth levels, direct parents are at depth 1.
+    :param did_types:      Only return dids of these types (list of DIDType).
+    :param recursive_cte:  Use a recursive CTE (True), a breadth-first walk (False) or detect it (None).
+    :param session:        The database session.
+    :returns:              Generator of dicts {'scope', 'name', 'type', 'depth'}, each did once at its lowest depth.
+    """
+    if recursive_cte is None:
+        recursive_cte = supports_recursive_cte(session)
+
+    contents = models.DataIdentifierAssociation.__table__
+    if recursive_cte:
+        ancestors = select([contents.c.scope, contents.c.name, contents.c.did_type, literal_column('1', Integer).label('depth')]).\
+            where(and_(contents.c.child_scope == scope, contents.c.child_name == name)).\
+            cte(name='ancestors', recursive=True)
+        parents = contents.alias('parents')
+        step = select([parents.c.scope, parents.c.name, parents.c.did_type, ancestors.c.depth + 1]).\
+            where(and_(parents.c.child_scope == ancestors.c.scope, parents.c.child_name == ancestors.c.name))
+        if max_depth is not None:
+            step = step.where(ancestors.c.depth < max_depth)
+        ancestors = ancestors.union_all(step)
+
+        query = session.query(ancestors.c.scope, ancestors.c.name, ancestors.c.did_type, func.min(ancestors.c.depth)).\
+            group_by(ancestors.c.scope, ancestors.c.name, ancestors.c.did_type)
+        if did_types:
+            query = query.filter(ancestors.c.did_type.in_(did_types))
+        for parent_scope, parent_name, did_type, depth in query.yield_per(1000):
+            yield {'scope': parent_scope, 'name': parent_name, 'type': did_type, 'depth': depth}
+        return
+
+    seen, frontier, depth = set(), [(scope, name)], 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_frontier = []
+        for chunk in chunks(frontier, 100):
+            query = session.query(models.DataIdentifierAssociation.scope,
+                                  models.DataIdentifierAssociation.name,
+                                  models.DataIdentifierAssociation.did_type).\
+                filter(or_(*[and_(models.DataIdentifierAssociation.child_scope == child_scope,
+                                  models.DataIdentifierAssociation.child_name == child_name) for child_scope, child_name in chunk]))
+            for parent_scope, parent_name, did_type in query.yield_per(1000):
+                if (parent_scope, parent_name) in seen:
+                    continue
+                seen.add((parent_scope, parent_name))
+                next_frontier.append((parent_scope, parent_name))
+                if not did_types or did_type in did_types:
+                    yield {'scope': parent_scope, 'name': parent_name, 'type': did_type, 'depth': depth}
+        frontier = next_frontier
+
+
+@stream_session
+def list_descendants(scope, name, max_depth=None, did_types=None, long=False, recursive_cte=None, session=None):
+    """
+    List the content of a dataset or container, no matter on what level.
+
+    A did reachable by several paths is returned once per path, like the content itself.
+
+    :param scope:          The scope.
+    :param name:           The name.
+    :param max_depth:      Only go down max_depth levels, direct children are at depth 1.
+    :param did_types:      Only return dids of these types (list of DIDType).
+    :param long:           Also return the lumiblocknr of the dids.
+    :param recursive_cte:  Use a recursive CTE (True), a breadth-first walk (False) or detect it (None).
+    :param session:        The database session.
+    :returns:              Generator of dicts {'scope', 'name', 'type', 'parent_scope', 'parent_name', 'bytes', 'adler32', 'guid', 'events', 'depth'} (and 'lumiblocknr' if long).
+    """
+    if recursive_cte is None:
+        recursive_cte = supports_recursive_cte(session)
+
+    contents = models.DataIdentifierAssociation.__table__
+    columns = ('scope', 'name', 'child_scope', 'child_name', 'child_type', 'bytes', 'adler32', 'guid', 'events')
+    with_files = did_types is None or DIDType.FILE in did_types
+
+    if recursive_cte:
+        anchor = select([contents.c[column] for column in columns] + [literal_column('1', Integer).label('depth')]).\
+            where(and_(contents.c.scope == scope, contents.c.name == name))
+        if not with_files:
+            anchor = anchor.where(contents.c.child_type != DIDType.FILE)
+        descendants = anchor.cte(name='descendants', recursive=True)
+
+        children = contents.alias('children')
+        expand = descendants.c.child_type == DIDType.CONTAINER
+        if with_files:
+            expand = or_(expand, descendants.c.child_type == DIDType.DATASET)
+        step = select([children.c[column] for column in columns] + [descendants.c.depth + 1]).\
+            where(and_(children.c.scope == descendants.c.child_scope,
+                       children.c.name == descendants.c.child_name,
+                       expand))
+        if not with_files:
+            step = step.where(children.c.child_type != DIDType.FILE)
+        if max_depth is not None:
+            step = step.where(descendants.c.depth < max_depth)
+        descendants = descendants.union_all(step)
+
+        query = session.query(*([descendants.c[column] for column in columns] + [descendants.c.depth]))
+        if long:
+            query = query.add_columns(models.DataIdentifier.lumiblocknr).\
+                outerjoin(models.DataIdentifier, and_(models.DataIdentifier.scope == descendants.c.child_scope,
+                                                      models.DataIdentifier.name == descendants.c.child_name))
+        else:
+            query = query.add_columns(null())
+        if did_types:
+            query = query.filter(descendants.c.child_type.in_(did_types))
+        for row in query.yield_per(1000):
+            yield __to_descendant(row, long)
+        return
+
+    frontier, depth = [(scope, name)], 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        next_frontier = []
+        for chunk in chunks(frontier, 100):
+            query = session.query(*([getattr(models.DataIdentifierAssociation, column) for column in columns] + [literal(depth)])).\
+                filter(or_(*[and_(models.DataIdentifierAssociation.scope == parent_scope,
+                                  models.DataIdentifierAssociation.name == parent_name) for parent_scope, parent_name in chunk]))
+            if not with_files:
+                query = query.filter(models.DataIdentifierAssociation.child_type != DIDType.FILE)
+            if long:
+                query = query.add_columns(models.DataIdentifier.lumiblocknr).\
+                    outerjoin(models.DataIdentifier, and_(models.DataIdentifier.scope == models.DataIdentifierAssociation.child_scope,
+                                                          models.DataIdentifier.name == models.DataIdentifierAssociation.child_name))
+            else:
+                query = query.add_columns(null())
+            for row in query.yield_per(1000):
+                if __expand(row[4], did_types):
+                    next_frontier.append((row[2], row[3]))
+                if not did_types or row[4] in did_types:
+                    yield __to_descendant(row, long)
+        frontier = next_frontier
+
+
+def __to_descendant(row, long):
+    """
+    Convert a row of list_descendants to a dictionary.
+    """
+    parent_scope, parent_name, child_scope, child_name, child_type, bytes, adler32, guid, events, depth, lumiblocknr = row
+    descendant = {'scope': child_scope, 'name': child_name, 'type': child_type,
+                  'parent_scope': parent_scope, 'parent_name': parent_name,
+                  'bytes': bytes, 'adler32': adler32, 'guid': guid, 'events': events,
+                  'depth': depth}
+    if long:
+        descendant['lumiblocknr'] = lumiblocknr
+    return descendant
@@ -9,16 +9,74 @@
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2015
 # - Vincent Garonne, <vincent.garonne@cern.ch>, 2015-2017
 
+import bisect
 import datetime
 import hashlib
 
 from sqlalchemy.sql import distinct
 
+from rucio.core import profiling
 from rucio.db.sqla.models import Heartbeats
 from rucio.db.sqla.session import read_session, transactional_session
 from rucio.common.exception import DatabaseException
 from rucio.common.utils import pid_exists
 
+# number of positions of every thread on the hash ring
+DEFAULT_VNODES = 64
+
+# All daemons heartbeat, so they are set up for profiling here
+profiling.setup()
+
+
+class HashRing(object):
+    """
+    Consistent hash ring over the live threads of an executable.
+
+    Every node is placed on the ring at vnodes positions derived from its name, and a key
+    belongs to the node at the first position following the hash of the key. When a node
+    joins or leaves, only the keys of the ring segments next to its positions move.
+    """
+
+    def __init__(self, nodes, vnodes=DEFAULT_VNODES):
+        """
+        :param nodes: Names of the nodes.
+        :param vnodes: Number of positions of every node on the ring.
+        """
+        self.nodes = sorted(set(nodes))
+        positions = sorted((_ring_hash('%s#%s' % (node, vnode)), node) for node in self.nodes for vnode in xrange(vnodes))
+        self.__tokens = [token for token, _ in positions]
+        self.__owners = [node for _, node in positions]
+
+    def get_node(self, key):
+        """
+        Return the node a key belongs to, None if the ring is empty.
+
+        :param key: The key, e.g., a rule id or a did name.
+        """
+        if not self.__tokens:
+            return None
+        return self.__owners[bisect.bisect(self.__tokens, _ring_hash(key)) % len(self.__tokens)]
+
+
+def _ring_hash(key):
+    """
+    Position of a key on the hash ring, the first 64 bits of its md5.
+    """
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return int(hashlib.md5(str(key)).hexdigest()[:16], 16)
+
+
+def owns(heartbeat, key):
+    """
+    Check if a key belongs to the thread of a heartbeat.
+
+    :param heartbeat: Assignment dictionary returned by live with consistent_hashing.
+    :param key: The key, e.g., a rule id or a did name.
+    :returns: True or False.
+    """
+    return heartbeat['ring'].get_node(key) == heartbeat['node']
+
 
 @transactional_session
 def sanity_check(executable, hostname, hash_executable=None, pid=None, thread=None,
@@ -67,13 +125,16 @@ def _sanity_check(executable, hostname, hash_executable=None, session=None):
 
 
 @transactional_session
-def live(executable, hostname, pid, thread, older_than=600, hash_executable=None, session=None):
+def live(executable, hostname, pid, thread, older_than=600, hash_executable=None, consistent_hashing=False, vnodes=DEFAULT_VNODES, session=None):
     """
     Register a heartbeat for a process/thread on a given node.
     The executable name is used for the calculation of thread assignments.
     Removal of stale heartbeats is done as a scheduled database job.
 
-    TODO: Returns an assignment dictionary for the given executable.
+    The assign_thread is the position of the thread among all live threads, so it shifts for
+    every thread when one joins or dies. With consistent_hashing the live threads are also
+    placed on a HashRing, and owns(heartbeat, key) tells if a key belongs to the thread;
+    membership changes then only move the keys next to the positions of the changed thread.
 
     :param executable: Executable name as a string, e.g., conveyor-submitter.
     :param hostname: Hostname as a string, e.g., rucio-daemon-prod-01.cern.ch.
@@ -81,9 +142,13 @@ def live(executable, hostname, pid, thread, older_than=600, hash_executable=None
     :param thread: Python Thread Object.
     :param older_than: Ignore specified heartbeats older than specified nr of seconds.
     :param hash_executable: Hash of the executable.
+    :param consistent_hashing: Also return the hash ring of the live threads.
+    :param vnodes: Number of positions of every thread on the hash ring.
 
-    :returns heartbeats: Dictionary {assign_thread, nr_threads}
+    :returns heartbeats: Dictionary {assign_thread, nr_threads} with consistent_hashing also {ring, node}
     """
+    profiling.iteration(executable, thread)
+
     if not hash_executable:
         hash_executable = hashlib.sha256(executable).hexdigest()
 
@@ -125,8 +190,12 @@ def live(executable, hostname, pid, thread, older_than=600, hash_executable=None
             assign_thread = r
             break
 
-    return {'assign_thread': assign_thread,
-            'nr_threads': len(result)}
+    assignment = {'assign_thread': assign_thread,
+                  'nr_threads': len(result)}
+    if consistent_hashing:
+        assignment['node'] = '%s:%s:%s' % (hostname, pid, thread.ident)
+        assignment['ring'] = HashRing(['%s:%s:%s' % r for r in result], vnodes=vnodes)
+    return assignment
 
 
 @transactional_session
@@ -13,19 +13,137 @@
 
 """
 Graphite counters
+
+Counters, gauges and timers are aggregated in memory and sent to statsd every
+flush_interval seconds by a background thread: one value per counter and
+gauge, and at most timer_samples values per timer, with their sample rate.
+With flush_interval = 0 every update is sent at once.
+
+They are also kept as Prometheus counters, gauges and histograms for
+prometheus_text(), served on /metrics by the REST metrics application and,
+with enable_metrics, by every process on the first free port of metrics_port.
 """
 
+import atexit
+import logging
+import os
+import random
+import re
+import socket
+import threading
 import time
 
+from bisect import bisect_left
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
 from pystatsd import Client
 
-from rucio.common.config import config_get
+from rucio.common.config import config_get, config_get_bool
 
 SERVER = config_get('monitor', 'carbon_server', raise_exception=False, default='localhost')
 PORT = config_get('monitor', 'carbon_port', raise_exception=False, default=8125)
 SCOPE = config_get('monitor', 'user_scope', raise_exception=False, default='rucio')
 CLIENT = Client(host=SERVER, port=PORT, prefix=SCOPE)
 
+FLUSH_INTERVAL = float(config_get('monitor', 'flush_interval', raise_exception=False, default=5))
+TIMER_SAMPLES = int(config_get('monitor', 'timer_samples', raise_exception=False, default=100))
+ENABLE_METRICS = config_get_bool('monitor', 'enable_metrics', raise_exception=False, default=False)
+METRICS_PORT = config_get('monitor', 'metrics_port', raise_exception=False, default='8080')
+
+BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)  # ms
+MAX_PACKET_SIZE = 1400
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LOCK = threading.Lock()
+COUNTERS = {}     # stat -> delta since the last flush
+GAUGES = {}       # stat -> value since the last flush
+TIMERS = {}       # stat -> [number of values since the last flush, sampled values]
+TOTALS = {}       # stat -> total since the start, for Prometheus
+LAST_GAUGES = {}  # stat -> last value, for Prometheus
+HISTOGRAMS = {}   # stat -> [values per bucket of BUCKETS and +Inf, sum of the values]
+
+PID = os.getpid()  # process of the aggregated values, a forked process drops those of its parent
+FLUSHER = None
+FLUSHER_LOCK = threading.Lock()
+STOP = threading.Event()
+
+
+def __start_flusher():
+    """ Starts the flushing thread, again in a forked process """
+    global FLUSHER
+    if (FLUSHER is not None and FLUSHER.is_alive()) or STOP.is_set():
+        return
+    with FLUSHER_LOCK:
+        if FLUSHER is None or not FLUSHER.is_alive():
+            FLUSHER = threading.Thread(target=__flush_loop, name='monitor-flusher')
+            FLUSHER.daemon = True
+            FLUSHER.start()
+
+
+def __flush_loop():
+    while not STOP.wait(FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception:
+            logging.exception('Cannot flush the metrics')
+
+
+def __stop_flusher():
+    """ Stops the flushing thread and sends what is left, at exit """
+    STOP.set()
+    flusher = FLUSHER
+    if flusher is not None and flusher.is_alive():
+        flusher.join()
+    flush()
+
+
+def __check_fork():
+    """ Drops the values aggregated before a fork in the child process, to be called with LOCK held """
+    global PID
+    if os.getpid() != PID:
+        PID = os.getpid()
+        COUNTERS.clear()
+        GAUGES.clear()
+        TIMERS.clear()
+
+
+def flush():
+    """
+    Send the counters, gauges and timers aggregated since the last flush to statsd.
+    """
+    with LOCK:
+        __check_fork()
+        counters, gauges, timers = COUNTERS.items(), GAUGES.items(), TIMERS.items()
+        COUNTERS.clear()
+        GAUGES.clear()
+        TIMERS.clear()
+
+    lines = ['%s:%s|c' % (stat, delta) for stat, delta in counters]
+    lines.extend('%s:%f|g' % (stat, value) for stat, value in gauges)
+    for stat, (count, samples) in timers:
+        rate = '|@%f' % (len(samples) / float(count)) if len(samples) < count else ''
+        lines.extend('%s:%f|ms%s' % (stat, value, rate) for value in samples)
+    if CLIENT.prefix:
+        lines = ['%s.%s' % (CLIENT.prefix, line) for line in lines]
+
+    packet = []
+    size = 0
+    try:
+        for line in lines:
+            if packet and size + len(line) + 1 > MAX_PACKET_SIZE:
+                CLIENT.udp_sock.sendto('\n'.join(packet), CLIENT.addr)
+                packet, size = [], 0
+            packet.append(line)
+            size += len(line) + 1
+        if packet:
+            CLIENT.udp_sock.sendto('\n'.join(packet), CLIENT.addr)
+    except Exception:
+        logging.exception('Cannot send the metrics to %s:%s', SERVER, PORT)
+
+
+atexit.register(__stop_flusher)
+
 
 def record_counter(counters, delta=1):
     """
@@ -34,7 +152,18 @@ def record_counter(counters, delta=1):
     :param counters: The counter or a list of counters to be updated.
     :param delta: The increment for the counter, by default increment by 1.
     """
-    CLIENT.update_stats(counters, delta)
+    if not isinstance(counters, list):
+        counters = [counters]
+    with LOCK:
+        __check_fork()
+        for counter in counters:
+            TOTALS[counter] = TOTALS.get(counter, 0) + delta
+            if FLUSH_INTERVAL:
+                COUNTERS[counter] = COUNTERS.get(counter, 0) + delta
+    if FLUSH_INTERVAL:
+        __start_flusher()
+    else:
+        CLIENT.update_stats(counters, delta)
 
 
 def record_gauge(stat, value):
@@ -44,7 +173,15 @@ def record_gauge(stat, value):
     :param stat: The name of the stat to be updated.
     :param value: The value to log.
     """
-    CLIENT.gauge(stat, value)
+    with LOCK:
+        __check_fork()
+        LAST_GAUGES[stat] = value
+        if FLUSH_INTERVAL:
+            GAUGES[stat] = value
+    if FLUSH_INTERVAL:
+        __start_flusher()
+    else:
+        CLIENT.gauge(stat, value)
 
 
 def record_timer(stat, time):
@@ -54,7 +191,29 @@ def record_timer(stat, time):
     :param stat: The name of the stat to be updated.
     :param value: The time to log.
     """
-    CLIENT.timing(stat, time)
+    with LOCK:
+        __check_fork()
+        histogram = HISTOGRAMS.get(stat)
+        if histogram is None:
+            histogram = HISTOGRAMS[stat] = [[0] * (len(BUCKETS) + 1), 0]
+        histogram[0][bisect_left(BUCKETS, time)] += 1
+        histogram[1] += time
+        if FLUSH_INTERVAL:
+            # Reservoir sampling, to send at most TIMER_SAMPLES values per flush
+            timer = TIMERS.get(stat)
+            if timer is None:
+                timer = TIMERS[stat] = [0, []]
+            timer[0] += 1
+            if len(timer[1]) < TIMER_SAMPLES:
+                timer[1].append(time)
+            else:
+                i = random.randint(0, timer[0] - 1)
+                if i < TIMER_SAMPLES:
+                    timer[1][i] = time
+    if FLUSH_INTERVAL:
+        __start_flusher()
+    else:
+        CLIENT.timing(stat, time)
 
 
 class record_timer_block(object):
@@ -93,3 +252,83 @@ class record_timer_block(object):
                 if s[1] != 0:
                     ms = ms / s[1]
                     record_timer(s[0], ms)
+
+
+def __metric_name(stat):
+    return re.sub('[^a-zA-Z0-9_]', '_', '%s_%s' % (SCOPE, stat) if SCOPE else stat)
+
+
+def prometheus_text():
+    """
+    Render the counters, gauges and timers in the Prometheus text format.
+
+    :returns: The metrics as a string, of content type CONTENT_TYPE.
+    """
+    with LOCK:
+        totals, gauges = TOTALS.items(), LAST_GAUGES.items()
+        histograms = [(stat, list(buckets), total) for stat, (buckets, total) in HISTOGRAMS.items()]
+
+    lines = []
+    for stat, value in sorted(totals):
+        name = __metric_name(stat)
+        lines.extend(('# TYPE %s counter' % name, '%s %s' % (name, value)))
+    for stat, value in sorted(gauges):
+        name = __metric_name(stat)
+        lines.extend(('# TYPE %s gauge' % name, '%s %s' % (name, value)))
+    for stat, buckets, total in sorted(histograms):
+        name = __metric_name(stat)
+        lines.append('# TYPE %s histogram' % name)
+        count = 0
+        for bound, values in zip(BUCKETS + ('+Inf',), buckets):
+            count += values
+            lines.append('%s_bucket{le="%s"} %s' % (name, bound, count))
+        lines.extend(('%s_sum %s' % (name, total), '%s_count %s' % (name, count)))
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """ Serves prometheus_text() on /metrics """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = prometheus_text()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(ports=METRICS_PORT, host=''):
+    """
+    Serve the metrics on /metrics in a background thread, on the first free port.
+
+    :param ports: A port or a range of ports, e.g. 8080-8089 for several daemons on a node.
+    :param host: The host name to listen on, by default all interfaces.
+    :returns: The server, listening on server.server_address and stopped with shutdown() and server_close(),
+              or None if none of the ports is free.
+    """
+    first, _, last = str(ports).partition('-')
+    for port in xrange(int(first), int(last or first) + 1):
+        try:
+            server = MetricsServer((host, port), MetricsHandler)
+        except socket.error:
+            continue
+        thread = threading.Thread(target=server.serve_forever, name='monitor-metrics')
+        thread.daemon = True
+        thread.start()
+        return server
+    logging.warning('No free port in %s to serve the metrics', ports)
+
+
+if ENABLE_METRICS:
+    start_metrics_server()
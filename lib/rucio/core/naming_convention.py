@@ -14,19 +14,16 @@ from re import match, compile, error
 from sqlalchemy.exc import IntegrityError
 from traceback import format_exc
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NO_VALUE
 
+from rucio.common.cache import make_region_memcached
 from rucio.common.exception import Duplicate, RucioException, InvalidObject
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import KeyType
 from rucio.db.sqla.session import read_session, transactional_session
 
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211",
-                                            'distributed_lock': True})
+REGION = make_region_memcached('naming_convention', expiration_time=3600)
 
 
 @transactional_session
@@ -56,7 +53,7 @@ def add_naming_convention(scope, regexp, convention_type, session=None):
         raise RucioException(str(format_exc()))
 
 
-@read_session
+@read_session(replica=False)
 def get_naming_convention(scope, convention_type, session=None):
     """
     Get the naming convention for a given scope
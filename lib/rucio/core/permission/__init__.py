@@ -13,6 +13,7 @@
 from ConfigParser import NoOptionError, NoSectionError
 
 from rucio.common import config
+from rucio.core.permission.lookups import batch
 
 if config.config_has_section('permission'):
     try:
@@ -35,3 +36,18 @@ elif POLICY.lower() == 'cms':
     from .cms import *  # NOQA pylint:disable=wildcard-import
 else:
     from .generic import *  # NOQA pylint:disable=wildcard-import
+
+
+def has_permissions(issuer, action, kwargs_list):
+    """
+    Checks if an account has the specified permission to execute an action
+    with each set of parameters. Account attributes and scope ownership are
+    looked up once for the whole batch.
+
+    :param issuer: Account identifier which issues the command.
+    :param action: The action (API call) called by the account.
+    :param kwargs_list: List of arguments for the action, one per item.
+    :returns: List of True/False, one per item.
+    """
+    with batch():
+        return [has_permission(issuer=issuer, action=action, kwargs=kwargs) for kwargs in kwargs_list]  # NOQA pylint:disable=undefined-variable
@@ -0,0 +1,96 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Database lookups of the permission policies.
+
+The results are cached in the account_attributes and scope_owner regions, which
+are invalidated by the changes of account attributes, account status and scopes,
+and memoized while a batch of permissions is evaluated.
+"""
+
+import threading
+
+from contextlib import contextmanager
+
+from dogpile.cache.api import NO_VALUE
+
+import rucio.core.account
+import rucio.core.scope
+
+from rucio.common.cache import make_region_memcached
+from rucio.common.config import config_get
+
+EXPIRATION_TIME = int(config_get('permission', 'cache_time', raise_exception=False, default=600))
+
+ACCOUNT_REGION = make_region_memcached('account_attributes', expiration_time=EXPIRATION_TIME)
+SCOPE_REGION = make_region_memcached('scope_owner', expiration_time=EXPIRATION_TIME)
+
+BATCH = threading.local()
+
+
+@contextmanager
+def batch():
+    """
+    Memoize the lookups of this thread until the end of the batch. Nested batches share the memo of the outermost one.
+    """
+    outermost = getattr(BATCH, 'memo', None) is None
+    if outermost:
+        BATCH.memo = {}
+    try:
+        yield
+    finally:
+        if outermost:
+            BATCH.memo = None
+
+
+def __lookup(region, key, function, *args):
+    """
+    Return the result of the function from the batch or the region, or call it and cache its result.
+    """
+    memo = getattr(BATCH, 'memo', None)
+    if memo is not None and key in memo:
+        return memo[key]
+    value = region.get(key)
+    if value is NO_VALUE:
+        value = function(*args)
+        region.set(key, value)
+    if memo is not None:
+        memo[key] = value
+    return value
+
+
+def has_account_attribute(account, key):
+    """
+    Indicates whether the named key is present for the account.
+
+    :param account: The account name.
+    :param key: The key for the attribute.
+    :returns: True or False
+    """
+    return __lookup(ACCOUNT_REGION, 'has:%s:%s' % (account, key), rucio.core.account.has_account_attribute, account, key)
+
+
+def list_account_attributes(account):
+    """
+    Get all attributes defined for an account.
+
+    :param account: The account name.
+    :returns: List of {'key', 'value'} dicts, not to be modified.
+    """
+    return __lookup(ACCOUNT_REGION, 'list:%s' % account, rucio.core.account.list_account_attributes, account)
+
+
+def is_scope_owner(scope, account):
+    """
+    Check if the account owns the scope.
+
+    :param scope: The scope name.
+    :param account: The account name.
+    :returns: True or False
+    """
+    return __lookup(SCOPE_REGION, 'owner:%s:%s' % (scope, account), rucio.core.scope.is_scope_owner, scope, account)
@@ -0,0 +1,213 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Opt-in profiling of the daemons and the REST applications
+
+With [profiling] directory set, SIGUSR1, or every period seconds, samples the
+stacks of all threads every interval seconds for duration seconds, and writes
+them as collapsed stacks for flame graphs. With format = pstats, the daemon
+threads instead profile their next loop iteration with cProfile, and write
+it as a pstats file. SIGUSR2 writes the memory allocations by line with
+tracemalloc, started at setup when tracemalloc is a number of frames, or the
+number of objects by type without it.
+
+With iterations, the wall and CPU time of every daemon loop iteration, i.e.
+between two heartbeats of a thread, are recorded as core.monitor timers.
+
+The daemons are set up on import of core.heartbeat and the REST applications
+on import of their common module. Where signal handlers cannot be installed,
+e.g. in mod_wsgi, only the periodic sampling is available.
+"""
+
+import cProfile
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from rucio.common.config import config_get, config_get_bool
+from rucio.core.monitor import record_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+DIRECTORY = config_get('profiling', 'directory', raise_exception=False, default=None)
+SIGNALS = config_get_bool('profiling', 'signals', raise_exception=False, default=True)
+PERIOD = float(config_get('profiling', 'period', raise_exception=False, default=0))
+DURATION = float(config_get('profiling', 'duration', raise_exception=False, default=30))
+INTERVAL = float(config_get('profiling', 'interval', raise_exception=False, default=0.005))
+FORMAT = config_get('profiling', 'format', raise_exception=False, default='collapsed')
+TRACEMALLOC = int(config_get('profiling', 'tracemalloc', raise_exception=False, default=0))
+ITERATIONS = config_get_bool('profiling', 'iterations', raise_exception=False, default=False)
+TOP = 100
+
+NAME = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'
+SETUP = False
+SAMPLER = None
+REQUESTED = 0  # number of cProfile iterations requested, every daemon thread follows it
+LOCAL = threading.local()
+
+
+def output_path(suffix, thread=None):
+    """
+    Return the path of a new profile in the profiling directory.
+
+    :param suffix: The type of the profile, e.g., collapsed or pstats.
+    :param thread: The name of the profiled thread, if any.
+    """
+    name = '.'.join(str(part) for part in (NAME, os.getpid(), thread, time.strftime('%Y%m%dT%H%M%S'), suffix) if part is not None)
+    return os.path.join(DIRECTORY, name.replace(os.sep, '_'))
+
+
+def sample_stacks(duration=DURATION, interval=INTERVAL):
+    """
+    Sample the stacks of all other threads, and write them as collapsed stacks.
+
+    :param duration: Seconds to sample.
+    :param interval: Seconds between two samples.
+    :returns: The path of the collapsed stacks.
+    """
+    own = threading.current_thread().ident
+    stacks = {}
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%s)' % (code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stack = ';'.join(reversed(stack))
+            stacks[stack] = stacks.get(stack, 0) + 1
+        time.sleep(interval)
+
+    path = output_path('collapsed')
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write('%s %s\n' % (stack, count))
+    logging.info('Stacks sampled for %s seconds written to %s', duration, path)
+    return path
+
+
+def write_memory():
+    """
+    Write the largest memory allocations by line with tracemalloc, or the most frequent objects by type.
+
+    :returns: The path of the snapshot.
+    """
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        path = output_path('tracemalloc')
+        lines = [str(statistic) for statistic in tracemalloc.take_snapshot().statistics('lineno')[:TOP]]
+    else:
+        path = output_path('objects')
+        counts = {}
+        for obj in gc.get_objects():
+            type_name = type(obj).__name__
+            counts[type_name] = counts.get(type_name, 0) + 1
+        lines = ['%10s %s' % (item[1], item[0]) for item in sorted(counts.items(), key=lambda item: -item[1])[:TOP]]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    logging.info('Memory snapshot written to %s', path)
+    return path
+
+
+def profile():
+    """
+    Start a profile in the background: the stack sampling, or with format pstats cProfile of the next daemon iterations.
+    """
+    global SAMPLER, REQUESTED
+    if FORMAT == 'pstats':
+        REQUESTED += 1
+    elif SAMPLER is None or not SAMPLER.is_alive():
+        SAMPLER = threading.Thread(target=sample_stacks, name='profiling-sampler')
+        SAMPLER.daemon = True
+        SAMPLER.start()
+
+
+def __handle_profile(signum, frame):
+    profile()
+
+
+def __handle_memory(signum, frame):
+    thread = threading.Thread(target=write_memory, name='profiling-memory')
+    thread.daemon = True
+    thread.start()
+
+
+def __profile_periodically():
+    while True:
+        time.sleep(PERIOD)
+        profile()
+
+
+def __cpu_time():
+    user, system = os.times()[:2]
+    return user + system
+
+
+def iteration(executable, thread):
+    """
+    Time and profile the loop iterations of a daemon thread, called at every heartbeat.
+
+    :param executable: Executable name as a string, e.g., rucio-conveyor-submitter.
+    :param thread: Python Thread Object.
+    """
+    if not ITERATIONS and not (SETUP and FORMAT == 'pstats'):
+        return
+    if thread is not threading.current_thread():
+        return
+    now, cpu = time.time(), __cpu_time()
+    if ITERATIONS and getattr(LOCAL, 'start', None) is not None:
+        name = os.path.basename(executable.split()[0]) if executable else NAME
+        record_timer('daemons.%s.iteration.wall' % name, (now - LOCAL.start[0]) * 1000)
+        record_timer('daemons.%s.iteration.cpu' % name, (cpu - LOCAL.start[1]) * 1000)
+    LOCAL.start = (now, cpu)
+
+    if getattr(LOCAL, 'profile', None) is not None:
+        LOCAL.profile.disable()
+        path = output_path('pstats', thread=thread.name)
+        LOCAL.profile.dump_stats(path)
+        LOCAL.profile = None
+        logging.info('Profile of an iteration written to %s', path)
+    if getattr(LOCAL, 'requested', REQUESTED) != REQUESTED:
+        LOCAL.profile = cProfile.Profile()
+        LOCAL.profile.enable()
+    LOCAL.requested = REQUESTED
+
+
+def setup():
+    """
+    Install the signal handlers and start the periodic profiling, once per process and only with a profiling directory.
+    """
+    global SETUP
+    if SETUP or not DIRECTORY:
+        return
+    SETUP = True
+    if not os.path.isdir(DIRECTORY):
+        os.makedirs(DIRECTORY)
+    if TRACEMALLOC and tracemalloc is not None:
+        tracemalloc.start(TRACEMALLOC)
+    if SIGNALS:
+        if isinstance(threading.current_thread(), threading._MainThread):
+            signal.signal(signal.SIGUSR1, __handle_profile)
+            signal.signal(signal.SIGUSR2, __handle_memory)
+        else:
+            logging.warning('Profiling signal handlers can only be installed in the main thread')
+    if PERIOD:
+        thread = threading.Thread(target=__profile_periodically, name='profiling-period')
+        thread.daemon = True
+        thread.start()
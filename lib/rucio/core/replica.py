@@ -39,7 +39,7 @@ from rucio.core.rse_expression_parser import parse_expression
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import (DIDType, ReplicaState, OBSOLETE, DIDAvailability,
                                      BadFilesStatus, RuleState)
-from rucio.db.sqla.session import (read_session, stream_session, transactional_session,
+from rucio.db.sqla.session import (read_session, stream_session, transactional_session, replay,
                                    DEFAULT_SCHEMA_NAME)
 from rucio.rse import rsemanager as rsemgr
 
@@ -491,6 +491,38 @@ def list_bad_replicas(limit=10000, thread=None, total_threads=None, session=None
     return rows
 
 
+@read_session
+def list_bad_replicas_sources(replicas, session=None):
+    """
+    List the other available replicas of a set of bad replicas. A bad replica without
+    any source is lost, the others can be recovered.
+
+    :param replicas: a list of dictionary {'scope' scope, 'name': name, 'rse_id': rse_id}.
+    :param session: The database session in use.
+
+    :returns: a dictionary {(scope, name, rse_id): [rse, ...]} with the RSE names of the available sources.
+    """
+    sources, bad_rse_ids = {}, defaultdict(list)
+    for replica in replicas:
+        sources[(replica['scope'], replica['name'], replica['rse_id'])] = []
+        bad_rse_ids[(replica['scope'], replica['name'])].append(replica['rse_id'])
+    for chunk in chunks(bad_rse_ids.keys(), 100):
+        file_clause = [and_(models.RSEFileAssociation.scope == scope, models.RSEFileAssociation.name == name) for scope, name in chunk]
+        query = session.query(models.RSEFileAssociation.scope,
+                              models.RSEFileAssociation.name,
+                              models.RSEFileAssociation.rse_id,
+                              models.RSE.rse).\
+            join(models.RSE, models.RSE.id == models.RSEFileAssociation.rse_id).\
+            filter(models.RSE.deleted == false()).\
+            filter(models.RSEFileAssociation.state == ReplicaState.AVAILABLE).\
+            filter(or_(*file_clause))
+        for scope, name, rse_id, rse in query:
+            for bad_rse_id in bad_rse_ids[(scope, name)]:
+                if bad_rse_id != rse_id:
+                    sources[(scope, name, bad_rse_id)].append(rse)
+    return sources
+
+
 @stream_session
 def get_did_from_pfns(pfns, rse=None, session=None):
     """
@@ -1404,45 +1436,57 @@ def update_replicas_states(replicas, nowait=False, session=None):
                 rse_ids[replica['rse']] = get_rse_id(rse=replica['rse'], session=session)
             replica['rse_id'] = rse_ids[replica['rse']]
 
-        query = session.query(models.RSEFileAssociation).filter_by(rse_id=replica['rse_id'], scope=replica['scope'], name=replica['name'])
-        try:
-            if nowait:
-                query.with_for_update(nowait=True).one()
-        except NoResultFound:
-            # remember scope, name and rse_id
-            raise exception.ReplicaNotFound("No row found for scope: %s name: %s rse_id: %s" % (replica['scope'], replica['name'], replica['rse_id']))
-
-        if isinstance(replica['state'], str) or isinstance(replica['state'], unicode):
-            replica['state'] = ReplicaState.from_string(replica['state'])
-
-        values = {'state': replica['state']}
-        if replica['state'] == ReplicaState.BEING_DELETED:
-            query = query.filter_by(lock_cnt=0)
-            # Exclude replicas use as sources
-            stmt = exists([1]).where(and_(models.RSEFileAssociation.scope == models.Source.scope,
-                                          models.RSEFileAssociation.name == models.Source.name,
-                                          models.RSEFileAssociation.rse_id == models.Source.rse_id))
-            query = query.filter(not_(stmt))
-            values['tombstone'] = OBSOLETE
-        elif replica['state'] == ReplicaState.AVAILABLE:
-            rucio.core.lock.successful_transfer(scope=replica['scope'], name=replica['name'], rse_id=replica['rse_id'], nowait=nowait, session=session)
-        elif replica['state'] == ReplicaState.UNAVAILABLE:
-            rucio.core.lock.failed_transfer(scope=replica['scope'], name=replica['name'], rse_id=replica['rse_id'],
-                                            error_message=replica.get('error_message', None),
-                                            broken_rule_id=replica.get('broken_rule_id', None),
-                                            broken_message=replica.get('broken_message', None),
-                                            nowait=nowait, session=session)
-
-        if 'path' in replica and replica['path']:
-            values['path'] = replica['path']
-
-        if not query.update(values, synchronize_session=False):
-            if 'rse' not in replica:
-                replica['rse'] = get_rse_name(rse_id=replica['rse_id'], session=session)
-            raise exception.UnsupportedOperation('State %(state)s for replica %(scope)s:%(name)s on %(rse)s cannot be updated' % replica)
+        # Replayed alone after lock errors, without losing the replicas already updated
+        replay(__update_replica_state, args=(replica, nowait), session=session)
     return True
 
 
+def __update_replica_state(replica, nowait=False, session=None):
+    """
+    Update the state of a file replica and of its locks.
+
+    :param replica: The replica, with rse_id.
+    :param nowait:  Nowait parameter for the for_update queries.
+    :param session: The database session in use.
+    """
+    query = session.query(models.RSEFileAssociation).filter_by(rse_id=replica['rse_id'], scope=replica['scope'], name=replica['name'])
+    try:
+        if nowait:
+            query.with_for_update(nowait=True).one()
+    except NoResultFound:
+        # remember scope, name and rse_id
+        raise exception.ReplicaNotFound("No row found for scope: %s name: %s rse_id: %s" % (replica['scope'], replica['name'], replica['rse_id']))
+
+    if isinstance(replica['state'], str) or isinstance(replica['state'], unicode):
+        replica['state'] = ReplicaState.from_string(replica['state'])
+
+    values = {'state': replica['state']}
+    if replica['state'] == ReplicaState.BEING_DELETED:
+        query = query.filter_by(lock_cnt=0)
+        # Exclude replicas use as sources
+        stmt = exists([1]).where(and_(models.RSEFileAssociation.scope == models.Source.scope,
+                                      models.RSEFileAssociation.name == models.Source.name,
+                                      models.RSEFileAssociation.rse_id == models.Source.rse_id))
+        query = query.filter(not_(stmt))
+        values['tombstone'] = OBSOLETE
+    elif replica['state'] == ReplicaState.AVAILABLE:
+        rucio.core.lock.successful_transfer(scope=replica['scope'], name=replica['name'], rse_id=replica['rse_id'], nowait=nowait, session=session)
+    elif replica['state'] == ReplicaState.UNAVAILABLE:
+        rucio.core.lock.failed_transfer(scope=replica['scope'], name=replica['name'], rse_id=replica['rse_id'],
+                                        error_message=replica.get('error_message', None),
+                                        broken_rule_id=replica.get('broken_rule_id', None),
+                                        broken_message=replica.get('broken_message', None),
+                                        nowait=nowait, session=session)
+
+    if 'path' in replica and replica['path']:
+        values['path'] = replica['path']
+
+    if not query.update(values, synchronize_session=False):
+        if 'rse' not in replica:
+            replica['rse'] = get_rse_name(rse_id=replica['rse_id'], session=session)
+        raise exception.UnsupportedOperation('State %(state)s for replica %(scope)s:%(name)s on %(rse)s cannot be updated' % replica)
+
+
 @transactional_session
 def touch_replica(replica, session=None):
     """
@@ -23,7 +23,6 @@ import json
 import sqlalchemy
 import sqlalchemy.orm
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NO_VALUE
 
 from sqlalchemy.exc import DatabaseError, IntegrityError, OperationalError
@@ -36,16 +35,31 @@ import rucio.core.account_counter
 from rucio.core.rse_counter import add_counter
 
 from rucio.common import exception, utils
+from rucio.common.cache import invalidate, make_region_memcached
 from rucio.common.config import get_lfn2pfn_algorithm_default
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import RSEType
 from rucio.db.sqla.session import read_session, transactional_session, stream_session
 
 
-REGION = make_region().configure('dogpile.cache.memcached',
-                                 expiration_time=3600,
-                                 arguments={'url': "127.0.0.1:11211",
-                                            'distributed_lock': True})
+REGION = make_region_memcached('rse', expiration_time=3600)
+
+
+def invalidate_rse_caches(attributes=False, availability=False, session=None):
+    """
+    Invalidate the cached RSE information in all processes after an RSE has been changed.
+
+    :param attributes: Also invalidate the attributes and the lookups and expressions based on them.
+    :param availability: Also invalidate the lookups and expressions, which keep the availability of the RSEs.
+    :param session: The database session in use.
+    """
+    regions = ['rse_info']
+    if attributes or availability:
+        regions.extend(['rse', 'rse_expression'])
+    if attributes:
+        regions.append('rse_attributes')
+    for region in regions:
+        invalidate(region, session=session)
 
 
 @transactional_session
@@ -298,6 +312,7 @@ def add_rse_attribute(rse, key, value, session=None):
         new_rse_attr.save(session=session)
     except IntegrityError:
         raise exception.Duplicate("RSE attribute '%(key)s-%(value)s\' for RSE '%(rse)s' already exists!" % locals())
+    invalidate_rse_caches(attributes=True, session=session)
     return True
 
 
@@ -316,10 +331,11 @@ def del_rse_attribute(rse, key, session=None):
     query = session.query(models.RSEAttrAssociation).filter_by(rse_id=rse_id).filter(models.RSEAttrAssociation.key == key)
     rse_attr = query.one()
     rse_attr.delete(session=session)
+    invalidate_rse_caches(attributes=True, session=session)
     return True
 
 
-@read_session
+@read_session(replica=False)
 def list_rse_attributes(rse, rse_id=None, session=None):
     """
     List RSE attributes for a RSE.
@@ -382,7 +398,7 @@ def get_rses_with_attribute(key, session=None):
     return rse_list
 
 
-@read_session
+@read_session(replica=False)
 def get_rses_with_attribute_value(key, value, lookup_key, session=None):
     """
     Return all RSEs with a certain attribute.
@@ -710,10 +726,11 @@ def add_protocol(rse, parameter, session=None):
              or match('.*OperationalError.*cannot be null.*', e.args[0]):
             raise exception.InvalidObject('Missing values!')
         raise e
+    invalidate_rse_caches(session=session)
     return new_protocol
 
 
-@read_session
+@read_session(replica=False)
 def get_rse_protocols(rse, schemes=None, session=None):
     """
     Returns protocol information. Parameter combinations are: (operation OR default) XOR scheme.
@@ -922,6 +939,7 @@ def update_protocols(rse, scheme, data, hostname, port, session=None):
         if match('.*DatabaseError.*ORA-01407: cannot update .*RSE_PROTOCOLS.*IMPL.*to NULL.*', e.args[0]):
             raise exception.InvalidObject('Invalid values !')
         raise e
+    invalidate_rse_caches(session=session)
 
 
 @transactional_session
@@ -973,6 +991,7 @@ def del_protocols(rse, scheme, hostname=None, port=None, session=None):
                 for p in prots:
                     p.update({op_name: i})
                     i += 1
+    invalidate_rse_caches(session=session)
 
 
 @transactional_session
@@ -1012,3 +1031,6 @@ def update_rse(rse, parameters, session=None):
         query = session.query(models.RSEAttrAssociation).filter_by(rse_id=rse_id).filter(models.RSEAttrAssociation.key == rse)
         rse_attr = query.one()
         rse_attr.delete(session=session)
+    invalidate_rse_caches(attributes='name' in parameters,
+                          availability=any(key in parameters for key in availability_mapping),
+                          session=session)
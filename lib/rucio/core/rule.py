@@ -40,7 +40,7 @@ from rucio.common.exception import (InvalidRSEExpression, InvalidReplicationRule
                                     ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, RucioException,
                                     InvalidRuleWeight, StagingAreaRuleRequiresLifetime, DuplicateRule,
                                     InvalidObject, RSEBlacklisted, RuleReplaceFailed, RequestNotFound,
-                                    ManualRuleApprovalBlocked, UnsupportedOperation)
+                                    ManualRuleApprovalBlocked, UnsupportedOperation, ReplicaNotFound)
 from rucio.common.schema import validate_schema
 from rucio.common.utils import str_to_date, sizefmt
 from rucio.core import account_counter, rse_counter, request as request_core
@@ -431,9 +431,11 @@ def add_rules(dids, rules, session=None):
                         try:
                             new_rule.save(session=session)
                         except IntegrityError as error:
-                            if match('.*ORA-00001.*', str(error.args[0])):
-                                raise DuplicateRule()
-                            elif str(error.args[0]) == '(IntegrityError) UNIQUE constraint failed: rules.scope, rules.name, rules.account, rules.rse_expression, rules.copies':
+                            if match('.*ORA-00001.*', str(error.args[0]))\
+                               or match('.*IntegrityError.*UNIQUE constraint failed.*', str(error.args[0]))\
+                               or match('.*1062.*Duplicate entry.*for key.*', str(error.args[0]))\
+                               or match('.*IntegrityError.*duplicate key value violates unique constraint.*', error.args[0]) \
+                               or match('.*sqlite3.IntegrityError.*are not unique.*', error.args[0]):
                                 raise DuplicateRule()
                             raise InvalidReplicationRule(error.args[0])
 
@@ -464,7 +466,13 @@ def add_rules(dids, rules, session=None):
                         __create_rule_approval_email(rule=new_rule, session=session)
                         continue
 
-                    if rule.get('asynchronous', False):
+                    # Force ASYNC mode for large rules
+                    asynchronous = rule.get('asynchronous', False)
+                    if did.length is not None and (did.length * rule['copies']) >= 10000:
+                        asynchronous = True
+                        logging.debug("Forced injection of rule %s" % (str(new_rule.id)))
+
+                    if asynchronous:
                         new_rule.state = RuleState.INJECT
                         logging.debug("Created rule %s for injection" % str(new_rule.id))
                         continue
@@ -836,6 +844,113 @@ def delete_rule(rule_id, purge_replicas=None, soft=False, delete_parent=False, n
             request_core.cancel_request_did(scope=transfer['scope'], name=transfer['name'], dest_rse_id=transfer['rse_id'], session=session)
 
 
+@transactional_session
+def delete_rules(rule_ids, purge_replicas=None, delete_parent=False, nowait=False, session=None):
+    """
+    Delete several replication rules at once.
+
+    Equivalent to calling delete_rule for every rule, but locks, dataset locks,
+    replicas and account counters are updated with set-based statements.
+
+    :param rule_ids:        The rules to delete.
+    :param purge_replicas:  Purge the replicas immediately.
+    :param delete_parent:   Delete rules even if they have a child_rule_id set.
+    :param nowait:          Nowait parameter for the FOR UPDATE statements.
+    :param session:         The database session in use.
+    :raises:                RuleNotFound if one of the Rules cannot be found.
+    :raises:                UnsupportedOperation if one of the Rules is locked.
+    """
+
+    rule_ids = list(set(rule_ids))
+    if not rule_ids:
+        return
+
+    with record_timer_block('rule.delete_rules'):
+        rules = session.query(models.ReplicationRule).filter(models.ReplicationRule.id.in_(rule_ids)).with_for_update(nowait=nowait).all()
+        if len(rules) != len(rule_ids):
+            found = set(rule.id for rule in rules)
+            raise RuleNotFound('No rule with the id %s found' % ([rule_id for rule_id in rule_ids if rule_id not in found][0]))
+
+        rule_accounts = {}
+        for rule in rules:
+            if rule.locked:
+                raise UnsupportedOperation('The replication rule is locked and has to be unlocked before it can be deleted.')
+            if rule.child_rule_id is not None and not delete_parent:
+                raise UnsupportedOperation('The replication rule has a child rule and thus cannot be deleted.')
+            if purge_replicas is not None:
+                rule.purge_replicas = purge_replicas
+            rule_accounts[rule.id] = (rule.account, rule.purge_replicas)
+
+        # Collect the locks of all rules and aggregate them per replica
+        replica_updates = {}  # {(scope, name, rse_id): {'lock_cnt': , 'replicating': , 'purge_replicas': }}
+        account_counter_decreases = {}  # {(account, rse_id): [file_size, file_size, file_size]}
+        for scope, name, rse_id, rule_id, state, bytes in session.query(models.ReplicaLock.scope,
+                                                                        models.ReplicaLock.name,
+                                                                        models.ReplicaLock.rse_id,
+                                                                        models.ReplicaLock.rule_id,
+                                                                        models.ReplicaLock.state,
+                                                                        models.ReplicaLock.bytes).\
+                filter(models.ReplicaLock.rule_id.in_(rule_ids)).with_for_update(nowait=nowait).yield_per(1000):
+            account, purge = rule_accounts[rule_id]
+            update = replica_updates.setdefault((scope, name, rse_id), {'lock_cnt': 0, 'replicating': False, 'purge_replicas': False})
+            update['lock_cnt'] += 1
+            update['replicating'] = update['replicating'] or state == LockState.REPLICATING
+            update['purge_replicas'] = update['purge_replicas'] or purge
+            account_counter_decreases.setdefault((account, rse_id), []).append(bytes)
+
+        session.query(models.ReplicaLock).filter(models.ReplicaLock.rule_id.in_(rule_ids)).delete(synchronize_session=False)
+
+        # Update the replicas, set tombstone if applicable
+        transfers_to_delete = []  # [{'scope': , 'name':, 'rse_id':}]
+        replica_keys = list(replica_updates.keys())
+        for chunk in [replica_keys[x:x + 500] for x in xrange(0, len(replica_keys), 500)]:
+            replica_clause = [and_(models.RSEFileAssociation.scope == scope,
+                                   models.RSEFileAssociation.name == name,
+                                   models.RSEFileAssociation.rse_id == rse_id) for scope, name, rse_id in chunk]
+            for replica in session.query(models.RSEFileAssociation).filter(or_(*replica_clause)).with_for_update(nowait=nowait):
+                update = replica_updates.pop((replica.scope, replica.name, replica.rse_id))
+                replica.lock_cnt -= update['lock_cnt']
+                if replica.lock_cnt == 0:
+                    if update['replicating']:
+                        replica.state = ReplicaState.UNAVAILABLE
+                        transfers_to_delete.append({'scope': replica.scope, 'name': replica.name, 'rse_id': replica.rse_id})
+                    if update['purge_replicas']:
+                        replica.tombstone = OBSOLETE
+                    elif replica.state == ReplicaState.UNAVAILABLE:
+                        replica.tombstone = OBSOLETE
+                    elif replica.accessed_at is not None:
+                        replica.tombstone = replica.accessed_at
+                    else:
+                        replica.tombstone = replica.created_at
+        for scope, name, rse_id in replica_updates:
+            logging.error("Replica for lock %s:%s on rse %s could not be found" % (scope, name, get_rse_name(rse_id, session=session)))
+
+        # Delete the DatasetLocks
+        session.query(models.DatasetLock).filter(models.DatasetLock.rule_id.in_(rule_ids)).delete(synchronize_session=False)
+
+        # Decrease account_counters
+        for (account, rse_id), decreases in account_counter_decreases.items():
+            account_counter.decrease(rse_id=rse_id, account=account, files=len(decreases), bytes=sum(decreases), session=session)
+
+        # Release potential parent rules
+        for rule in session.query(models.ReplicationRule).filter(models.ReplicationRule.child_rule_id.in_(rule_ids)):
+            rule.expires_at = None
+            rule.child_rule_id = None
+            insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+
+        # Insert history
+        for rule in rules:
+            insert_rule_history(rule=rule, recent=False, longterm=True, session=session)
+
+        session.flush()
+        for rule in rules:
+            rule.delete(session=session, flush=False)
+        session.flush()
+
+        for transfer in transfers_to_delete:
+            request_core.cancel_request_did(scope=transfer['scope'], name=transfer['name'], dest_rse_id=transfer['rse_id'], session=session)
+
+
 @transactional_session
 def repair_rule(rule_id, session=None):
     """
@@ -1762,6 +1877,184 @@ def update_rules_for_bad_replica(scope, name, rse_id, nowait=False, session=None
         session.query(models.RSEFileAssociation).filter(models.RSEFileAssociation.scope == scope, models.RSEFileAssociation.name == name, models.RSEFileAssociation.rse_id == rse_id).update({'state': ReplicaState.UNAVAILABLE, 'tombstone': tombstone})
 
 
+@transactional_session
+def update_rules_for_lost_replicas(replicas, rse_id, nowait=False, session=None):
+    """
+    Update rules if several file replicas on an RSE are lost.
+
+    Same as update_rules_for_lost_replica, but the locks, replicas and rules are fetched
+    in bulk and every affected rule is updated once.
+
+    :param replicas:       List of dicts {'scope': ..., 'name': ...}.
+    :param rse_id:         RSE id of the replicas.
+    :param nowait:         Nowait parameter for the FOR UPDATE statement.
+    :param session:        The database session in use.
+    """
+
+    if not replicas:
+        return
+
+    locks, db_replicas, rules = __get_and_lock_bad_replicas(replicas=replicas, rse_id=rse_id, nowait=nowait, session=session)
+    rse = get_rse_name(rse_id, session=session)
+
+    account_counter_decreases = {}  # {account: [file_size, file_size, file_size]}
+    for lock in locks:
+        rule = rules[lock.rule_id]
+        db_replicas[(lock.scope, lock.name)].lock_cnt -= 1
+        if lock.state == LockState.OK:
+            rule.locks_ok_cnt -= 1
+        elif lock.state == LockState.REPLICATING:
+            rule.locks_replicating_cnt -= 1
+        elif lock.state == LockState.STUCK:
+            rule.locks_stuck_cnt -= 1
+        account_counter_decreases.setdefault(rule.account, []).append(lock.bytes)
+        session.delete(lock)
+
+    for account, decreases in account_counter_decreases.items():
+        account_counter.decrease(rse_id=rse_id, account=account, files=len(decreases), bytes=sum(decreases), session=session)
+
+    for rule in rules.values():
+        rule_state_before = rule.state
+        if rule.state == RuleState.SUSPENDED:
+            pass
+        elif rule.state == RuleState.STUCK:
+            pass
+        elif rule.locks_replicating_cnt == 0 and rule.locks_stuck_cnt == 0:
+            rule.state = RuleState.OK
+            if rule.grouping != RuleGrouping.NONE:
+                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.OK})
+                session.flush()
+                if rule_state_before != RuleState.OK:
+                    generate_message_for_dataset_ok_callback(rule=rule, session=session)
+                    generate_email_for_rule_ok_notification(rule=rule, session=session)
+            # Try to release potential parent rules
+            release_parent_rule(child_rule_id=rule.id, session=session)
+        # Insert rule history
+        insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+
+    for replica in db_replicas.values():
+        if replica.lock_cnt != 0:
+            # This should never happen
+            raise RucioException('Problem with the locks')
+        replica.tombstone = OBSOLETE
+        replica.state = ReplicaState.UNAVAILABLE
+
+    files = db_replicas.keys()
+    for chunk in [files[x:x + 100] for x in xrange(0, len(files), 100)]:
+        did_clause = [and_(models.DataIdentifier.scope == scope, models.DataIdentifier.name == name) for scope, name in chunk]
+        session.query(models.DataIdentifier).filter(or_(*did_clause)).update({'availability': DIDAvailability.LOST}, synchronize_session=False)
+
+        # Detach the lost files from their datasets, one call per dataset
+        datasets = {}
+        parent_clause = [and_(models.DataIdentifierAssociation.child_scope == scope, models.DataIdentifierAssociation.child_name == name) for scope, name in chunk]
+        for ds_scope, ds_name, scope, name in session.query(models.DataIdentifierAssociation.scope,
+                                                            models.DataIdentifierAssociation.name,
+                                                            models.DataIdentifierAssociation.child_scope,
+                                                            models.DataIdentifierAssociation.child_name).filter(or_(*parent_clause)):
+            datasets.setdefault((ds_scope, ds_name), []).append({'scope': scope, 'name': name})
+        for (ds_scope, ds_name), dids in datasets.items():
+            for did in dids:
+                logging.info('File %s:%s bad at site %s is completely lost from dataset %s:%s. Will be marked as LOST and detached' % (did['scope'], did['name'], rse, ds_scope, ds_name))
+                add_message('LOST', {'scope': did['scope'],
+                                     'name': did['name'],
+                                     'dataset_name': ds_name,
+                                     'dataset_scope': ds_scope},
+                            session=session)
+            rucio.core.did.detach_dids(scope=ds_scope, name=ds_name, dids=dids, session=session)
+
+
+@transactional_session
+def update_rules_for_bad_replicas(replicas, rse_id, nowait=False, session=None):
+    """
+    Update rules if several file replicas on an RSE are bad and have to be recreated.
+
+    Same as update_rules_for_bad_replica, but the locks, replicas, rules and existing
+    requests are fetched in bulk and every affected rule is updated once.
+
+    :param replicas:       List of dicts {'scope': ..., 'name': ...}.
+    :param rse_id:         RSE id of the replicas.
+    :param nowait:         Nowait parameter for the FOR UPDATE statement.
+    :param session:        The database session in use.
+    """
+
+    if not replicas:
+        return
+
+    locks, db_replicas, rules = __get_and_lock_bad_replicas(replicas=replicas, rse_id=rse_id, nowait=nowait, session=session)
+    rse = get_rse_name(rse_id, session=session)
+
+    # Files which already have a request to this RSE
+    requested = set()
+    files = db_replicas.keys()
+    for chunk in [files[x:x + 100] for x in xrange(0, len(files), 100)]:
+        request_clause = [and_(models.Request.scope == scope, models.Request.name == name) for scope, name in chunk]
+        requested.update(session.query(models.Request.scope, models.Request.name).filter(models.Request.dest_rse_id == rse_id, or_(*request_clause)))
+
+    datasets, locked_files = set(), set()
+    updated_collection_replicas = set()
+    transfers = []
+    for lock in locks:
+        rule = rules[lock.rule_id]
+        replica = db_replicas[(lock.scope, lock.name)]
+        locked_files.add((lock.scope, lock.name))
+        # If source replica expression exists, we remove it
+        if rule.source_replica_expression:
+            rule.source_replica_expression = None
+        # Get the affected datasets
+        ds_scope = rule.scope
+        ds_name = rule.name
+        if (lock.scope, lock.name, ds_scope, ds_name) not in datasets:
+            datasets.add((lock.scope, lock.name, ds_scope, ds_name))
+            logging.info('Recovering file %s:%s from dataset %s:%s at site %s' % (lock.scope, lock.name, ds_scope, ds_name, rse))
+        updated_collection_replicas.add((ds_scope, ds_name, rule.did_type))
+        # Set the lock counters
+        if lock.state == LockState.OK:
+            rule.locks_ok_cnt -= 1
+        elif lock.state == LockState.REPLICATING:
+            rule.locks_replicating_cnt -= 1
+        elif lock.state == LockState.STUCK:
+            rule.locks_stuck_cnt -= 1
+        rule.locks_replicating_cnt += 1
+        # Generate the request
+        if (lock.scope, lock.name) not in requested:
+            requested.add((lock.scope, lock.name))
+            transfers.append(create_transfer_dict(dest_rse_id=rse_id,
+                                                  request_type=RequestType.TRANSFER,
+                                                  scope=lock.scope, name=lock.name, rule=rule, lock=lock, bytes=replica.bytes, md5=replica.md5, adler32=replica.adler32,
+                                                  ds_scope=ds_scope, ds_name=ds_name, lifetime=None, activity='Recovery', session=session))
+        lock.state = LockState.REPLICATING
+
+    # Insert new rows in the UpdateCollectionReplica table
+    for ds_scope, ds_name, did_type in updated_collection_replicas:
+        models.UpdatedCollectionReplica(scope=ds_scope,
+                                        name=ds_name,
+                                        did_type=did_type,
+                                        rse_id=rse_id).save(flush=False, session=session)
+
+    for rule in rules.values():
+        if rule.state == RuleState.SUSPENDED:
+            pass
+        elif rule.state == RuleState.STUCK:
+            pass
+        else:
+            rule.state = RuleState.REPLICATING
+            if rule.grouping != RuleGrouping.NONE:
+                session.query(models.DatasetLock).filter_by(rule_id=rule.id).update({'state': LockState.REPLICATING})
+        # Insert rule history
+        insert_rule_history(rule=rule, recent=True, longterm=False, session=session)
+
+    if transfers:
+        request_core.queue_requests(requests=transfers, session=session)
+
+    for (scope, name), replica in db_replicas.items():
+        if (scope, name) in locked_files:
+            replica.state = ReplicaState.COPYING
+        else:
+            logging.info('File %s:%s at site %s has no locks. Will be deleted now.' % (scope, name, rse))
+            replica.state = ReplicaState.UNAVAILABLE
+            replica.tombstone = OBSOLETE
+
+
 @transactional_session
 def generate_message_for_dataset_ok_callback(rule, session=None):
     """
@@ -2729,6 +3022,40 @@ def __create_locks_replicas_transfers(datasetfiles, locks, replicas, source_repl
     logging.debug("Finished creating locks and replicas for rule %s [%d/%d/%d]" % (str(rule.id), rule.locks_ok_cnt, rule.locks_replicating_cnt, rule.locks_stuck_cnt))
 
 
+@transactional_session
+def __get_and_lock_bad_replicas(replicas, rse_id, nowait=False, session=None):
+    """
+    Get and lock the replicas, replica locks and rules for a set of replicas on one RSE.
+
+    :param replicas:       List of dicts {'scope': ..., 'name': ...}.
+    :param rse_id:         RSE id of the replicas.
+    :param nowait:         Nowait parameter for the FOR UPDATE statements.
+    :param session:        The database session in use.
+    :returns:              (locks, {(scope, name): replica}, {rule_id: rule})
+    :raises:               ReplicaNotFound if one of the replicas does not exist.
+    """
+
+    files = list(set((replica['scope'], replica['name']) for replica in replicas))
+    locks, db_replicas, rules = [], {}, {}
+    for chunk in [files[x:x + 100] for x in xrange(0, len(files), 100)]:
+        lock_clause = [and_(models.ReplicaLock.scope == scope, models.ReplicaLock.name == name) for scope, name in chunk]
+        locks.extend(session.query(models.ReplicaLock).filter(models.ReplicaLock.rse_id == rse_id, or_(*lock_clause)).with_for_update(nowait=nowait).all())
+        replica_clause = [and_(models.RSEFileAssociation.scope == scope, models.RSEFileAssociation.name == name) for scope, name in chunk]
+        for replica in session.query(models.RSEFileAssociation).filter(models.RSEFileAssociation.rse_id == rse_id, or_(*replica_clause)).with_for_update(nowait=nowait):
+            db_replicas[(replica.scope, replica.name)] = replica
+
+    for scope, name in files:
+        if (scope, name) not in db_replicas:
+            raise ReplicaNotFound('No replica of %s:%s found on %s' % (scope, name, get_rse_name(rse_id, session=session)))
+
+    rule_ids = list(set(lock.rule_id for lock in locks))
+    for chunk in [rule_ids[x:x + 100] for x in xrange(0, len(rule_ids), 100)]:
+        for rule in session.query(models.ReplicationRule).filter(models.ReplicationRule.id.in_(chunk)).with_for_update(nowait=nowait):
+            rules[rule.id] = rule
+
+    return locks, db_replicas, rules
+
+
 @transactional_session
 def __delete_lock_and_update_replica(lock, purge_replicas=False, nowait=False, session=None):
     """
@@ -16,6 +16,7 @@ from re import match
 from sqlalchemy.exc import IntegrityError
 from traceback import format_exc
 
+from rucio.common.cache import invalidate
 from rucio.common.exception import AccountNotFound, Duplicate, RucioException
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import AccountStatus, ScopeStatus
@@ -47,6 +48,7 @@ def add_scope(scope, account, session=None):
             raise Duplicate('Scope \'%s\' already exists!' % scope)
     except:
         raise RucioException(str(format_exc()))
+    invalidate('scope_owner', session=session)
 
 
 @read_session
@@ -118,7 +120,7 @@ def check_scope(scope_to_check, session=None):
     return True if session.query(models.Scope).filter_by(scope=scope_to_check).first() else False
 
 
-@read_session
+@read_session(replica=False)
 def is_scope_owner(scope, account, session=None):
     """ check to see if account owns the scope.
 
@@ -16,13 +16,13 @@ import logging
 import time
 import traceback
 
-from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 from sqlalchemy import and_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql.expression import asc, bindparam, text, false
 
 from rucio.common import constants
+from rucio.common.cache import make_region_memcached
 from rucio.common.exception import RucioException, UnsupportedOperation, InvalidRSEExpression, RSEProtocolNotSupported
 from rucio.common.rse_attributes import get_rse_attributes
 from rucio.common.utils import construct_surl
@@ -42,9 +42,7 @@ where the external_id is already known.
 Requests accessed by request_id  are covered in the core request.py
 """
 
-REGION_SHORT = make_region().configure('dogpile.cache.memcached',
-                                       expiration_time=600,
-                                       arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+REGION_SHORT = make_region_memcached('transfer_short', expiration_time=600)
 
 
 def submit_bulk_transfers(external_host, files, transfertool='fts3', job_params={}, timeout=None):
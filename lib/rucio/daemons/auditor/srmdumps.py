@@ -18,7 +18,7 @@
 
 from rucio.common.config import __CONFIGFILES as __RUCIOCONFIGFILES
 from rucio.common.dumper import DUMPS_CACHE_DIR
-from rucio.common.dumper import http_download_to_file, srm_download_to_file, ddmendpoint_url, temp_file
+from rucio.common.dumper import http_download_to_file, http_parallel_download, srm_download_to_file, ddmendpoint_url, temp_file
 
 import ConfigParser
 import HTMLParser
@@ -246,8 +246,11 @@ def download_rse_dump(rse, configuration, date='latest', destdir=DUMPS_CACHE_DIR
 
     if not os.path.exists(path):
         logger.debug('Trying to download: "%s"', url)
-        with temp_file(destdir, final_name=filename) as (f, _):
-            download(url, f)
+        if protocol(url) == 'http':
+            http_parallel_download(url, destdir, filename)
+        else:
+            with temp_file(destdir, final_name=filename) as (f, _):
+                download(url, f)
 
     return (path, date)
 
@@ -0,0 +1,334 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Fake FTS3 REST service for load simulations of the conveyor daemons.
+
+It implements the part of the FTS3 REST API used by rucio.transfertool.fts3:
+whoami, submission, bulk query, files query, priority update and cancellation
+of jobs. No file is transferred: every file becomes ACTIVE after a random part
+of the transfer time, and FINISHED or FAILED, with the configured failure rate,
+after the transfer time on average. Submissions and queries can be slowed down
+and submissions can fail, to simulate an overloaded server.
+"""
+
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+from rucio.common.config import config_get
+
+logging.basicConfig(stream=sys.stdout,
+                    level=getattr(logging,
+                                  config_get('common', 'loglevel',
+                                             raise_exception=False,
+                                             default='DEBUG').upper()),
+                    format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
+
+TERMINAL_STATES = ('FINISHED', 'FAILED', 'CANCELED')
+
+graceful_stop = threading.Event()
+
+
+def fts_time(timestamp):
+    """ Format a timestamp like FTS3 """
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp)) if timestamp else None
+
+
+class FakeFTS3(object):
+    """
+    State of the fake FTS3 server, and the HTTP server serving it.
+    """
+
+    def __init__(self, host='localhost', port=0, transfer_time=10, failure_rate=0.0,
+                 submit_latency=0.0, query_latency=0.0, submit_failure_rate=0.0, seed=None):
+        """
+        :param host: Host name to listen on.
+        :param port: Port to listen on, 0 for any free port.
+        :param transfer_time: Average seconds from the submission to the end of a transfer.
+        :param failure_rate: Fraction of the transfers failing.
+        :param submit_latency: Seconds taken by a submission.
+        :param query_latency: Seconds taken by a query.
+        :param submit_failure_rate: Fraction of the submissions failing with an HTTP error.
+        :param seed: Seed of the random failures and durations.
+        """
+        self.host = host
+        self.port = port
+        self.transfer_time = transfer_time
+        self.failure_rate = failure_rate
+        self.submit_latency = submit_latency
+        self.query_latency = query_latency
+        self.submit_failure_rate = submit_failure_rate
+        self.base_id = str(uuid.uuid4())
+        self.vo = 'rucio'
+        self.jobs = {}
+        self.counters = {'submissions': 0, 'submission_failures': 0, 'queries': 0, 'cancellations': 0}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        """ URL of the server, to be used as fts attribute of the RSEs """
+        return 'http://%s:%s' % (self.host, self.server.server_port if self.server else self.port)
+
+    def start(self):
+        """ Start serving in a background thread """
+        self.server = ThreadedHTTPServer((self.host, self.port), FakeFTS3Handler)
+        self.server.fts = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name='FakeFTS3')
+        self.thread.daemon = True
+        self.thread.start()
+        logging.info('fake FTS3 listening on %s' % self.url)
+        return self
+
+    def stop(self):
+        """ Stop serving """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+
+    def __file_state(self, file, now):
+        if file['canceled_at']:
+            return 'CANCELED'
+        if now < file['start']:
+            return 'SUBMITTED'
+        if now < file['finish']:
+            return 'ACTIVE'
+        return 'FAILED' if file['fail'] else 'FINISHED'
+
+    def __file(self, file, now):
+        state = self.__file_state(file, now)
+        finish_time = file['canceled_at'] if state == 'CANCELED' else file['finish'] if state in TERMINAL_STATES else None
+        return {'file_id': file['file_id'],
+                'file_state': state,
+                'source_surl': file['source_surl'],
+                'dest_surl': file['dest_surl'],
+                'start_time': fts_time(file['start']) if state != 'SUBMITTED' else None,
+                'finish_time': fts_time(finish_time),
+                'reason': 'TRANSFER [5] Simulated failure' if state == 'FAILED' else 'Simulated cancellation' if state == 'CANCELED' else '',
+                'file_metadata': file['file_metadata'],
+                'filesize': file['filesize'],
+                'checksum': file['checksum']}
+
+    def __job(self, job, now):
+        files = [self.__file(file, now) for file in job['files']]
+        states = set(file['file_state'] for file in files)
+        if not states.issubset(TERMINAL_STATES):
+            job_state = 'ACTIVE' if 'ACTIVE' in states or states.intersection(TERMINAL_STATES) else 'SUBMITTED'
+        elif states == set(['FINISHED']):
+            job_state = 'FINISHED'
+        elif 'FINISHED' in states:
+            job_state = 'FINISHEDDIRTY'
+        elif 'CANCELED' in states:
+            job_state = 'CANCELED'
+        else:
+            job_state = 'FAILED'
+        return {'job_id': job['job_id'],
+                'job_state': job_state,
+                'job_metadata': job['job_metadata'],
+                'priority': job['priority'],
+                'submit_time': fts_time(job['submit_time']),
+                'http_status': '200 Ok',
+                'files': files}
+
+    def whoami(self):
+        return 200, {'base_id': self.base_id, 'vos': [self.vo], 'user_dn': '/CN=Rucio fake FTS3', 'delegation_id': 'fake'}
+
+    def version(self):
+        return 200, {'api': {'major': 3, 'minor': 7, 'patch': 0}, 'schema': {'major': 3, 'minor': 0, 'patch': 0}}
+
+    def submit(self, body):
+        """ Submit a job of files, with optional deterministic id like FTS3 """
+        time.sleep(self.submit_latency)
+        with self.lock:
+            self.counters['submissions'] += 1
+            if self.random.random() < self.submit_failure_rate:
+                self.counters['submission_failures'] += 1
+                return 500, {'status': '500 Internal Server Error', 'message': 'Simulated submission failure'}
+            params = body.get('params', {})
+            if params.get('id_generator') == 'deterministic':
+                job_id = str(uuid.uuid5(uuid.uuid5(uuid.UUID(self.base_id), self.vo), str(params['sid'])))
+            else:
+                job_id = str(uuid.uuid4())
+            now = time.time()
+            files = []
+            for file in body.get('files', []):
+                duration = self.random.uniform(0.5, 1.5) * self.transfer_time
+                files.append({'file_id': len(files) + 1,
+                              'source_surl': file['sources'][0],
+                              'dest_surl': file['destinations'][0],
+                              'file_metadata': file.get('metadata', {}),
+                              'filesize': file.get('filesize'),
+                              'checksum': file.get('checksum'),
+                              'start': now + self.random.uniform(0, 0.5) * duration,
+                              'finish': now + duration,
+                              'fail': self.random.random() < self.failure_rate,
+                              'canceled_at': None})
+            self.jobs[job_id] = {'job_id': job_id,
+                                 'job_metadata': params.get('job_metadata', {}),
+                                 'priority': params.get('priority', 3),
+                                 'submit_time': now,
+                                 'files': files}
+        return 200, {'job_id': job_id}
+
+    def query(self, job_ids):
+        """ Query one job, or several with their files in a 207 response """
+        time.sleep(self.query_latency)
+        now = time.time()
+        with self.lock:
+            self.counters['queries'] += 1
+            responses = []
+            for job_id in job_ids:
+                if job_id in self.jobs:
+                    responses.append(self.__job(self.jobs[job_id], now))
+                else:
+                    responses.append({'job_id': job_id, 'http_status': '404 Not Found', 'http_message': 'No job with the id "%s" has been found' % job_id})
+        if len(responses) == 1:
+            return 200 if responses[0]['http_status'] == '200 Ok' else 404, responses[0]
+        return 207, responses
+
+    def query_files(self, job_id):
+        time.sleep(self.query_latency)
+        with self.lock:
+            self.counters['queries'] += 1
+            if job_id not in self.jobs:
+                return 404, {'status': '404 Not Found', 'message': 'No job with the id "%s" has been found' % job_id}
+            return 200, self.__job(self.jobs[job_id], time.time())['files']
+
+    def list_jobs(self, states):
+        """ List the jobs in some states, as used by query_latest """
+        now = time.time()
+        with self.lock:
+            jobs = [self.__job(job, now) for job in self.jobs.values()]
+        return 200, [job for job in jobs if not states or job['job_state'] in states]
+
+    def update_priority(self, job_id, body):
+        with self.lock:
+            if job_id not in self.jobs:
+                return 404, {'status': '404 Not Found', 'message': 'No job with the id "%s" has been found' % job_id}
+            self.jobs[job_id]['priority'] = body.get('params', {}).get('priority', self.jobs[job_id]['priority'])
+            return 200, self.__job(self.jobs[job_id], time.time())
+
+    def cancel(self, job_id):
+        """ Cancel the files of a job not yet finished """
+        now = time.time()
+        with self.lock:
+            self.counters['cancellations'] += 1
+            if job_id not in self.jobs:
+                return 404, {'status': '404 Not Found', 'message': 'No job with the id "%s" has been found' % job_id}
+            for file in self.jobs[job_id]['files']:
+                if self.__file_state(file, now) not in TERMINAL_STATES:
+                    file['canceled_at'] = now
+            return 200, self.__job(self.jobs[job_id], now)
+
+    def stats(self):
+        """
+        :returns: Counters of the requests served, and the number of files in every state.
+        """
+        now = time.time()
+        with self.lock:
+            stats = dict(self.counters)
+            stats['jobs'] = len(self.jobs)
+            for job in self.jobs.values():
+                for file in job['files']:
+                    state = self.__file_state(file, now)
+                    stats[state] = stats.get(state, 0) + 1
+        return stats
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeFTS3Handler(BaseHTTPRequestHandler):
+    """ Routes the FTS3 REST calls to the FakeFTS3 of the server """
+
+    def log_message(self, format, *args):
+        logging.debug('fake FTS3: ' + format % args)
+
+    def __reply(self, result):
+        status, body = result
+        data = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def __path(self):
+        url = urlparse(self.path)
+        return [part for part in url.path.split('/') if part], parse_qs(url.query)
+
+    def do_GET(self):
+        fts = self.server.fts
+        path, query = self.__path()
+        if not path:
+            return self.__reply(fts.version())
+        if path == ['whoami']:
+            return self.__reply(fts.whoami())
+        if path == ['jobs']:
+            states = query.get('state_in', [''])[0]
+            return self.__reply(fts.list_jobs([state for state in states.split(',') if state]))
+        if len(path) == 2 and path[0] == 'jobs':
+            return self.__reply(fts.query(path[1].split(',')))
+        if len(path) == 3 and path[0] == 'jobs' and path[2] == 'files':
+            return self.__reply(fts.query_files(path[1]))
+        self.__reply((404, {'status': '404 Not Found', 'message': self.path}))
+
+    def do_POST(self):
+        fts = self.server.fts
+        path, _ = self.__path()
+        if path == ['jobs']:
+            return self.__reply(fts.submit(self.__body()))
+        if len(path) == 2 and path[0] == 'jobs':
+            return self.__reply(fts.update_priority(path[1], self.__body()))
+        self.__reply((404, {'status': '404 Not Found', 'message': self.path}))
+
+    def do_DELETE(self):
+        path, _ = self.__path()
+        if len(path) == 2 and path[0] == 'jobs':
+            return self.__reply(self.server.fts.cancel(path[1]))
+        self.__reply((404, {'status': '404 Not Found', 'message': self.path}))
+
+
+def stop(signum=None, frame=None):
+    """
+    Graceful exit.
+    """
+
+    graceful_stop.set()
+
+
+def run(host='localhost', port=8446, **kwargs):
+    """
+    Serves a fake FTS3 until stopped.
+
+    :param host: Host name to listen on.
+    :param port: Port to listen on.
+    :param kwargs: Parameters of FakeFTS3.
+    """
+    fts = FakeFTS3(host=host, port=port, **kwargs).start()
+    logging.info('waiting for interrupts')
+    while not graceful_stop.is_set():
+        graceful_stop.wait(3.14)
+    fts.stop()
@@ -29,9 +29,11 @@ from traceback import format_exception
 
 from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException
+from rucio.common.utils import chunks
 from rucio.core import monitor, heartbeat
-from rucio.core.replica import list_bad_replicas, list_replicas, list_bad_replicas_history, update_bad_replicas_history
-from rucio.core.rule import update_rules_for_lost_replica, update_rules_for_bad_replica
+from rucio.core.replica import list_bad_replicas, list_bad_replicas_sources, list_bad_replicas_history, update_bad_replicas_history
+from rucio.core.rule import (update_rules_for_lost_replica, update_rules_for_bad_replica,
+                             update_rules_for_lost_replicas, update_rules_for_bad_replicas)
 
 
 logging.basicConfig(stream=stdout,
@@ -44,14 +46,18 @@ logging.basicConfig(stream=stdout,
 graceful_stop = threading.Event()
 
 
-def necromancer(thread=0, bulk=5, once=False):
+def necromancer(thread=0, bulk=5, once=False, chunk_size=100):
     """
     Creates a Necromancer Worker that gets a list of bad replicas for a given hash,
     identify lost DIDs and for non-lost ones, set the locks and rules for reevaluation.
 
+    The bad replicas are grouped per RSE and updated chunk by chunk, falling back to
+    one replica at a time if a chunk fails.
+
     :param thread: Thread number at startup.
     :param bulk: The number of requests to process.
     :param once: Run only once.
+    :param chunk_size: The number of replicas updated in one transaction.
     """
 
     sleep_time = 60
@@ -73,26 +79,33 @@ def necromancer(thread=0, bulk=5, once=False):
         try:
             replicas = list_bad_replicas(limit=bulk, thread=hb['assign_thread'], total_threads=hb['nr_threads'])
 
-            for replica in replicas:
-                scope, name, rse_id, rse = replica['scope'], replica['name'], replica['rse_id'], replica['rse']
-                logging.info(prepend_str + 'Working on %s:%s on %s' % (scope, name, rse))
-
-                rep = [r for r in list_replicas([{'scope': scope, 'name': name}, ])]
-                if (not rep[0]['rses']) or (rep[0]['rses'].keys() == [rse]):
+            # Split the bad replicas per RSE into lost and recoverable files
+            lost, recoverable = {}, {}
+            for (scope, name, rse_id), sources in list_bad_replicas_sources(replicas).items():
+                if not sources:
                     logging.info(prepend_str + 'File %s:%s has no other replicas, it will be marked as lost' % (scope, name))
-                    try:
-                        update_rules_for_lost_replica(scope=scope, name=name, rse_id=rse_id, nowait=True)
-                        monitor.record_counter(counters='necromancer.badfiles.lostfile', delta=1)
-                    except DatabaseException, error:
-                        logging.info(prepend_str + '%s' % (str(error)))
-
+                    lost.setdefault(rse_id, []).append({'scope': scope, 'name': name})
                 else:
-                    logging.info(prepend_str + 'File %s:%s can be recovered. Available sources : %s' % (scope, name, str(rep[0]['rses'])))
-                    try:
-                        update_rules_for_bad_replica(scope=scope, name=name, rse_id=rse_id, nowait=True)
-                        monitor.record_counter(counters='necromancer.badfiles.recovering', delta=1)
-                    except DatabaseException, error:
-                        logging.info(prepend_str + '%s' % (str(error)))
+                    logging.info(prepend_str + 'File %s:%s can be recovered. Available sources : %s' % (scope, name, str(sources)))
+                    recoverable.setdefault(rse_id, []).append({'scope': scope, 'name': name})
+
+            for files_per_rse, bulk_method, method, counter in ((lost, update_rules_for_lost_replicas, update_rules_for_lost_replica, 'necromancer.badfiles.lostfile'),
+                                                                (recoverable, update_rules_for_bad_replicas, update_rules_for_bad_replica, 'necromancer.badfiles.recovering')):
+                for rse_id, files in files_per_rse.items():
+                    for chunk in chunks(files, chunk_size):
+                        try:
+                            bulk_method(replicas=chunk, rse_id=rse_id, nowait=True)
+                            monitor.record_counter(counters=counter, delta=len(chunk))
+                            continue
+                        except Exception, error:
+                            logging.warning(prepend_str + 'Bulk update of %s files failed, falling back to one file at a time: %s' % (len(chunk), str(error)))
+                            monitor.record_counter(counters='necromancer.badfiles.bulk.fallback', delta=1)
+                        for replica in chunk:
+                            try:
+                                method(scope=replica['scope'], name=replica['name'], rse_id=rse_id, nowait=True)
+                                monitor.record_counter(counters=counter, delta=1)
+                            except DatabaseException, error:
+                                logging.info(prepend_str + '%s' % (str(error)))
 
             logging.info(prepend_str + 'It took %s seconds to process %s replicas' % (str(time.time() - stime), str(len(replicas))))
         except Exception:
@@ -34,7 +34,7 @@ from sys import exc_info, stdout, argv
 from traceback import format_exception
 
 
-from rucio.api.did import list_new_dids, set_new_dids, get_metadata
+from rucio.api.did import list_new_dids, set_new_dids, get_metadata_bulk
 from rucio.api.subscription import list_subscriptions, update_subscription
 from rucio.db.sqla.constants import DIDType, SubscriptionState
 from rucio.common.exception import (DatabaseException, DataIdentifierNotFound, InvalidReplicationRule, DuplicateRule, RSEBlacklisted,
@@ -47,7 +47,7 @@ from rucio.core import monitor, heartbeat
 from rucio.core.rse import list_rses
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.core.rse_selector import RSESelector
-from rucio.core.rule import add_rule, list_rules
+from rucio.core.rule import add_rule, add_rules, list_rules
 
 
 logging.basicConfig(stream=stdout,
@@ -141,6 +141,291 @@ def is_matching_subscription(subscription, did, metadata):
     return True
 
 
+class SubscriptionMatcher(object):
+    """
+    Pre-compiled version of is_matching_subscription for a list of subscriptions.
+
+    The filters are parsed and their regular expressions compiled once per
+    refresh of the subscriptions. Subscriptions filtering on one of INDEX_KEYS
+    with literal values only are indexed on these values, so a DID is only
+    tested against the subscriptions which can possibly match it.
+    """
+
+    INDEX_KEYS = ('scope', 'project', 'datatype')
+    REGEX_SPECIAL_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+    def __init__(self, subscriptions, prepend_str=''):
+        """
+        :param subscriptions: The list of subscription dictionnaries, in order of priority.
+        :param prepend_str: Prefix for the log messages.
+        """
+        self.subscriptions = []
+        self.index = dict((key, {}) for key in self.INDEX_KEYS)
+        self.unindexed = []
+        for subscription in subscriptions:
+            try:
+                compiled = self._compile(loads(subscription['filter']))
+            except (ValueError, re.error), error:
+                logging.error(prepend_str + '%s : Subscription %s will be skipped' % (error, subscription['name']))
+                continue
+            position = len(self.subscriptions)
+            self.subscriptions.append((subscription, compiled))
+            index_key = self._index_key(compiled)
+            if index_key is None:
+                self.unindexed.append(position)
+            else:
+                for value in compiled[index_key]:
+                    self.index[index_key].setdefault(value.pattern, []).append(position)
+
+    def _compile(self, filter):
+        """
+        Converts a subscription filter into a dictionnary of lists of compiled regular expressions.
+        """
+        compiled = {}
+        for key in filter:
+            values = filter[key]
+            if key in ('pattern', 'excluded_pattern'):
+                compiled[key] = re.compile(values)
+            elif key == 'split_rule':
+                pass
+            elif key == 'scope':
+                compiled[key] = [re.compile(scope) for scope in values]
+            else:
+                if type(values) is not list:
+                    values = [values, ]
+                compiled[str(key)] = [re.compile(str(value)) for value in values]
+        return compiled
+
+    def _index_key(self, compiled):
+        """
+        Returns the key the subscription can be indexed on, None if there is none.
+        """
+        for key in self.INDEX_KEYS:
+            if key in compiled and compiled[key] and not any(self.REGEX_SPECIAL_CHARS.intersection(value.pattern) for value in compiled[key]):
+                return key
+
+    def _candidates(self, did, metadata):
+        """
+        Returns the positions of the subscriptions which can match the DID.
+        """
+        candidates = set(self.unindexed)
+        for key in self.INDEX_KEYS:
+            if not self.index[key]:
+                continue
+            if key == 'scope':
+                values = [did['scope'], ]
+            else:
+                values = [str(metadata[meta]) for meta in metadata if str(meta) == key]
+            # re.match on a literal pattern is a prefix match
+            for value in values:
+                for i in xrange(len(value) + 1):
+                    candidates.update(self.index[key].get(value[:i], []))
+        return sorted(candidates)
+
+    def match(self, did, metadata):
+        """
+        Returns the list of subscriptions matching a DID, in the same order as
+        the subscriptions given to the constructor.
+
+        :param did: The DID dictionnary
+        :param metadata: The metadata dictionnary for the DID
+        :returns: List of subscription dictionnaries.
+        """
+        if metadata['hidden']:
+            return []
+        str_metadata = {}
+        for meta in metadata:
+            str_metadata.setdefault(str(meta), []).append(str(metadata[meta]))
+
+        matching = []
+        for position in self._candidates(did, metadata):
+            subscription, compiled = self.subscriptions[position]
+            for key, values in compiled.iteritems():
+                if key == 'pattern':
+                    if not values.match(did['name']):
+                        break
+                elif key == 'excluded_pattern':
+                    if values.match(did['name']):
+                        break
+                elif key == 'scope':
+                    if not any(scope.match(did['scope']) for scope in values):
+                        break
+                else:
+                    if key not in str_metadata:
+                        break
+                    if not all(any(value.match(meta) for value in values) for meta in str_metadata[key]):
+                        break
+            else:
+                matching.append(subscription)
+        return matching
+
+
+def _get_rule_options(subscription, rule, prepend_str=''):
+    """
+    Returns the parameters of add_rule for a replication rule of a subscription.
+
+    :param subscription: The subscription dictionnary.
+    :param rule: The replication rule dictionnary from the subscription.
+    :param prepend_str: Prefix for the log messages.
+    :returns: Dictionnary of add_rule keyword arguments.
+    """
+    grouping = rule.get('grouping', 'DATASET')
+    lifetime = rule.get('lifetime', None)
+    ignore_availability = rule.get('ignore_availability', None)
+    weight = rule.get('weight', None)
+    source_replica_expression = rule.get('source_replica_expression', None)
+    locked = rule.get('locked', None)
+    if locked == 'True':
+        locked = True
+    else:
+        locked = False
+    purge_replicas = rule.get('purge_replicas', False)
+    if purge_replicas == 'True':
+        purge_replicas = True
+    else:
+        purge_replicas = False
+    activity = rule.get('activity', 'User Subscriptions')
+    try:
+        validate_schema(name='activity', obj=activity)
+    except InputValidationError as error:
+        logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
+        activity = 'User Subscriptions'
+    if lifetime:
+        lifetime = int(lifetime)
+
+    return {'account': subscription['account'], 'copies': int(rule['copies']), 'rse_expression': str(rule['rse_expression']),
+            'grouping': grouping, 'weight': weight, 'lifetime': lifetime, 'locked': locked, 'subscription_id': str(subscription['id']),
+            'source_replica_expression': source_replica_expression, 'activity': activity, 'purge_replicas': purge_replicas,
+            'ignore_availability': ignore_availability, 'comment': str(subscription['comments'])}
+
+
+def _add_rules_bulk(dids, subscription, prepend_str=''):
+    """
+    Creates the replication rules of a subscription for a list of DIDs in a single add_rules call.
+
+    :param dids: The list of DID dictionnaries.
+    :param subscription: The subscription dictionnary.
+    :param prepend_str: Prefix for the log messages.
+    :returns: True if all the rules were created, False if the DIDs have to be processed one by one.
+    """
+    stime = time.time()
+    rules = [_get_rule_options(subscription, rule, prepend_str) for rule in loads(subscription['replication_rules'])]
+    try:
+        add_rules(dids=[{'scope': did['scope'], 'name': did['name']} for did in dids], rules=rules)
+    except Exception as error:
+        logging.warning(prepend_str + 'Bulk insertion of the rules of subscription %s for %i DIDs failed, will insert them one by one : %s' % (subscription['name'], len(dids), str(error)))
+        monitor.record_counter(counters='transmogrifier.addnewrule.bulk.fallback', delta=1)
+        return False
+    for rule in rules:
+        monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=len(dids))
+        monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % "".join(rule['activity'].split()), delta=len(dids))
+    logging.info(prepend_str + '%i rule(s) inserted in %f seconds' % (len(dids) * len(rules), time.time() - stime))
+    return True
+
+
+def _add_rules_for_did(did, subscription, split_rule, blacklisted_rse_id, prepend_str=''):
+    """
+    Creates the replication rules of a subscription for a DID one by one, retrying on temporary failures.
+
+    :param did: The DID dictionnary.
+    :param subscription: The subscription dictionnary.
+    :param split_rule: If True, one rule per selected RSE is created.
+    :param blacklisted_rse_id: List of RSE ids not available for writing.
+    :param prepend_str: Prefix for the log messages.
+    :returns: False if a rule could not be inserted, True otherwise.
+    """
+    did_success = True
+    stime = time.time()
+    for rule in loads(subscription['replication_rules']):
+        options = _get_rule_options(subscription, rule, prepend_str)
+        account = options['account']
+        copies = options['copies']
+        rse_expression = options['rse_expression']
+        str_activity = "".join(options['activity'].split())
+        success = False
+        nattempt = 5
+        attemptnr = 0
+        skip_rule_creation = False
+
+        if split_rule:
+            rses = parse_expression(rse_expression)
+            list_of_rses = [rse['rse'] for rse in rses]
+            # Check that some rule doesn't already exist for this DID and subscription
+            preferred_rse_ids = []
+            for existing_rule in list_rules(filters={'subscription_id': options['subscription_id'], 'scope': did['scope'], 'name': did['name']}):
+                already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(existing_rule['rse_expression'])]
+                for rse, rse_id in already_existing_rses:
+                    if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
+                        preferred_rse_ids.append(rse_id)
+            if len(preferred_rse_ids) >= copies:
+                skip_rule_creation = True
+
+            rse_id_dict = {}
+            for rse in rses:
+                rse_id_dict[rse['id']] = rse['rse']
+            try:
+                rseselector = RSESelector(account=account, rses=rses, weight=options['weight'], copies=copies - len(preferred_rse_ids))
+                selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
+            except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+                logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
+                                (subscription['name'], account, str(error)))
+                # Now including the blacklisted sites
+                try:
+                    rseselector = RSESelector(account=account, rses=rses, weight=options['weight'], copies=copies - len(preferred_rse_ids))
+                    selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
+                    options['ignore_availability'] = True
+                except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+                    logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
+                                  (subscription['name'], account, str(error)))
+                    monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+                    # The DID won't be reevaluated at the next cycle
+                    continue
+
+        for attempt in xrange(0, nattempt):
+            attemptnr = attempt
+            nb_rule = 0
+            try:
+                if split_rule:
+                    if not skip_rule_creation:
+                        for rse in selected_rses:
+                            logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
+                            add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], **dict(options, copies=1, rse_expression=rse))
+
+                            nb_rule += 1
+                            if nb_rule == copies:
+                                success = True
+                                break
+                else:
+                    add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], **options)
+                    nb_rule += 1
+                monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
+                monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
+                success = True
+                break
+            except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
+                # Errors that won't be retried
+                success = True
+                logging.error(prepend_str + '%s' % (str(error)))
+                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+                break
+            except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
+                # Errors to be retried
+                logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
+                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+            except Exception as error:
+                # Unexpected errors
+                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
+                exc_type, exc_value, exc_traceback = exc_info()
+                logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
+
+        did_success = (did_success and success)
+        if (attemptnr + 1) == nattempt and not success:
+            logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], rse_expression))
+        else:
+            logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
+    return did_success
+
+
 def transmogrifier(bulk=5, once=False):
     """
     Creates a Transmogrifier Worker that gets a list of new DIDs for a given hash,
@@ -186,6 +471,7 @@ def transmogrifier(bulk=5, once=False):
             priorities.sort()
             for priority in priorities:
                 subscriptions.extend(sub_dict[priority])
+            matcher = SubscriptionMatcher(subscriptions, prepend_str=prepend_str)
         except SubscriptionNotFound as error:
             logging.warning(prepend_str + 'No subscriptions defined: %s' % (str(error)))
             time.sleep(10)
@@ -204,147 +490,44 @@ def transmogrifier(bulk=5, once=False):
             blacklisted_rse_id = [rse['id'] for rse in list_rses({'availability_write': False})]
             logging.debug(prepend_str + 'In transmogrifier worker')
             identifiers = []
+            did_success = {}
+            bulk_dids = {}
+            collections = [did for did in dids if did['did_type'] == str(DIDType.DATASET) or did['did_type'] == str(DIDType.CONTAINER)]
+            metadata = dict(((meta['scope'], meta['name']), meta) for meta in _retrial(get_metadata_bulk, collections))
             for did in dids:
-                did_success = True
+                did_key = '%s:%s' % (did['scope'], did['name'])
+                did_success[did_key] = True
                 if did['did_type'] == str(DIDType.DATASET) or did['did_type'] == str(DIDType.CONTAINER):
-                    results['%s:%s' % (did['scope'], did['name'])] = []
-                    try:
-                        metadata = get_metadata(did['scope'], did['name'])
-                        for subscription in subscriptions:
-                            if is_matching_subscription(subscription, did, metadata) is True:
-                                filter = loads(subscription['filter'])
-                                split_rule = filter.get('split_rule', False)
-                                if split_rule == 'true':
-                                    split_rule = True
-                                elif split_rule == 'false':
-                                    split_rule = False
-                                stime = time.time()
-                                results['%s:%s' % (did['scope'], did['name'])].append(subscription['id'])
-                                logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
-                                for rule in loads(subscription['replication_rules']):
-                                    # Get all the rule and subscription parameters
-                                    grouping = rule.get('grouping', 'DATASET')
-                                    lifetime = rule.get('lifetime', None)
-                                    ignore_availability = rule.get('ignore_availability', None)
-                                    weight = rule.get('weight', None)
-                                    source_replica_expression = rule.get('source_replica_expression', None)
-                                    locked = rule.get('locked', None)
-                                    if locked == 'True':
-                                        locked = True
-                                    else:
-                                        locked = False
-                                    purge_replicas = rule.get('purge_replicas', False)
-                                    if purge_replicas == 'True':
-                                        purge_replicas = True
-                                    else:
-                                        purge_replicas = False
-                                    rse_expression = str(rule['rse_expression'])
-                                    comment = str(subscription['comments'])
-                                    subscription_id = str(subscription['id'])
-                                    account = subscription['account']
-                                    copies = int(rule['copies'])
-                                    activity = rule.get('activity', 'User Subscriptions')
-                                    try:
-                                        validate_schema(name='activity', obj=activity)
-                                    except InputValidationError as error:
-                                        logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
-                                        activity = 'User Subscriptions'
-                                    if lifetime:
-                                        lifetime = int(lifetime)
-
-                                    str_activity = "".join(activity.split())
-                                    success = False
-                                    nattempt = 5
-                                    attemptnr = 0
-                                    skip_rule_creation = False
-
-                                    if split_rule:
-                                        rses = parse_expression(rse_expression)
-                                        list_of_rses = [rse['rse'] for rse in rses]
-                                        # Check that some rule doesn't already exist for this DID and subscription
-                                        preferred_rse_ids = []
-                                        for rule in list_rules(filters={'subscription_id': subscription_id, 'scope': did['scope'], 'name': did['name']}):
-                                            already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(rule['rse_expression'])]
-                                            for rse, rse_id in already_existing_rses:
-                                                if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
-                                                    preferred_rse_ids.append(rse_id)
-                                        if len(preferred_rse_ids) >= copies:
-                                            skip_rule_creation = True
-
-                                        rse_id_dict = {}
-                                        for rse in rses:
-                                            rse_id_dict[rse['id']] = rse['rse']
-                                        try:
-                                            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                            selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
-                                        except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                            logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
-                                                            (subscription['name'], account, str(error)))
-                                            # Now including the blacklisted sites
-                                            try:
-                                                rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                                selected_rses = [rse_id_dict[rse_id] for rse_id, _, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
-                                                ignore_availability = True
-                                            except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                                logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
-                                                              (subscription['name'], account, str(error)))
-                                                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                                # The DID won't be reevaluated at the next cycle
-                                                did_success = did_success and True
-                                                continue
-
-                                    for attempt in xrange(0, nattempt):
-                                        attemptnr = attempt
-                                        nb_rule = 0
-                                        try:
-                                            if split_rule:
-                                                if not skip_rule_creation:
-                                                    for rse in selected_rses:
-                                                        logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
-                                                        add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=1,
-                                                                 rse_expression=rse, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                                 subscription_id=subscription_id, source_replica_expression=source_replica_expression, activity=activity,
-                                                                 purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-
-                                                        nb_rule += 1
-                                                        if nb_rule == copies:
-                                                            success = True
-                                                            break
-                                            else:
-                                                add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=copies,
-                                                         rse_expression=rse_expression, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                         subscription_id=subscription['id'], source_replica_expression=source_replica_expression, activity=activity,
-                                                         purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-                                                nb_rule += 1
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
-                                            success = True
-                                            break
-                                        except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
-                                            # Errors that won't be retried
-                                            success = True
-                                            logging.error(prepend_str + '%s' % (str(error)))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                            break
-                                        except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
-                                            # Errors to be retried
-                                            logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                        except Exception as error:
-                                            # Unexpected errors
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
-                                            exc_type, exc_value, exc_traceback = exc_info()
-                                            logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
-
-                                    did_success = (did_success and success)
-                                    if (attemptnr + 1) == nattempt and not success:
-                                        logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], rse_expression))
-                                    else:
-                                        logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
-                    except DataIdentifierNotFound as error:
-                        logging.warning(prepend_str + error)
-
-                if did_success:
+                    results[did_key] = []
+                    if (did['scope'], did['name']) not in metadata:
+                        logging.warning(prepend_str + 'Data identifier %s not found' % did_key)
+                        did_success[did_key] = False
+                        continue
+                    for subscription in matcher.match(did, metadata[(did['scope'], did['name'])]):
+                        filter = loads(subscription['filter'])
+                        split_rule = filter.get('split_rule', False)
+                        if split_rule == 'true':
+                            split_rule = True
+                        elif split_rule == 'false':
+                            split_rule = False
+                        results[did_key].append(subscription['id'])
+                        logging.info(prepend_str + '%s matches subscription %s' % (did_key, subscription['name']))
+                        if split_rule:
+                            did_success[did_key] = _add_rules_for_did(did, subscription, split_rule, blacklisted_rse_id, prepend_str) and did_success[did_key]
+                        else:
+                            bulk_dids.setdefault(subscription['id'], []).append(did)
+
+            # Rules of the subscriptions without split_rule are created in bulk, in order of priority
+            for subscription in subscriptions:
+                if subscription['id'] not in bulk_dids:
+                    continue
+                if not _add_rules_bulk(bulk_dids[subscription['id']], subscription, prepend_str):
+                    for did in bulk_dids[subscription['id']]:
+                        did_key = '%s:%s' % (did['scope'], did['name'])
+                        did_success[did_key] = _add_rules_for_did(did, subscription, False, blacklisted_rse_id, prepend_str) and did_success[did_key]
+
+            for did in dids:
+                if did_success['%s:%s' % (did['scope'], did['name'])]:
                     if did['did_type'] == str(DIDType.FILE):
                         monitor.record_counter(counters='transmogrifier.did.file.processed', delta=1)
                     elif did['did_type'] == str(DIDType.DATASET):
@@ -34,7 +34,7 @@ from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException, RuleNotFound
 from rucio.common.utils import chunks
 from rucio.core.heartbeat import live, die, sanity_check
-from rucio.core.monitor import record_counter
+from rucio.core.monitor import record_counter, record_gauge, record_timer
 from rucio.core.did import list_expired_dids, delete_dids
 
 logging.getLogger("requests").setLevel(logging.CRITICAL)
@@ -49,9 +49,13 @@ logging.basicConfig(stream=sys.stdout,
 GRACEFUL_STOP = threading.Event()
 
 
-def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False):
+def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False, bulk=False, limit=10000):
     """
     Main loop to select and delete dids.
+
+    The expired dids are partitioned by the hash of their name over all live
+    undertaker threads. In bulk mode each chunk is deleted with set-based statements
+    and the deletion throughput is reported.
     """
     logging.info('Undertaker(%s): starting', worker_number)
     logging.info('Undertaker(%s): started', worker_number)
@@ -64,7 +68,7 @@ def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False):
             heartbeat = live(executable='rucio-undertaker', hostname=hostname, pid=pid, thread=thread, older_than=6000)
             logging.info('Undertaker({0[worker_number]}/{0[total_workers]}): Live gives {0[heartbeat]}'.format(locals()))
 
-            dids = list_expired_dids(worker_number=heartbeat['assign_thread'] + 1, total_workers=heartbeat['nr_threads'], limit=10000)
+            dids = list_expired_dids(worker_number=heartbeat['assign_thread'] + 1, total_workers=heartbeat['nr_threads'], limit=limit)
             if not dids and not once:
                 logging.info('Undertaker(%s): Nothing to do. sleep 60.', worker_number)
                 time.sleep(60)
@@ -73,9 +77,14 @@ def undertaker(worker_number=1, total_workers=1, chunk_size=5, once=False):
             for chunk in chunks(dids, chunk_size):
                 try:
                     logging.info('Undertaker(%s): Receive %s dids to delete', worker_number, len(chunk))
-                    delete_dids(dids=chunk, account='root')
-                    logging.info('Undertaker(%s): Delete %s dids', worker_number, len(chunk))
+                    start_time = time.time()
+                    delete_dids(dids=chunk, account='root', bulk=bulk)
+                    duration = time.time() - start_time
+                    logging.info('Undertaker(%s): Delete %s dids in %.2f seconds', worker_number, len(chunk), duration)
                     record_counter(counters='undertaker.delete_dids', delta=len(chunk))
+                    if bulk:
+                        record_timer(stat='undertaker.bulk.delete_dids', time=duration * 1000)
+                        record_gauge(stat='undertaker.bulk.throughput', value=len(chunk) / max(duration, 0.001))
                 except RuleNotFound, error:
                     logging.error(error)
                 except DatabaseException, error:
@@ -99,12 +108,13 @@ def stop(signum=None, frame=None):
     GRACEFUL_STOP.set()
 
 
-def run(once=False, total_workers=1, chunk_size=10):
+def run(once=False, total_workers=1, chunk_size=10, bulk=False, limit=10000):
     """
     Starts up the undertaker threads.
     """
     logging.info('main: starting threads')
-    threads = [threading.Thread(target=undertaker, kwargs={'worker_number': i, 'total_workers': total_workers, 'once': once, 'chunk_size': chunk_size}) for i in xrange(1, total_workers + 1)]
+    threads = [threading.Thread(target=undertaker, kwargs={'worker_number': i, 'total_workers': total_workers, 'once': once, 'chunk_size': chunk_size,
+                                                           'bulk': bulk, 'limit': limit}) for i in xrange(1, total_workers + 1)]
     [t.start() for t in threads]
     logging.info('main: waiting for interrupts')
 
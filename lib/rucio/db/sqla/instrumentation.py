@@ -0,0 +1,248 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Per-call SQL instrumentation.
+
+The session decorators push the name of the decorated function on a stack of
+the thread, and the cursor events of the engines attribute the queries, the
+rows and the time spent in the database to the innermost one. At the end of
+every call issuing queries, they are recorded in core.monitor as
+
+    core.db.<module>.<function>.queries
+    core.db.<module>.<function>.rows    (fetched by queries and changed by DML statements)
+    core.db.<module>.<function>.time    (timer, in ms)
+
+The rowcount of the DBAPI cursors is not known for queries before all rows are
+fetched, so their cursors are wrapped to count the rows as they are fetched,
+attributed to the innermost call at that time.
+
+Statements slower than [database] slow_query_time milliseconds are logged
+with their literals and bind parameters redacted, and the slowest ones are
+kept for slowest_statements().
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+from rucio.common.config import config_get, config_get_bool
+from rucio.core.monitor import record_counter, record_timer
+
+ENABLED = config_get_bool('database', 'instrumentation', raise_exception=False, default=True)
+SLOW_QUERY_TIME = float(config_get('database', 'slow_query_time', raise_exception=False, default=0))
+SLOW_QUERY_COUNT = int(config_get('database', 'slow_query_count', raise_exception=False, default=20))
+
+CALLS = threading.local()
+
+SLOWEST = []
+SLOWEST_LOCK = threading.Lock()
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def function_name(function):
+    """
+    Name of a decorated function in the metrics, e.g. did.list_dids for rucio.core.did.list_dids.
+
+    :param function: The function.
+    :returns: The name.
+    """
+    return '%s.%s' % (function.__module__.rsplit('.', 1)[-1], function.__name__)
+
+
+def __calls():
+    calls = getattr(CALLS, 'stack', None)
+    if calls is None:
+        calls = CALLS.stack = []
+    return calls
+
+
+def enter(name):
+    """
+    Attribute the next queries of the thread to a function.
+
+    :param name: The name of the function.
+    """
+    __calls().append([name, 0, 0, 0.0])
+
+
+def leave():
+    """
+    End the innermost call of the thread and record its queries.
+    """
+    name, queries, rows, duration = __calls().pop()
+    if queries:
+        record_counter('core.db.%s.queries' % name, queries)
+        record_timer('core.db.%s.time' % name, int(round(duration * 1000)))
+    if rows:
+        # Also rows fetched later from the queries, e.g. by the next rows of a stream
+        record_counter('core.db.%s.rows' % name, rows)
+
+
+def call(name, function, args, kwargs):
+    """
+    Call a function, attributing its queries to it.
+
+    :param name: The name of the function.
+    :param function: The function.
+    :param args: The positional arguments of the call.
+    :param kwargs: The keyword arguments of the call, which may include name.
+    :returns: The result of the function.
+    """
+    enter(name)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        leave()
+
+
+def stream(name, generator):
+    """
+    Iterate over a generator, attributing its queries to it but not those of the consumer between the rows.
+
+    :param name: The name of the generator function.
+    :param generator: The generator.
+    """
+    while True:
+        enter(name)
+        try:
+            row = next(generator)
+        except StopIteration:
+            return
+        finally:
+            leave()
+        yield row
+
+
+def add_rows(count):
+    """
+    Attribute rows to the innermost call of the thread.
+
+    :param count: The number of rows.
+    """
+    calls = getattr(CALLS, 'stack', None)
+    if calls and count > 0:
+        calls[-1][2] += count
+
+
+class RowCounter(object):
+    """
+    DBAPI cursor counting the rows fetched from it.
+    """
+
+    def __init__(self, cursor):
+        self.__dict__['cursor'] = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.cursor, name, value)
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            add_rows(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        add_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        add_rows(len(rows))
+        return rows
+
+
+def current():
+    """
+    :returns: The name of the innermost decorated function of the thread, or None.
+    """
+    calls = getattr(CALLS, 'stack', None)
+    return calls[-1][0] if calls else None
+
+
+def redact(statement):
+    """
+    Replace the string and number literals of a statement with ?, bind parameters are not shown anyway.
+
+    :param statement: The SQL statement.
+    :returns: The redacted statement.
+    """
+    return LITERALS.sub('?', ' '.join(statement.split()))
+
+
+def slowest_statements():
+    """
+    :returns: The slowest statements seen by this process, as list of (ms, function, redacted statement), slowest first.
+    """
+    with SLOWEST_LOCK:
+        return sorted(SLOWEST, reverse=True)
+
+
+def __slow(duration, name, statement):
+    milliseconds = duration * 1000
+    statement = redact(statement)
+    logging.warning('Slow query of %.0f ms in %s: %s', milliseconds, name, statement)
+    with SLOWEST_LOCK:
+        if len(SLOWEST) < SLOW_QUERY_COUNT:
+            heapq.heappush(SLOWEST, (milliseconds, name, statement))
+        elif SLOWEST and milliseconds > SLOWEST[0][0]:
+            heapq.heapreplace(SLOWEST, (milliseconds, name, statement))
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', {})[cursor] = time.time()
+    if conn.dialect.name == 'oracle':
+        # Shown in V$SESSION together with the script name set by my_on_connect
+        name = current()
+        if name:
+            conn.connection.action = name
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.time() - conn.info['query_start'].pop(cursor)
+    calls = getattr(CALLS, 'stack', None)
+    name = None
+    if calls:
+        frame = calls[-1]
+        name = frame[0]
+        frame[1] += 1
+        frame[3] += duration
+        if cursor.description is None:
+            frame[2] += max(cursor.rowcount, 0)
+        elif context is not None and context.cursor is cursor and not isinstance(cursor, RowCounter):
+            # The result proxy of the statement is built on the cursor of the context afterwards
+            context.cursor = RowCounter(cursor)
+    if SLOW_QUERY_TIME and duration * 1000 >= SLOW_QUERY_TIME:
+        __slow(duration, name or 'unknown', statement)
+
+
+def handle_error(context):
+    # A failed statement has no after_cursor_execute, do not keep its start on the pooled connection
+    cursor = context.cursor or getattr(context.execution_context, 'cursor', None)
+    if context.connection is not None and cursor is not None:
+        context.connection.info.get('query_start', {}).pop(cursor, None)
+
+
+def instrument(engine):
+    """
+    Register the cursor events on an engine, if [database] instrumentation is enabled.
+
+    :param engine: The engine.
+    """
+    if ENABLED:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
@@ -13,8 +13,11 @@
   - Wen Guan, <wen.guan@cern.ch>, 2016
 '''
 
+import logging
 import os
+import random
 import sys
+import time
 
 from functools import wraps
 from inspect import isgeneratorfunction
@@ -29,6 +32,8 @@ from sqlalchemy.orm import sessionmaker, scoped_session
 
 from rucio.common.config import config_get
 from rucio.common.exception import RucioException, DatabaseException
+from rucio.core.monitor import record_counter
+from rucio.db.sqla import instrumentation
 
 try:
     main_script = os.path.basename(sys.argv[0])
@@ -53,6 +58,32 @@ if DEFAULT_SCHEMA_NAME:
 
 _MAKER, _ENGINE, _LOCK = None, None, Lock()
 
+# Read replicas, as {'section', 'maker', 'down_until'}, created on first use
+_READ_REPLICAS = None
+# Seconds a failed read replica is not used, its reads going to the primary database meanwhile
+READ_REPLICA_RETRY_INTERVAL = int(config_get(DATABASE_SECTION, 'read_replica_retry_interval', raise_exception=False, default=60))
+
+# Retries of transactions failing with a transient lock or deadlock error, waiting
+# a random time up to retry_wait * 2 ** attempt, but at most retry_max_wait, seconds
+RETRY_ATTEMPTS = int(config_get(DATABASE_SECTION, 'retry_attempts', raise_exception=False, default=3))
+RETRY_WAIT = float(config_get(DATABASE_SECTION, 'retry_wait', raise_exception=False, default=0.1))
+RETRY_MAX_WAIT = float(config_get(DATABASE_SECTION, 'retry_max_wait', raise_exception=False, default=5))
+
+# Lock errors of NOWAIT queries, see NOWAIT_ERRORS, are deliberately never replayed
+TRANSIENT_ERRORS = ('ORA-00060',  # deadlock detected while waiting for resource
+                    'ORA-30006',  # resource busy; acquire with WAIT timeout expired
+                    'ORA-08177',  # can't serialize access for this transaction
+                    '(1205,',  # MySQL lock wait timeout exceeded
+                    '(1213,',  # MySQL deadlock found when trying to get lock
+                    'deadlock detected',  # PostgreSQL 40P01
+                    'could not serialize access',  # PostgreSQL 40001
+                    'database is locked')  # SQLite
+
+# Lock errors of queries which must not wait, the caller, e.g. a daemon, skips the locked rows
+NOWAIT_ERRORS = ('ORA-00054',  # resource busy and acquire with NOWAIT specified
+                 '(3572,',  # MySQL statement aborted because lock(s) could not be acquired immediately and NOWAIT is set
+                 'could not obtain lock')  # PostgreSQL 55P03
+
 
 def _fk_pragma_on_connect(dbapi_con, con_record):
     # Hack for previous versions of sqlite3
@@ -138,36 +169,89 @@ def my_on_connect(dbapi_con, connection_record):
     dbapi_con.action = caller
 
 
+def create_engine_from_section(section):
+    """ Creates an engine to the database configured in a section.
+        :param section: The configuration section with the connection string and the pool parameters.
+        :returns: engine
+    """
+    sql_connection = config_get(section, 'default')
+    config_params = [('pool_size', int), ('max_overflow', int), ('pool_timeout', int),
+                     ('pool_recycle', int), ('echo', int), ('echo_pool', str),
+                     ('pool_reset_on_return', str), ('use_threadlocal', int)]
+    params = {}
+    for param, param_type in config_params:
+        try:
+            params[param] = param_type(config_get(section, param))
+        except:
+            pass
+    engine = create_engine(sql_connection, **params)
+    if 'mysql' in sql_connection:
+        event.listen(engine, 'checkout', mysql_ping_listener)
+        event.listen(engine, 'connect', mysql_convert_decimal_to_float)
+    elif 'postgresql' in sql_connection:
+        event.listen(engine, 'connect', psql_convert_decimal_to_float)
+    elif 'sqlite' in sql_connection:
+        event.listen(engine, 'connect', _fk_pragma_on_connect)
+    elif 'oracle' in sql_connection:
+        event.listen(engine, 'connect', my_on_connect)
+    instrumentation.instrument(engine)
+    return engine
+
+
 def get_engine(echo=True):
     """ Creates a engine to a specific database.
         :returns: engine
     """
     global _ENGINE
     if not _ENGINE:
-        sql_connection = config_get(DATABASE_SECTION, 'default')
-        config_params = [('pool_size', int), ('max_overflow', int), ('pool_timeout', int),
-                         ('pool_recycle', int), ('echo', int), ('echo_pool', str),
-                         ('pool_reset_on_return', str), ('use_threadlocal', int)]
-        params = {}
-        for param, param_type in config_params:
-            try:
-                params[param] = param_type(config_get(DATABASE_SECTION, param))
-            except:
-                pass
-        _ENGINE = create_engine(sql_connection, **params)
-        if 'mysql' in sql_connection:
-            event.listen(_ENGINE, 'checkout', mysql_ping_listener)
-            event.listen(_ENGINE, 'connect', mysql_convert_decimal_to_float)
-        elif 'postgresql' in sql_connection:
-            event.listen(_ENGINE, 'connect', psql_convert_decimal_to_float)
-        elif 'sqlite' in sql_connection:
-            event.listen(_ENGINE, 'connect', _fk_pragma_on_connect)
-        elif 'oracle' in sql_connection:
-            event.listen(_ENGINE, 'connect', my_on_connect)
+        _ENGINE = create_engine_from_section(DATABASE_SECTION)
     assert _ENGINE
     return _ENGINE
 
 
+def get_read_replicas():
+    """ Creates the engines of the read replicas. They are listed as comma-separated sections
+        in [database] read_replicas, each configured like [database] with its own pool parameters.
+        :returns: list of {'section', 'maker', 'down_until'}
+    """
+    global _READ_REPLICAS
+    if _READ_REPLICAS is None:
+        _LOCK.acquire()
+        try:
+            if _READ_REPLICAS is None:
+                sections = config_get(DATABASE_SECTION, 'read_replicas', raise_exception=False, default='') or ''
+                replicas = []
+                for section in [section.strip() for section in sections.split(',') if section.strip()]:
+                    maker = sessionmaker(bind=create_engine_from_section(section), autocommit=False, autoflush=True, expire_on_commit=True)
+                    replicas.append({'section': section, 'maker': maker, 'down_until': 0})
+                _READ_REPLICAS = replicas
+        finally:
+            _LOCK.release()
+    return _READ_REPLICAS
+
+
+def get_read_replica():
+    """ Chooses a read replica not marked as failed.
+        :returns: the read replica, or None to use the primary database.
+    """
+    now = time.time()
+    replicas = [replica for replica in get_read_replicas() if replica['down_until'] <= now]
+    return random.choice(replicas) if replicas else None
+
+
+def failback(replica, error):
+    """ Marks a read replica as failed if the error is a connection problem or a timeout.
+        :param replica: The read replica in use, or None.
+        :param error: The exception raised by the read replica.
+        :returns: True if the read must be done again on the primary database.
+    """
+    if replica is None or not isinstance(error, (OperationalError, TimeoutError)):
+        return False
+    logging.warning('Read replica %s failed, using the primary database for %s seconds: %s', replica['section'], READ_REPLICA_RETRY_INTERVAL, error)
+    replica['down_until'] = time.time() + READ_REPLICA_RETRY_INTERVAL
+    return True
+
+
 def get_dump_engine(echo=False):
     """ Creates a dump engine to a specific database.
         :returns: engine """
@@ -225,7 +309,6 @@ def get_session():
 
 def retry_if_db_connection_error(exception):
     """Return True if error in connecting to db."""
-    print exception
     if isinstance(exception, OperationalError):
         conn_err_codes = ('2002', '2003', '2006',  # MySQL
                           'ORA-00028',  # Oracle session has been killed
@@ -236,11 +319,95 @@ def retry_if_db_connection_error(exception):
                           'ORA-25408',)  # can not safely replay call
         for err_code in conn_err_codes:
             if exception.args[0].find(err_code) != -1:
+                logging.warning('Retrying after database connection error: %s', exception)
                 return True
     return False
 
 
-def read_session(function):
+def is_transient_error(exception):
+    """
+    Return True if the error is a lock or deadlock error, which may not happen again if the transaction is replayed.
+
+    :param exception: The exception.
+    """
+    if not isinstance(exception, DatabaseError):
+        return False
+    message = str(exception)
+    for err_code in TRANSIENT_ERRORS:
+        if err_code in message:
+            return True
+    return False
+
+
+def is_nowait_error(exception):
+    """
+    Return True if the error is a lock error of a query which was asked not to wait.
+
+    :param exception: The exception.
+    """
+    if not isinstance(exception, DatabaseError):
+        return False
+    message = str(exception)
+    for err_code in NOWAIT_ERRORS:
+        if err_code in message:
+            return True
+    return False
+
+
+def retry_wait(attempt):
+    """
+    Return the seconds to wait before the next attempt, exponentially growing with random jitter,
+    so that the transactions which collided do not collide again.
+
+    :param attempt: The number of the failed attempt, from 1.
+    """
+    return random.uniform(0, min(RETRY_MAX_WAIT, RETRY_WAIT * 2 ** attempt))
+
+
+def replay(function, args=(), kwargs=None, session=None):
+    """
+    Run a small unit of work of a bulk operation in a savepoint, and replay it after a
+    transient lock or deadlock error without losing the work done before in the transaction.
+    The error is raised after [database] retry_attempts, or if the database rolled back the
+    whole transaction, e.g. after a MySQL deadlock. Lock errors of NOWAIT queries are raised
+    at once, for the caller to skip the locked rows. The errors already replayed, or raised
+    at once, are not replayed again by transactional_session. SQLite does not support
+    savepoints through pysqlite, the unit is only called there.
+
+    :param function: The function doing the unit of work with the session.
+    :param args: The positional arguments of the function.
+    :param kwargs: The keyword arguments of the function, without the session.
+    :param session: The database session in use.
+    :returns: The result of the function.
+    """
+    kwargs = dict(kwargs or {}, session=session)
+    if session.bind.dialect.name == 'sqlite':
+        return function(*args, **kwargs)
+    attempt = 0
+    while True:
+        attempt += 1
+        savepoint = session.begin_nested()
+        try:
+            result = function(*args, **kwargs)
+            savepoint.commit()
+            return result
+        except DatabaseError, error:
+            exc_info = sys.exc_info()
+            try:
+                savepoint.rollback()
+            except DatabaseError:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            if attempt > RETRY_ATTEMPTS or not is_transient_error(error) or is_nowait_error(error):
+                error.replayed = True
+                raise exc_info[0], exc_info[1], exc_info[2]
+            record_counter('core.db.replays')
+            time.sleep(retry_wait(attempt))
+        except:
+            savepoint.rollback()
+            raise
+
+
+def read_session(function=None, replica=True):
     '''
     decorator that set the session variable to use inside a function.
     With that decorator it's possible to use the session variable like if a global variable session is declared.
@@ -248,7 +415,15 @@ def read_session(function):
     session is a sqlalchemy session, and you can get one calling get_session().
     This is useful if only SELECTs and the like are being done; anything involving
     INSERTs, UPDATEs etc should use transactional_session.
+
+    The session is opened on a read replica if configured, and on the primary database
+    if the replica fails. Functions needing to read the latest writes, e.g. to fill a
+    cache invalidated by them, use @read_session(replica=False).
     '''
+    if function is None:
+        return lambda function: read_session(function, replica=replica)
+    name = instrumentation.function_name(function)
+
     @retry(retry_on_exception=retry_if_db_connection_error,
            wait_fixed=0.5,
            stop_max_attempt_number=2,
@@ -260,30 +435,38 @@ def read_session(function):
             raise RucioException('read_session decorator should not be used with generator. Use stream_session instead.')
 
         if not kwargs.get('session'):
-            session = get_session()
-            try:
-                kwargs['session'] = session
-                return function(*args, **kwargs)
-            except TimeoutError, error:
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise DatabaseException(str(error))
-            except DatabaseError, error:
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise DatabaseException(str(error))
-            except:
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise
-            finally:
-                session.remove()
+            read_replica = get_read_replica() if replica else None
+            while True:
+                session = scoped_session(read_replica['maker']) if read_replica else get_session()
+                try:
+                    kwargs['session'] = session
+                    return instrumentation.call(name, function, args, kwargs)
+                except TimeoutError, error:
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    if failback(read_replica, error):
+                        read_replica = None
+                        continue
+                    raise DatabaseException(str(error))
+                except DatabaseError, error:
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    if failback(read_replica, error):
+                        read_replica = None
+                        continue
+                    raise DatabaseException(str(error))
+                except:
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    raise
+                finally:
+                    session.remove()
         try:
-            return function(*args, **kwargs)
+            return instrumentation.call(name, function, args, kwargs)
         except:
             raise
     new_funct.__doc__ = function.__doc__
     return new_funct
 
 
-def stream_session(function):
+def stream_session(function=None, replica=True):
     '''
     decorator that set the session variable to use inside a function.
     With that decorator it's possible to use the session variable like if a global variable session is declared.
@@ -291,7 +474,15 @@ def stream_session(function):
     session is a sqlalchemy session, and you can get one calling get_session().
     This is useful if only SELECTs and the like are being done; anything involving
     INSERTs, UPDATEs etc should use transactional_session.
+
+    The session is opened on a read replica if configured, and on the primary database
+    if the replica fails before the first row. Use @stream_session(replica=False) to
+    always read the primary database.
     '''
+    if function is None:
+        return lambda function: stream_session(function, replica=replica)
+    name = instrumentation.function_name(function)
+
     @retry(retry_on_exception=retry_if_db_connection_error,
            wait_fixed=0.5,
            stop_max_attempt_number=2,
@@ -303,27 +494,38 @@ def stream_session(function):
             raise RucioException('stream_session decorator should be used only with generator. Use read_session instead.')
 
         if not kwargs.get('session'):
-            session = get_session()
-            try:
-                kwargs['session'] = session
-                for row in function(*args, **kwargs):
-                    yield row
-            except TimeoutError, error:
-                print error
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise DatabaseException(str(error))
-            except DatabaseError, error:
-                print error
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise DatabaseException(str(error))
-            except:
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise
-            finally:
-                session.remove()
+            read_replica = get_read_replica() if replica else None
+            while True:
+                session = scoped_session(read_replica['maker']) if read_replica else get_session()
+                streamed = False
+                try:
+                    kwargs['session'] = session
+                    for row in instrumentation.stream(name, function(*args, **kwargs)):
+                        streamed = True
+                        yield row
+                    return
+                except TimeoutError, error:
+                    logging.error('Database error in %s: %s', name, error)
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    if not streamed and failback(read_replica, error):
+                        read_replica = None
+                        continue
+                    raise DatabaseException(str(error))
+                except DatabaseError, error:
+                    logging.error('Database error in %s: %s', name, error)
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    if not streamed and failback(read_replica, error):
+                        read_replica = None
+                        continue
+                    raise DatabaseException(str(error))
+                except:
+                    session.rollback()  # pylint: disable=maybe-no-member
+                    raise
+                finally:
+                    session.remove()
         else:
             try:
-                for row in function(*args, **kwargs):
+                for row in instrumentation.stream(name, function(*args, **kwargs)):
                     yield row
             except:
                 raise
@@ -337,30 +539,49 @@ def transactional_session(function):
     With that decorator it's possible to use the session variable like if a global variable session is declared.
 
     session is a sqlalchemy session, and you can get one calling get_session().
+
+    The transaction is replayed with a new session after a transient lock or deadlock
+    error, up to [database] retry_attempts times with an exponential backoff, unless
+    the error comes from a unit of work already replayed by replay() or from a NOWAIT lock,
+    which the caller expects to fail fast.
     '''
+    name = instrumentation.function_name(function)
+
     @wraps(function)
     def new_funct(*args, **kwargs):
-        if not kwargs.get('session'):
-            session = get_session()
-            try:
-                kwargs['session'] = session
+        instrumentation.enter(name)
+        try:
+            if not kwargs.get('session'):
+                attempt = 0
+                while True:
+                    attempt += 1
+                    session = get_session()
+                    try:
+                        kwargs['session'] = session
+                        result = function(*args, **kwargs)
+                        session.commit()  # pylint: disable=maybe-no-member
+                        break
+                    except TimeoutError, error:
+                        logging.error('Database error in %s: %s', name, error)
+                        session.rollback()  # pylint: disable=maybe-no-member
+                        raise DatabaseException(str(error))
+                    except DatabaseError, error:
+                        session.rollback()  # pylint: disable=maybe-no-member
+                        if attempt <= RETRY_ATTEMPTS and is_transient_error(error) and not is_nowait_error(error) and not getattr(error, 'replayed', False):
+                            record_counter(['core.db.retries', 'core.db.%s.retries' % name])
+                            time.sleep(retry_wait(attempt))
+                            continue
+                        logging.error('Database error in %s: %s', name, error)
+                        raise DatabaseException(str(error))
+                    except:
+                        session.rollback()  # pylint: disable=maybe-no-member
+                        raise
+                    finally:
+                        session.remove()  # pylint: disable=maybe-no-member
+            else:
                 result = function(*args, **kwargs)
-                session.commit()  # pylint: disable=maybe-no-member
-            except TimeoutError, error:
-                print error
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise DatabaseException(str(error))
-            except DatabaseError, error:
-                print error
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise DatabaseException(str(error))
-            except:
-                session.rollback()  # pylint: disable=maybe-no-member
-                raise
-            finally:
-                session.remove()  # pylint: disable=maybe-no-member
-        else:
-            result = function(*args, **kwargs)
+        finally:
+            instrumentation.leave()
         return result
     new_funct.__doc__ = function.__doc__
     return new_funct
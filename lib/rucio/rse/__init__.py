@@ -62,8 +62,6 @@ if rsemanager.CLIENT_MODE:   # pylint:disable=no-member
 if rsemanager.SERVER_MODE:   # pylint:disable=no-member
     from rucio.core.rse import get_rse_protocols
     setattr(rsemanager, '__request_rse_info', get_rse_protocols)
-    RSE_REGION = make_region(function_key_generator=rse_key_generator).configure(
-        'dogpile.cache.memcached',
-        expiration_time=3600,
-        arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
+    from rucio.common.cache import make_region_memcached
+    RSE_REGION = make_region_memcached('rse_info', expiration_time=3600, function_key_generator=rse_key_generator)
     setattr(rsemanager, 'RSE_REGION', RSE_REGION)
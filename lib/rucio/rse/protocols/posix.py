@@ -15,13 +15,17 @@ import shutil
 from subprocess import call
 
 from rucio.common import exception
-from rucio.common.utils import adler32
+from rucio.common.utils import calculate_checksums
 from rucio.rse.protocols import protocol
 
 
 class Default(protocol.RSEProtocol):
     """ Implementing access to RSEs using the local filesystem."""
 
+    def __init__(self, protocol_attr, rse_settings):
+        super(Default, self).__init__(protocol_attr, rse_settings)
+        self.ranges = True
+
     def exists(self, pfn):
         """
             Checks if the requested file is known by the referred RSE.
@@ -80,6 +84,32 @@ class Default(protocol.RSEProtocol):
             else:
                 raise exception.ServiceUnavailable(e)
 
+    def get_range(self, pfn, offset, length):
+        """ Provides access to a byte range of a file stored inside the connected RSE.
+
+            :param pfn: Physical file name of requested file
+            :param offset: The offset of the first byte of the range
+            :param length: The number of bytes of the range
+
+            :returns: Iterator over the data of the range, in chunks.
+
+            :raises ServiceUnavailable: if some generic error occured in the library.
+            :raises SourceNotFound: if the source file was not found on the referred storage.
+        """
+        try:
+            with open(self.pfn2path(pfn), 'rb') as source:
+                source.seek(offset)
+                while length > 0:
+                    data = source.read(min(length, 1048576))
+                    if not data:
+                        break
+                    length -= len(data)
+                    yield data
+        except IOError as e:
+            if e.errno == 2:
+                raise exception.SourceNotFound(e)
+            raise exception.ServiceUnavailable(e)
+
     def put(self, source, target, source_dir=None):
         """
             Allows to store files inside the referred RSE.
@@ -166,4 +196,4 @@ class Default(protocol.RSEProtocol):
             :returns: a dict containing the keys filesize and adler32.
         """
         path = self.pfn2path(pfn)
-        return {'filesize': os.stat(path)[os.path.stat.ST_SIZE], 'adler32': adler32(path)}
+        return {'filesize': os.stat(path)[os.path.stat.ST_SIZE], 'adler32': calculate_checksums(path, algorithms=('adler32', ))['adler32']}
@@ -180,6 +180,7 @@ class RSEProtocol(object):
         self.translator = None
         self.renaming = True
         self.overwrite = False
+        self.ranges = False
         self.rse = rse_settings
         if self.rse['deterministic']:
             self.translator = RSEDeterministicTranslation(self.rse['rse'], rse_settings, self.attributes)
@@ -361,6 +362,22 @@ class RSEProtocol(object):
          """
         raise NotImplementedError
 
+    def get_range(self, path, offset, length):
+        """
+            Provides access to a byte range of a file stored inside the connected RSE.
+            Only supported by protocols setting the ranges attribute.
+
+            :param path: Physical file name of requested file
+            :param offset: The offset of the first byte of the range
+            :param length: The number of bytes of the range
+
+            :returns: Iterator over the data of the range, in chunks.
+
+            :raises ServiceUnavailable: if some generic error occured in the library or the transfer stalled.
+            :raises SourceNotFound: if the source file was not found on the referred storage.
+         """
+        raise NotImplementedError
+
     def put(self, source, target, source_dir):
         """
             Allows to store files inside the referred RSE.
@@ -36,6 +36,7 @@ class Default(protocol.RSEProtocol):
         self.__conn = None
         self.renaming = False
         self.overwrite = True
+        self.ranges = True
         self.http_proxy = os.environ.get("http_proxy")
         self.https_proxy = os.environ.get("https_proxy")
 
@@ -214,6 +215,41 @@ class Default(protocol.RSEProtocol):
                 os.remove(dest)
             raise exception.ServiceUnavailable(e)
 
+    def get_range(self, pfn, offset, length):
+        """
+            Provides access to a byte range of a file stored inside the connected RSE.
+
+            :param pfn: Physical file name of requested file
+            :param offset: The offset of the first byte of the range
+            :param length: The number of bytes of the range
+
+            :returns: Iterator over the data of the range, in chunks.
+
+            :raises ServiceUnavailable: if some generic error occured in the library.
+            :raises SourceNotFound: if the source file was not found on the referred storage.
+         """
+        try:
+            bucket, key = self.get_bucket_key(pfn, validate=False)
+            if key is None:
+                raise exception.SourceNotFound('Cannot get the source key from S3')
+            key.open_read(headers={'Range': 'bytes=%d-%d' % (offset, offset + length - 1)})
+            try:
+                data = key.read(1048576)
+                while data:
+                    yield data
+                    data = key.read(1048576)
+            finally:
+                key.close()
+        except boto.exception.S3ResponseError as e:
+            if e.status == 404:
+                raise exception.SourceNotFound(str(e))
+            else:
+                raise exception.ServiceUnavailable(e)
+        except exception.SourceNotFound as e:
+            raise exception.SourceNotFound(e)
+        except Exception as e:
+            raise exception.ServiceUnavailable(e)
+
     def put(self, source, target, source_dir=None):
         """
             Allows to store files inside the referred RSE.
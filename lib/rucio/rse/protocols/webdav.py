@@ -144,12 +144,16 @@ class Default(protocol.RSEProtocol):
 
     """ Implementing access to RSEs using the webDAV protocol."""
 
+    def __init__(self, protocol_attr, rse_settings):
+        super(Default, self).__init__(protocol_attr, rse_settings)
+        self.ranges = True
+
     def connect(self, credentials={}):
         """ Establishes the actual connection to the referred RSE.
 
             :param credentials Provides information to establish a connection
                 to the referred storage system. For WebDAV connections these are
-                ca_cert, cert, auth_type, timeout
+                ca_cert, cert, auth_type, timeout, stall_timeout
 
             :raises RSEAccessDenied
         """
@@ -185,6 +189,11 @@ class Default(protocol.RSEProtocol):
             self.timeout = credentials['timeout']
         except KeyError:
             self.timeout = 300
+
+        try:
+            self.stall_timeout = credentials['stall_timeout']
+        except KeyError:
+            self.stall_timeout = 60
         self.session = requests.session()
         self.session.mount('https://', TLSv1HttpAdapter())
 
@@ -284,6 +293,44 @@ class Default(protocol.RSEProtocol):
         except requests.exceptions.ReadTimeout as error:
             raise exception.ServiceUnavailable(error)
 
+    def get_range(self, pfn, offset, length):
+        """ Provides access to a byte range of a file stored inside the connected RSE.
+
+            :param pfn Physical file name of requested file
+            :param offset The offset of the first byte of the range
+            :param length The number of bytes of the range
+
+            :returns: Iterator over the data of the range, in chunks.
+
+            :raises ServiceUnavailable, SourceNotFound, RSEAccessDenied
+        """
+        path = self.path2pfn(pfn)
+        chunksize = 1048576
+        headers = {'Range': 'bytes=%d-%d' % (offset, offset + length - 1)}
+        try:
+            # the read timeout aborts transfers which stall for longer than stall_timeout
+            result = self.session.get(path, verify=False, stream=True, headers=headers, timeout=(self.timeout, self.stall_timeout), cert=self.cert)
+            if result.status_code == 206 or (result.status_code == 200 and offset == 0):
+                # a server ignoring the range returns the whole file
+                for chunk in result.iter_content(chunksize):
+                    if len(chunk) >= length:
+                        yield chunk[:length]
+                        break
+                    length -= len(chunk)
+                    yield chunk
+                result.close()
+            elif result.status_code in [404, ]:
+                raise exception.SourceNotFound()
+            elif result.status_code in [401, 403]:
+                raise exception.RSEAccessDenied()
+            else:
+                # catchall exception
+                raise exception.RucioException(result.status_code, result.text)
+        except requests.exceptions.ConnectionError as error:
+            raise exception.ServiceUnavailable(error)
+        except requests.exceptions.ReadTimeout as error:
+            raise exception.ServiceUnavailable(error)
+
     def put(self, source, target, source_dir=None, progressbar=False):
         """ Allows to store files inside the referred RSE.
 
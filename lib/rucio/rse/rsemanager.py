@@ -31,12 +31,17 @@ from __future__ import print_function
 import copy
 import os
 import random
+import zlib
 
+from multiprocessing.pool import ThreadPool
 from urlparse import urlparse
 
 from rucio.common import exception, utils, constants
 from rucio.common.utils import make_valid_did
 
+# files are split into parallel byte ranges of at least this size
+SEGMENT_MIN_SIZE = 64 * 1024 * 1024
+
 
 def get_rse_info(rse, session=None):
     """
@@ -209,7 +214,7 @@ def parse_pfns(rse_settings, pfns, operation='read', domain='wan'):
     return create_protocol(rse_settings, operation, urlparse(pfns[0]).scheme, domain).parse_pfns(pfns)
 
 
-def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_checksum=False, printstatements=False, domain='wan'):
+def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_checksum=False, printstatements=False, domain='wan', segments=1):
     """
         Copy a file from the connected storage to the local file system.
         Providing a list indicates the bulk mode.
@@ -226,6 +231,9 @@ def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_check
         :param dest_dir:        path to the directory where the downloaded files will be stored. If not given, each scope is represented by its own directory.
         :param force_scheme:    normally the scheme is dictated by the RSE object, when specifying the PFN it must be forced to the one specified in the PFN, overruling the RSE description.
         :param ignore_checksum: do not verify the checksum - caution: should only be used for rucio download --pfn
+        :param segments:        download files with known size and adler32 in up to this many parallel byte ranges,
+                                if the protocol supports ranges. The adler32 is then computed while streaming.
+                                With 1, the default, files are fetched whole with the get of the protocol.
 
         :returns: True/False for a single file or a dict object with 'scope:name' for LFNs or 'name' for PFNs as keys and True or the exception as value for each file in bulk mode
 
@@ -258,13 +266,18 @@ def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_check
                         if printstatements:
                             print('%s already exists, probably from a failed attempt. Will remove it' % (tempfile))
                         os.unlink(tempfile)
-                    protocol.get(pfn, tempfile)
+                    localchecksum = None
+                    if (segments or 1) > 1 and protocol.ranges and f['adler32'] and f.get('bytes'):
+                        localchecksum = __get_segmented(protocol, pfn, tempfile, f['bytes'], segments)
+                    else:
+                        protocol.get(pfn, tempfile)
                     if printstatements:
                         print('File downloaded. Will be validated')
 
                     if not ignore_checksum:
                         ruciochecksum = f['adler32'] if f['adler32'] else f['md5']
-                        localchecksum = utils.adler32(tempfile) if f['adler32'] else utils.md5(tempfile)
+                        if localchecksum is None:
+                            localchecksum = utils.adler32(tempfile) if f['adler32'] else utils.md5(tempfile)
                         if localchecksum == ruciochecksum:
                             if printstatements:
                                 print('File validated')
@@ -291,6 +304,53 @@ def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_check
     return [gs, ret]
 
 
+def __get_segmented(protocol, pfn, dest, filesize, segments):
+    """
+    Download a file in parallel byte ranges of at least SEGMENT_MIN_SIZE bytes each.
+
+    :param protocol: The connected protocol, supporting ranges.
+    :param pfn:      The PFN of the file.
+    :param dest:     The local destination file.
+    :param filesize: The size of the file in bytes.
+    :param segments: The maximum number of parallel ranges.
+    :returns:        The adler32 of the file, computed while streaming.
+    :raises ServiceUnavailable: if a range could not be read completely
+    """
+    segments = max(1, min(segments or 1, filesize // SEGMENT_MIN_SIZE))
+    segment_size = -(-filesize // segments)
+    ranges = [(offset, min(segment_size, filesize - offset)) for offset in range(0, filesize, segment_size)]
+    with open(dest, 'wb') as destination:
+        destination.truncate(filesize)
+
+    def get_segment(segment):
+        offset, length = segment
+        checksum, received = 1, 0
+        with open(dest, 'r+b') as destination:
+            destination.seek(offset)
+            for data in protocol.get_range(pfn, offset, length):
+                destination.write(data)
+                checksum = zlib.adler32(data, checksum) & 0xffffffff
+                received += len(data)
+        if received != length:
+            raise exception.ServiceUnavailable('Received %s of %s bytes at offset %s' % (received, length, offset))
+        return checksum
+
+    if len(ranges) == 1:
+        checksums = [get_segment(ranges[0])]
+    else:
+        pool = ThreadPool(len(ranges))
+        try:
+            checksums = pool.map(get_segment, ranges)
+        finally:
+            pool.close()
+            pool.join()
+
+    checksum = checksums[0]
+    for (offset, length), segment_checksum in zip(ranges[1:], checksums[1:]):
+        checksum = utils.adler32_combine(checksum, segment_checksum, length)
+    return '%08x' % checksum
+
+
 def exists(rse_settings, files):
     """
         Checks if a file is present at the connected storage.
@@ -347,6 +407,7 @@ def upload(rse_settings, lfns, source_dir=None, force_pfn=None, force_scheme=Non
                             {'name': '2_rse_local_put.raw', 'scope': 'user.jdoe', 'filesize': 4711, 'adler32': 'RSSMICETHMISBA837464F'}
                             ]
                             If the 'filename' key is present, it will be used by Rucio as the actual name of the file on disk (separate from the Rucio 'name').
+                            If 'adler32' is missing, it is calculated from the local file, together with 'filesize' if missing too.
         :param source_dir:  path to the local directory including the source files
         :param force_pfn: use the given PFN -- can lead to dark data, use sparingly
         :param force_scheme: use the given protocol scheme, overriding the protocol priority in the RSE description
@@ -367,10 +428,19 @@ def upload(rse_settings, lfns, source_dir=None, force_pfn=None, force_scheme=Non
     protocol_delete.connect()
 
     lfns = [lfns] if not type(lfns) is list else lfns
+
+    # Checksum the local files given without adler32, each in one pass and several at once
+    source_paths = [os.path.join(source_dir, lfn.get('filename', lfn['name'])) if source_dir else lfn.get('filename', lfn['name']) for lfn in lfns if 'adler32' not in lfn]
+    local_checksums = utils.calculate_checksums_parallel([path for path in source_paths if os.path.isfile(path)], algorithms=('adler32', ))
+
     for lfn in lfns:
         base_name = lfn.get('filename', lfn['name'])
         name = lfn.get('name', base_name)
         scope = lfn['scope']
+        source_path = os.path.join(source_dir, base_name) if source_dir else base_name
+        if 'adler32' not in lfn and source_path in local_checksums:
+            lfn = dict(lfn, adler32=local_checksums[source_path]['adler32'])
+            lfn.setdefault('filesize', os.stat(source_path).st_size)
         if 'adler32' not in lfn:
             gs = False
             ret['%s:%s' % (scope, name)] = exception.RucioException('Missing checksum for file %s:%s' % (lfn['scope'], name))
@@ -0,0 +1,55 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from nose.tools import assert_equal, assert_raises
+
+from rucio.client.asyncclient import AsyncClient
+from rucio.common.exception import DataIdentifierNotFound
+from rucio.common.utils import generate_uuid
+
+
+class TestAsyncClient(object):
+
+    def setup(self):
+        self.client = AsyncClient(max_workers=4)
+        self.scope = 'mock'
+        self.datasets = []
+        for i in range(10):
+            dataset = 'dsn_%s' % generate_uuid()
+            files = [{'scope': self.scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1, 'adler32': '0cc737eb'} for _ in range(3)]
+            self.client.add_replicas(rse='MOCK', files=files)
+            self.client.add_dataset(scope=self.scope, name=dataset)
+            self.client.attach_dids(scope=self.scope, name=dataset, dids=files)
+            self.datasets.append(({'scope': self.scope, 'name': dataset}, files))
+
+    def teardown(self):
+        self.client.close()
+
+    def test_get_metadata_bulk(self):
+        """ ASYNC CLIENT (CLIENTS): Get the metadata of many dids concurrently """
+        dids = [did for did, _ in self.datasets]
+        metadata = list(self.client.get_metadata_bulk(dids))
+        assert_equal([did for did, _ in metadata], dids)
+        assert_equal([meta['name'] for _, meta in metadata], [did['name'] for did in dids])
+
+        unordered = self.client.map('get_metadata', dids + [{'scope': self.scope, 'name': 'dsn_%s' % generate_uuid()}], ordered=False)
+        with assert_raises(DataIdentifierNotFound):
+            list(unordered)
+
+    def test_list_files_bulk(self):
+        """ ASYNC CLIENT (CLIENTS): List the files of many dids concurrently """
+        listed = {}
+        for did, item in self.client.list_files_bulk([did for did, _ in self.datasets], buffer_size=2):
+            listed.setdefault(did['name'], set()).add(item['name'])
+        assert_equal(listed, dict((did['name'], set(f['name'] for f in files)) for did, files in self.datasets))
+
+    def test_list_replicas_bulk(self):
+        """ ASYNC CLIENT (CLIENTS): List the replicas of many dids concurrently in chunks """
+        files = [f for _, dataset_files in self.datasets for f in dataset_files]
+        replicas = list(self.client.list_replicas_bulk([{'scope': f['scope'], 'name': f['name']} for f in files], chunk_size=7, schemes=['srm']))
+        assert_equal(sorted(replica['name'] for replica in replicas), sorted(f['name'] for f in files))
+        assert_equal(set(rse for replica in replicas for rse in replica['rses']), set(['MOCK']))
@@ -12,12 +12,16 @@
 
 import base64
 
-from nose.tools import assert_equal, assert_is_none, assert_is_not_none, assert_greater, assert_in
+from time import time
+
+from dogpile.cache.api import NO_VALUE
+from nose.tools import assert_equal, assert_is_none, assert_is_not_none, assert_greater, assert_in, assert_raises
 from paste.fixture import TestApp
 
-from rucio.api.authentication import get_auth_token_user_pass, get_auth_token_ssh, get_ssh_challenge_token
-from rucio.common.exception import Duplicate
-from rucio.common.utils import ssh_sign
+from rucio.api.authentication import get_auth_token_user_pass, get_auth_token_ssh, get_ssh_challenge_token, validate_auth_token
+from rucio.common.exception import Duplicate, ServiceUnavailable
+from rucio.common.utils import generate_uuid, ssh_sign
+from rucio.core import authentication
 from rucio.core.identity import add_account_identity, del_account_identity
 from rucio.db.sqla.constants import IdentityType
 from rucio.web.rest.authentication import APP
@@ -109,6 +113,32 @@ class TestAuthCoreApi(object):
 
         del_account_identity(PUBLIC_KEY, IdentityType.SSH, 'root')
 
+    def test_validate_auth_token(self):
+        """AUTHENTICATION (CORE): Validate tokens with the invalid token cache and the query rate limit."""
+        token = get_auth_token_user_pass(account='root', username='ddmlab', password='secret', appid='test', ip='127.0.0.1')
+        assert_equal(validate_auth_token(token)['account'], 'root')
+        assert_equal(validate_auth_token(' %s ' % token)['account'], 'root')
+
+        invalid_token = generate_uuid()
+        assert_is_none(validate_auth_token(invalid_token))
+        assert_equal(authentication.INVALID_TOKENS.get(invalid_token), True)
+
+        queries = dict(authentication.TOKEN_QUERIES)
+        try:
+            # No allowance left for the next second
+            authentication.TOKEN_QUERIES.update({'allowance': -authentication.TOKEN_QUERY_RATE, 'checked': time()})
+            assert_equal(authentication.token_query_allowed(), False)
+            # Cached tokens are still validated
+            assert_equal(validate_auth_token(token)['account'], 'root')
+            # Valid tokens not cached yet are not reported as invalid, the client has to retry
+            new_token = get_auth_token_user_pass(account='root', username='ddmlab', password='secret', appid='test', ip='127.0.0.1')
+            with assert_raises(ServiceUnavailable):
+                validate_auth_token(new_token)
+            assert_equal(authentication.INVALID_TOKENS.get(new_token), NO_VALUE)
+        finally:
+            authentication.TOKEN_QUERIES.update(queries)
+        assert_equal(validate_auth_token(new_token)['account'], 'root')
+
 
 class TestAuthRestApi(object):
     '''
@@ -168,3 +198,19 @@ class TestAuthRestApi(object):
         assert_equal(result.status, 401)
 
         del_account_identity(PUBLIC_KEY, IdentityType.SSH, 'root')
+
+    def test_validate_rate_limited(self):
+        """AUTHENTICATION (REST): Validate a token not cached while the token query rate is exceeded (retry later)."""
+        token = get_auth_token_user_pass(account='root', username='ddmlab', password='secret', appid='test', ip='127.0.0.1')
+        options = []
+        headers = {'X-Rucio-Auth-Token': str(token)}
+        queries = dict(authentication.TOKEN_QUERIES)
+        try:
+            authentication.TOKEN_QUERIES.update({'allowance': -authentication.TOKEN_QUERY_RATE, 'checked': time()})
+            result = TestApp(APP.wsgifunc(*options)).get('/validate', headers=headers, expect_errors=True)
+            assert_equal(result.status, 503)
+            assert_equal(result.header('ExceptionClass'), 'ServiceUnavailable')
+        finally:
+            authentication.TOKEN_QUERIES.update(queries)
+        result = TestApp(APP.wsgifunc(*options)).get('/validate', headers=headers, expect_errors=True)
+        assert_equal(result.status, 200)
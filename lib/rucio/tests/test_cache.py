@@ -0,0 +1,83 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from time import sleep
+
+from dogpile.cache.api import NO_VALUE
+from nose.tools import assert_equal, assert_in, assert_raises
+
+from rucio.common.cache import GENERATION_SECTION, GENERATIONS, cache_stats, invalidate, make_region_memcached
+from rucio.common.utils import generate_uuid
+from rucio.core.config import set as config_set
+from rucio.db.sqla.session import transactional_session
+
+
+class TestCache:
+
+    def setup(self):
+        self.name = 'test_%s' % generate_uuid()
+        self.region = make_region_memcached(self.name, local_size=2, local_expiration_time=1, backend='memory')
+
+    def test_local_tier(self):
+        """ CACHE (COMMON): Values are served from the local tier and counted """
+        self.region.set('key', 'value')
+        assert_equal(self.region.get('key'), 'value')
+        assert_equal(self.region.get('missing'), NO_VALUE)
+        stats = cache_stats()
+        assert_in(self.name, stats)
+        assert_equal(stats[self.name], {'local_hits': 1, 'hits': 0, 'misses': 1})
+
+        # After the local expiration, the value comes from the backend again
+        sleep(1.1)
+        assert_equal(self.region.get('key'), 'value')
+        assert_equal(cache_stats()[self.name]['hits'], 1)
+
+    def test_local_tier_eviction(self):
+        """ CACHE (COMMON): The least recently used values are evicted from the local tier """
+        self.region.set_multi({'a': 1, 'b': 2})
+        self.region.get('a')
+        self.region.set('c', 3)
+        assert_equal(self.region.get_multi(['a', 'b', 'c']), [1, 2, 3])
+        assert_equal(cache_stats()[self.name], {'local_hits': 3, 'hits': 1, 'misses': 0})
+
+    def test_invalidate(self):
+        """ CACHE (COMMON): Invalidate single keys and whole regions """
+        self.region.set_multi({'a': 1, 'b': 2})
+        invalidate(self.name, keys=['a'])
+        assert_equal(self.region.get('a'), NO_VALUE)
+        assert_equal(self.region.get('b'), 2)
+        invalidate(self.name)
+        assert_equal(self.region.get('b'), NO_VALUE)
+
+    def test_invalidate_other_process(self):
+        """ CACHE (COMMON): A region is invalidated by a generation bumped in another process """
+        self.region.set('key', 'value')
+        config_set(GENERATION_SECTION, self.name, generate_uuid())
+        assert_equal(self.region.get('key'), 'value')
+        GENERATIONS.poll()
+        assert_equal(self.region.get('key'), NO_VALUE)
+
+    def test_invalidate_after_commit(self):
+        """ CACHE (COMMON): A new generation is used in the process once committed, and dropped on rollback """
+        @transactional_session
+        def update(error=None, session=None):
+            invalidate(self.name, session=session)
+            # Other threads may still read the old values from the database
+            assert_equal(GENERATIONS.get(self.name), generation)
+            if error:
+                raise error
+
+        self.region.set('key', 'value')
+        GENERATIONS.poll()
+        generation = GENERATIONS.get(self.name)
+        with assert_raises(ValueError):
+            update(ValueError())
+        assert_equal(GENERATIONS.get(self.name), generation)
+        assert_equal(self.region.get('key'), 'value')
+
+        update()
+        assert_equal(self.region.get('key'), NO_VALUE)
@@ -0,0 +1,45 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+import json
+import os
+import sys
+
+from nose.tools import assert_equal
+
+import rucio
+from rucio.tests.common import execute
+
+BIN_RUCIO = os.path.join(os.path.dirname(rucio.__file__), '..', '..', 'bin', 'rucio')
+
+# Modules of the server, the database and the heavy dependencies, not needed to start a client
+SERVER_MODULES = ('sqlalchemy', 'flask', 'web', 'paramiko', 'dogpile', 'multiprocessing', 'rucio.core', 'rucio.db', 'rucio.api')
+
+
+def imported_modules(code):
+    """ Runs code in a new interpreter and returns the modules it imported """
+    script = '%s; import json, sys; sys.stdout.write(json.dumps(sorted(sys.modules)))' % code
+    exitcode, out, err = execute('%s -c "%s"' % (sys.executable, script))
+    assert_equal(exitcode, 0, err)
+    return json.loads(out)
+
+
+def unexpected(modules, forbidden):
+    return [module for module in modules if any(module == name or module.startswith(name + '.') for name in forbidden)]
+
+
+class TestClientStartup(object):
+
+    def test_client_imports(self):
+        """ CLIENT STARTUP (CLIENTS): The clients import none of the server modules """
+        assert_equal(unexpected(imported_modules('import rucio.client'), SERVER_MODULES), [])
+        assert_equal(unexpected(imported_modules('from rucio.client.pingclient import PingClient'), SERVER_MODULES), [])
+
+    def test_cli_imports(self):
+        """ CLIENT STARTUP (CLIENTS): bin/rucio imports the client, requests and the RSE manager only when a command needs them """
+        modules = imported_modules("import imp; imp.load_source('rucio_cli', '%s').get_parser()" % BIN_RUCIO)
+        assert_equal(unexpected(modules, SERVER_MODULES + ('requests', 'rucio.client', 'rucio.rse')), [])
@@ -17,7 +17,7 @@ from __future__ import print_function
 
 from os import remove
 
-from nose.tools import raises
+from nose.tools import assert_equal, raises
 
 from rucio.client.baseclient import BaseClient
 from rucio.client.client import Client
@@ -46,6 +46,31 @@ class TestBaseClient(object):
         creds = {'username': 'ddmlab', 'password': 'secret'}
         BaseClient(account='root', ca_cert=self.cacert, auth_type='userpass', creds=creds)
 
+    def testRetryServiceUnavailable(self):
+        """ CLIENTS (BASECLIENT): retry the requests answered with 503."""
+        class Response(object):
+            def __init__(self, status_code):
+                self.status_code = status_code
+                self.headers = {}
+
+        class Session(object):
+            def __init__(self, answers):
+                self.answers = answers
+
+            def get(self, *args, **kwargs):
+                return Response(self.answers.pop(0))
+
+        creds = {'username': 'ddmlab', 'password': 'secret'}
+        client = BaseClient(account='root', ca_cert=self.cacert, auth_type='userpass', creds=creds)
+        client.UNAVAILABLE_WAIT = 0
+        client.session = Session([503, 503, 200])
+        assert_equal(client._send_request('https://localhost/ping').status_code, 200)
+        assert_equal(client.session.answers, [])
+
+        client.session = Session([503] * (client.request_retries + 2))
+        assert_equal(client._send_request('https://localhost/ping').status_code, 503)
+        assert_equal(len(client.session.answers), 1)
+
     @raises(CannotAuthenticate)
     def testUserpassWrongCreds(self):
         """ CLIENTS (BASECLIENT): try to authenticate with wrong username."""
@@ -7,10 +7,73 @@
 # Authors:
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2014
 
-from nose.tools import assert_equal, assert_in, assert_is_instance, assert_true
+from nose.tools import assert_equal, assert_false, assert_in, assert_is_instance, assert_raises, assert_true
 
 from rucio.client.configclient import ConfigClient
+from rucio.common.exception import ConfigNotFound
 from rucio.common.utils import generate_uuid
+from rucio.core import config as config_core
+from rucio.db.sqla import models
+from rucio.db.sqla.session import get_session
+
+
+class TestConfigCore:
+
+    def setup(self):
+        self.section = str(generate_uuid())
+
+    def test_config_snapshot(self):
+        """ CONFIG (CORE): Read configuration values from the snapshot """
+        config_core.set(self.section, 'int', '543210')
+        config_core.set(self.section, 'bool', 'True')
+        assert_equal(config_core.get(self.section, 'int'), 543210)
+        assert_true(config_core.get(self.section, 'bool'))
+        assert_true(config_core.has_option(self.section, 'int'))
+        assert_equal(sorted(config_core.items(self.section)), [('bool', True), ('int', 543210)])
+
+        config_core.set(self.section, 'int', '42')
+        assert_equal(config_core.get(self.section, 'int'), 42)
+        config_core.remove_option(self.section, 'int')
+        assert_false(config_core.has_option(self.section, 'int'))
+        assert_raises(ConfigNotFound, config_core.get, self.section, 'int')
+
+    def test_config_snapshot_after_commit(self):
+        """ CONFIG (CORE): The snapshot is refreshed once a change is committed """
+        config_core.set(self.section, 'string', 'iddqd')
+        session = get_session()
+        config_core.set(self.section, 'string', 'idkfa', session=session)
+        # A read before the commit must not keep the old value in the snapshot
+        assert_equal(config_core.get(self.section, 'string'), 'iddqd')
+        session.commit()
+        assert_equal(config_core.get(self.section, 'string'), 'idkfa')
+
+        refreshed = config_core.SNAPSHOT['refreshed']
+        config_core.set(self.section, 'string', 'idclip', session=session)
+        session.rollback()
+        assert_equal(config_core.SNAPSHOT['refreshed'], refreshed)
+        assert_equal(config_core.get(self.section, 'string'), 'idkfa')
+
+    def test_config_snapshot_other_process(self):
+        """ CONFIG (CORE): The snapshot is refreshed with the changes of other processes """
+        config_core.set(self.section, 'string', 'iddqd')
+        assert_equal(config_core.get(self.section, 'string'), 'iddqd')
+
+        # Changed behind the back of this process
+        session = get_session()
+        session.query(models.Config).filter_by(section=self.section, opt='string').update({'value': 'idkfa'})
+        session.add(models.Config(section=self.section, opt='added', value='1'))
+        session.commit()
+        assert_equal(config_core.get(self.section, 'string'), 'iddqd')
+        assert_equal(config_core.get(self.section, 'string', use_cache=False), 'idkfa')
+
+        config_core.SNAPSHOT['refreshed'] = 0
+        assert_equal(config_core.get(self.section, 'string'), 'idkfa')
+        assert_equal(config_core.get(self.section, 'added'), 1)
+
+        session.query(models.Config).filter_by(section=self.section, opt='added').delete()
+        session.commit()
+        config_core.SNAPSHOT['refreshed'] = 0
+        assert_false(config_core.has_option(self.section, 'added'))
 
 
 class TestConfigClients:
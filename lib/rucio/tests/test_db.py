@@ -9,7 +9,22 @@
   Authors:
   - Vincent Garonne, <vincent.garonne@cern.ch>, 2013-2017
 '''
-from rucio.db.sqla.session import get_session
+import os
+
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+from nose.tools import assert_equal, assert_false, assert_in, assert_raises, assert_true
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from rucio.common.exception import DatabaseException
+from rucio.common.utils import generate_uuid
+from rucio.core import config as config_core
+from rucio.db.sqla import instrumentation, models, session as session_module
+from rucio.db.sqla.session import get_read_replica, get_session, is_transient_error, read_session, replay, stream_session, transactional_session
 
 
 def test_db_connection():
@@ -20,3 +35,250 @@ def test_db_connection():
     else:
         session.execute('select 1')
     session.close()
+
+
+class TestReadReplica:
+
+    def setup(self):
+        self.directory = mkdtemp()
+        self.replicas = session_module._READ_REPLICAS
+        self.engine = create_engine('sqlite:///%s' % os.path.join(self.directory, 'replica.db'))
+        self.replica = {'section': 'test_replica', 'maker': sessionmaker(bind=self.engine), 'down_until': 0}
+        session_module._READ_REPLICAS = [self.replica]
+
+    def teardown(self):
+        session_module._READ_REPLICAS = self.replicas
+        self.engine.dispose()
+        rmtree(self.directory)
+
+    def test_read_replica(self):
+        """ DB (CORE): Reads are routed to the read replica, except with replica=False """
+        section = 'test_%s' % generate_uuid()
+        models.register_models(self.engine)
+        replica_session = self.replica['maker']()
+        replica_session.add(models.Config(section=section, opt='where', value='replica'))
+        replica_session.commit()
+        config_core.set(section, 'where', 'primary')
+
+        @read_session
+        def read(session=None):
+            return session.query(models.Config.value).filter_by(section=section).one()[0]
+
+        @read_session(replica=False)
+        def read_primary(session=None):
+            return session.query(models.Config.value).filter_by(section=section).one()[0]
+
+        @stream_session
+        def stream(session=None):
+            for value, in session.query(models.Config.value).filter_by(section=section):
+                yield value
+
+        assert_equal(read(), 'replica')
+        assert_equal(list(stream()), ['replica'])
+        assert_equal(read_primary(), 'primary')
+        config_core.remove_option(section, 'where')
+
+    def test_read_replica_failback(self):
+        """ DB (CORE): Reads fail back to the primary database while the read replica fails """
+        section = 'test_%s' % generate_uuid()
+        config_core.set(section, 'where', 'primary')
+
+        @read_session
+        def read(session=None):
+            return session.query(models.Config.value).filter_by(section=section).one()[0]
+
+        # The tables are missing in the replica
+        assert_equal(read(), 'primary')
+        assert_true(self.replica['down_until'] > time())
+        assert_equal(get_read_replica(), None)
+        self.replica['down_until'] = 0
+        assert_equal(get_read_replica(), self.replica)
+        config_core.remove_option(section, 'where')
+
+
+class TestInstrumentation:
+
+    def setup(self):
+        self.counters = {}
+        self.record_counter = instrumentation.record_counter
+        self.slow_query_time = instrumentation.SLOW_QUERY_TIME
+        instrumentation.record_counter = lambda counter, delta: self.counters.__setitem__(counter, self.counters.get(counter, 0) + delta)
+
+    def teardown(self):
+        instrumentation.record_counter = self.record_counter
+        instrumentation.SLOW_QUERY_TIME = self.slow_query_time
+
+    def test_instrumentation(self):
+        """ DB (CORE): Queries are attributed to the innermost decorated function """
+        @read_session
+        def inner(session=None):
+            return session.execute('select 1').fetchall()
+
+        @read_session
+        def outer(session=None):
+            session.execute('select 2').fetchall()
+            return inner(session=session)
+
+        @stream_session
+        def stream(session=None):
+            for row in session.execute("select 'secret'"):
+                yield row
+
+        outer()
+        assert_equal(self.counters['core.db.test_db.outer.queries'], 1)
+        assert_equal(self.counters['core.db.test_db.inner.queries'], 1)
+
+        # The queries of the consumer between the rows are not attributed to the generator
+        for row in stream():
+            inner()
+        assert_equal(self.counters['core.db.test_db.stream.queries'], 1)
+        assert_equal(self.counters['core.db.test_db.inner.queries'], 2)
+
+    def test_rows(self):
+        """ DB (CORE): The rows fetched by queries and changed by DML statements are counted """
+        section = 'test_%s' % generate_uuid()
+
+        @transactional_session
+        def insert(session=None):
+            session.execute("insert into configs (section, opt, value, created_at, updated_at) values ('%s', 'a', '1', current_timestamp, current_timestamp)" % section)
+            session.execute("insert into configs (section, opt, value, created_at, updated_at) values ('%s', 'b', '2', current_timestamp, current_timestamp)" % section)
+
+        @read_session
+        def query(session=None):
+            return session.query(models.Config).filter_by(section=section).all()
+
+        @stream_session
+        def stream(session=None):
+            for row in session.execute("select 1 union all select 2 union all select 3"):
+                yield row
+
+        insert()
+        assert_equal(len(query()), 2)
+        assert_equal(len(list(stream())), 3)
+        assert_equal(self.counters['core.db.test_db.insert.rows'], 2)
+        assert_equal(self.counters['core.db.test_db.query.rows'], 2)
+        assert_equal(self.counters['core.db.test_db.stream.rows'], 3)
+        config_core.remove_option(section, 'a')
+        config_core.remove_option(section, 'b')
+
+    def test_failed_query(self):
+        """ DB (CORE): A failed query does not leave its start time on the connection """
+        @read_session
+        def failing(session=None):
+            with assert_raises(OperationalError):
+                session.execute('select * from no_such_table')
+            return session.connection().info.get('query_start')
+
+        assert_false(failing())
+
+    def test_slow_queries(self):
+        """ DB (CORE): Slow queries are kept with their literals redacted """
+        @read_session
+        def slow(session=None):
+            return session.execute("select 'secret', 42").fetchall()
+
+        instrumentation.SLOW_QUERY_TIME = 1e-6
+        slow()
+        statements = [statement for _, name, statement in instrumentation.slowest_statements() if name == 'test_db.slow']
+        assert_in('select ?, ?', statements)
+
+
+class TestTransientErrors:
+
+    def setup(self):
+        self.counters = []
+        self.record_counter = session_module.record_counter
+        self.retry_wait = session_module.RETRY_WAIT
+        session_module.record_counter = self.counters.append
+        session_module.RETRY_WAIT = 0
+
+    def teardown(self):
+        session_module.record_counter = self.record_counter
+        session_module.RETRY_WAIT = self.retry_wait
+
+    def test_is_transient_error(self):
+        """ DB (CORE): Lock and deadlock errors of all dialects are transient, NOWAIT lock errors are not """
+        for message in ('ORA-00060: deadlock detected while waiting for resource',
+                        '(1213, \'Deadlock found when trying to get lock; try restarting transaction\')',
+                        'deadlock detected',
+                        'database is locked'):
+            assert_true(is_transient_error(OperationalError('select 1', {}, Exception(message))))
+        assert_false(is_transient_error(OperationalError('select 1', {}, Exception('no such table: dids'))))
+        assert_false(is_transient_error(OperationalError('select 1', {}, Exception('ORA-00054: resource busy and acquire with NOWAIT specified'))))
+        assert_false(is_transient_error(Exception('database is locked')))
+
+    def test_transaction_retry(self):
+        """ DB (CORE): Transactions are replayed after transient errors, up to retry_attempts """
+        calls = []
+
+        @transactional_session
+        def locked(failures, message='database is locked', session=None):
+            calls.append(session)
+            if len(calls) <= failures:
+                raise OperationalError('select 1', {}, Exception(message))
+            return session.execute('select 1').fetchall()
+
+        assert_equal(locked(2), [(1, )])
+        assert_equal(len(calls), 3)
+        assert_equal(len(self.counters), 2)
+
+        del calls[:]
+        with assert_raises(DatabaseException):
+            locked(session_module.RETRY_ATTEMPTS + 1)
+        assert_equal(len(calls), session_module.RETRY_ATTEMPTS + 1)
+
+        del calls[:]
+        with assert_raises(DatabaseException):
+            locked(1, message='no such table: dids')
+        assert_equal(len(calls), 1)
+
+    def test_nowait_not_retried(self):
+        """ DB (CORE): Transactions failing on a NOWAIT lock are not replayed """
+        calls = []
+
+        @transactional_session
+        def nowait(session=None):
+            calls.append(session)
+            raise OperationalError('select 1', {}, Exception('ORA-00054: resource busy and acquire with NOWAIT specified'))
+
+        with assert_raises(DatabaseException):
+            nowait()
+        assert_equal(len(calls), 1)
+        assert_equal(self.counters, [])
+
+    def test_nested_replay(self):
+        """ DB (CORE): Units of work replayed in a transaction are not replayed again with the transaction """
+        class Savepoint(object):
+            def commit(self):
+                pass
+
+            def rollback(self):
+                pass
+
+        class Session(object):
+            """ Session of a database with savepoints """
+            bind = type('Bind', (object, ), {'dialect': type('Dialect', (object, ), {'name': 'oracle'})})
+
+            def begin_nested(self):
+                return Savepoint()
+
+        units, transactions = [], []
+
+        def unit(message, session=None):
+            units.append(session)
+            raise OperationalError('select 1', {}, Exception(message))
+
+        @transactional_session
+        def bulk(message, session=None):
+            transactions.append(session)
+            replay(unit, args=(message, ), session=Session())
+
+        # Lock errors of NOWAIT queries are raised at once to the caller
+        with assert_raises(DatabaseException):
+            bulk('ORA-00054: resource busy and acquire with NOWAIT specified')
+        assert_equal((len(units), len(transactions)), (1, 1))
+
+        del units[:], transactions[:]
+        with assert_raises(DatabaseException):
+            bulk('ORA-00060: deadlock detected while waiting for resource')
+        assert_equal((len(units), len(transactions)), (session_module.RETRY_ATTEMPTS + 1, 1))
@@ -34,8 +34,8 @@ from rucio.common.exception import (DataIdentifierNotFound, DataIdentifierAlread
                                     UnsupportedStatus, ScopeNotFound)
 from rucio.common.utils import generate_uuid
 from rucio.core.account_limit import set_account_limit
-from rucio.core.did import (list_dids, add_did, delete_dids, get_did_atime, touch_dids, attach_dids,
-                            get_metadata, set_metadata, get_did, get_did_access_cnt)
+from rucio.core.did import (list_dids, add_did, add_dids, delete_dids, get_did_atime, touch_dids, attach_dids,
+                            get_metadata, get_metadata_bulk, set_metadata, get_did, get_did_access_cnt)
 from rucio.core.rse import get_rse_id
 from rucio.core.replica import add_replica
 from rucio.db.sqla.constants import DIDType
@@ -61,6 +61,19 @@ class TestDIDCore:
             add_did(scope=tmp_scope, name=dsn['name'], type='DATASET', account='root')
         delete_dids(dids=dsns, account='root')
 
+    def test_delete_dids_bulk(self):
+        """ DATA IDENTIFIERS (CORE): Delete more dids than fit in one statement """
+        tmp_scope = 'mock'
+        dsns = [{'name': 'dsn_%s' % generate_uuid(),
+                 'scope': tmp_scope,
+                 'purge_replicas': False,
+                 'did_type': DIDType.DATASET} for i in range(1050)]
+        add_dids(dids=[{'scope': tmp_scope, 'name': dsn['name'], 'type': DIDType.DATASET} for dsn in dsns], account='root')
+        delete_dids(dids=dsns, account='root', bulk=True)
+        for dsn in (dsns[0], dsns[-1]):
+            with assert_raises(DataIdentifierNotFound):
+                get_did(scope=tmp_scope, name=dsn['name'])
+
     def test_touch_dids_atime(self):
         """ DATA IDENTIFIERS (CORE): Touch dids accessed_at timestamp"""
         tmp_scope = 'mock'
@@ -117,6 +130,17 @@ class TestDIDCore:
         set_metadata(scope=tmp_scope, name=lfn, key='bytes', value=724963577L)
         assert_equal(get_metadata(scope=tmp_scope, name=lfn)['bytes'], 724963577L)
 
+    def test_get_metadata_bulk(self):
+        """ DATA IDENTIFIERS (CORE): Get the metadata of more dids than fit in one query """
+        tmp_scope = 'mock'
+        dsns = [{'scope': tmp_scope, 'name': 'dsn_%s' % generate_uuid(), 'type': DIDType.DATASET} for _ in range(1050)]
+        add_dids(dids=dsns, account='root')
+
+        dids = [{'scope': dsn['scope'], 'name': dsn['name']} for dsn in dsns]
+        metadata = get_metadata_bulk(dids + [{'scope': tmp_scope, 'name': 'dsn_%s' % generate_uuid()}])
+        assert_equal(sorted(meta['name'] for meta in metadata), sorted(did['name'] for did in dids))
+        assert_equal(get_metadata_bulk([]), [])
+
     def test_get_did_with_dynamic(self):
         """ DATA IDENTIFIERS (CORE): Get did with dynamic resolve of size"""
         tmp_scope = 'mock'
@@ -0,0 +1,71 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from nose.tools import assert_equal
+
+from rucio.common.utils import generate_uuid
+from rucio.core.did import add_did, attach_dids, list_all_parent_dids, list_child_datasets, list_files
+from rucio.core.did_hierarchy import list_ancestors, list_descendants
+from rucio.db.sqla.constants import DIDType
+
+
+class TestDIDHierarchy:
+
+    def setup(self):
+        """ Build the hierarchy c0 > c1 > (c2 > d1 > (f1, f2), c3 > d2 > f3) """
+        self.scope = 'mock'
+        self.names = dict((key, '%s_%s' % (key, generate_uuid())) for key in ('c0', 'c1', 'c2', 'c3', 'd1', 'd2', 'f1', 'f2', 'f3'))
+        for key in ('c0', 'c1', 'c2', 'c3'):
+            add_did(scope=self.scope, name=self.names[key], type=DIDType.CONTAINER, account='root')
+        for key in ('d1', 'd2'):
+            add_did(scope=self.scope, name=self.names[key], type=DIDType.DATASET, account='root')
+        attach_dids(scope=self.scope, name=self.names['d1'], rse='MOCK', account='root',
+                    dids=[{'scope': self.scope, 'name': self.names[key], 'bytes': 1L, 'adler32': '0cc737eb'} for key in ('f1', 'f2')])
+        attach_dids(scope=self.scope, name=self.names['d2'], rse='MOCK', account='root',
+                    dids=[{'scope': self.scope, 'name': self.names['f3'], 'bytes': 1L, 'adler32': '0cc737eb'}])
+        for parent, children in (('c2', ('d1',)), ('c3', ('d2',)), ('c1', ('c2', 'c3')), ('c0', ('c1',))):
+            attach_dids(scope=self.scope, name=self.names[parent], account='root',
+                        dids=[{'scope': self.scope, 'name': self.names[key]} for key in children])
+
+    def __keys(self, dids, with_depth=True):
+        """ Map the returned dids back to the keys of the hierarchy """
+        names = dict((name, key) for key, name in self.names.items())
+        if with_depth:
+            return sorted((names[did['name']], did['depth']) for did in dids)
+        return sorted(names[did['name']] for did in dids)
+
+    def test_list_ancestors(self):
+        """ DID HIERARCHY (CORE): List the ancestors of a did """
+        for recursive_cte in (True, False):
+            assert_equal(self.__keys(list_ancestors(self.scope, self.names['f3'], recursive_cte=recursive_cte)),
+                         [('c0', 4), ('c1', 3), ('c3', 2), ('d2', 1)])
+            assert_equal(self.__keys(list_ancestors(self.scope, self.names['f3'], max_depth=2, recursive_cte=recursive_cte)),
+                         [('c3', 2), ('d2', 1)])
+            assert_equal(self.__keys(list_ancestors(self.scope, self.names['f3'], did_types=[DIDType.CONTAINER], recursive_cte=recursive_cte)),
+                         [('c0', 4), ('c1', 3), ('c3', 2)])
+
+    def test_list_descendants(self):
+        """ DID HIERARCHY (CORE): List the descendants of a did """
+        for recursive_cte in (True, False):
+            assert_equal(self.__keys(list_descendants(self.scope, self.names['c0'], recursive_cte=recursive_cte)),
+                         [('c1', 1), ('c2', 2), ('c3', 2), ('d1', 3), ('d2', 3), ('f1', 4), ('f2', 4), ('f3', 4)])
+            assert_equal(self.__keys(list_descendants(self.scope, self.names['c0'], max_depth=2, recursive_cte=recursive_cte)),
+                         [('c1', 1), ('c2', 2), ('c3', 2)])
+            assert_equal(self.__keys(list_descendants(self.scope, self.names['c0'], did_types=[DIDType.DATASET], recursive_cte=recursive_cte)),
+                         [('d1', 3), ('d2', 3)])
+            files = list(list_descendants(self.scope, self.names['c1'], did_types=[DIDType.FILE], long=True, recursive_cte=recursive_cte))
+            assert_equal(self.__keys(files), [('f1', 3), ('f2', 3), ('f3', 3)])
+            for did in files:
+                assert_equal(did['bytes'], 1)
+                assert_equal(did['lumiblocknr'], None)
+
+    def test_did_listings(self):
+        """ DID HIERARCHY (CORE): List parents, child datasets and files through the hierarchy """
+        assert_equal(self.__keys(list_all_parent_dids(self.scope, self.names['f1']), with_depth=False), ['c0', 'c1', 'c2', 'd1'])
+        assert_equal(self.__keys(list_child_datasets(self.scope, self.names['c0']), with_depth=False), ['d1', 'd2'])
+        assert_equal(self.__keys(list_files(self.scope, self.names['c0']), with_depth=False), ['f1', 'f2', 'f3'])
+        assert_equal(self.__keys(list_files(self.scope, self.names['f1']), with_depth=False), ['f1'])
@@ -10,9 +10,19 @@
 # - Cedric Serfon, <cedric.serfon@cern.ch>, 2017
 
 
+import BaseHTTPServer
+import base64
+import bz2
+import SocketServer
 import __builtin__
+import gzip
+import hashlib
+import json
 import os
+import shutil
 import tempfile
+import threading
+import zlib
 
 from StringIO import StringIO
 from datetime import datetime
@@ -225,3 +235,185 @@ def test_srm_download_creates_file_with_content():
 
     local_file.seek(0)
     eq_(local_file.read(), 'content')
+
+
+def test_dump_writer_multi_stream_split_at_stream_boundary():
+    """ DUMPER (COMMON): Decompress concatenated streams written at their boundary """
+    for compress in (bz2.compress, _gzip):
+        streams = [compress('first stream\n'), compress('second stream\n')]
+        output = StringIO()
+        writer = dumper.DumpWriter(output)
+        for stream in streams:
+            writer.write(stream)
+        writer.close()
+        eq_(output.getvalue(), 'first stream\nsecond stream\n')
+
+
+def _gzip(data):
+    compressed = StringIO()
+    with gzip.GzipFile(fileobj=compressed, mode='w') as gzfile:
+        gzfile.write(data)
+    return compressed.getvalue()
+
+
+class _RangeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Minimal HTTP server stand-in serving `server.content` with Range support """
+    def log_message(self, *args):
+        pass
+
+    def _redirect(self):
+        if self.path != '/redirect':
+            return False
+        self.send_response(302)
+        self.send_header('Location', '/dump')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def do_HEAD(self):
+        if self._redirect():
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.content)))
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"v1"')
+        for header, value in self.server.headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+
+    def do_GET(self):
+        if self._redirect():
+            return
+        content = self.server.content
+        self.server.requests.append(self.headers.get('Range'))
+        if self.server.ranges and self.headers.get('Range'):
+            start, end = self.headers['Range'].split('=')[1].split('-')
+            content = content[int(start):int(end) + 1]
+            if int(start) in self.server.corrupt:
+                content = content[::-1]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestHTTPParallelDownload(object):
+
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.plain = ''.join('line {0}\n'.format(i) for i in range(20000))
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), _RangeHandler)
+        self.server.content = _gzip(self.plain)
+        self.server.ranges = True
+        self.server.requests = []
+        self.server.headers = {}
+        self.server.corrupt = set()
+        self.url = 'http://127.0.0.1:{0}/dump'.format(self.server.server_address[1])
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def teardown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parallel_download_decompresses_and_verifies(self):
+        """ DUMPER (COMMON): Parallel ranged download of a gzip dump """
+        path = dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', threads=3, segment_size=4096,
+                                             md5=hashlib.md5(self.server.content).hexdigest())
+        with open(path) as dump:
+            eq_(dump.read(), self.plain)
+        ok_(len(self.server.requests) > 3)
+        ok_(all(self.server.requests))
+        eq_(os.listdir(self.tmp_dir), ['dump'])
+
+    def test_parallel_download_resumes_partial_file(self):
+        """ DUMPER (COMMON): Resume a partially downloaded dump """
+        size = len(self.server.content)
+        part_path = os.path.join(self.tmp_dir, 'dump.part')
+        with open(part_path, 'w') as part:
+            part.write(self.server.content[:4096] + self.server.content[4096:6000] + '\0' * (size - 6000))
+        with open(part_path + '.state', 'w') as state:
+            json.dump({'url': self.url, 'size': size, 'validator': '"v1"', 'done': {'0': 4096, '1': 6000 - 4096}}, state)
+
+        path = dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', threads=2, segment_size=4096)
+        with open(path) as dump:
+            eq_(dump.read(), self.plain)
+        ok_('bytes=0-4095' not in self.server.requests)
+        ok_('bytes=6000-8191' in self.server.requests)
+
+    def test_parallel_download_checksum_mismatch(self):
+        """ DUMPER (COMMON): Corrupted ranged download raises and is not resumed """
+        try:
+            dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', segment_size=4096, adler32='deadbeef')
+        except dumper.HTTPDownloadFailed:
+            pass
+        else:
+            raise AssertionError('HTTPDownloadFailed not raised')
+        eq_(os.listdir(self.tmp_dir), [])
+
+    def test_parallel_download_server_checksum(self):
+        """ DUMPER (COMMON): Verify the checksums announced by the server """
+        self.server.headers = {'Content-MD5': base64.b64encode(hashlib.md5(self.server.content).digest()),
+                               'Digest': 'adler32=%08x' % (zlib.adler32(self.server.content) & 0xffffffff)}
+        path = dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', threads=2, segment_size=4096)
+        with open(path) as dump:
+            eq_(dump.read(), self.plain)
+
+        # a corrupted segment is detected without any checksum given by the caller
+        os.unlink(path)
+        self.server.corrupt.add(4096)
+        try:
+            dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', threads=2, segment_size=4096)
+        except dumper.HTTPDownloadFailed:
+            pass
+        else:
+            raise AssertionError('HTTPDownloadFailed not raised')
+        eq_(os.listdir(self.tmp_dir), [])
+
+    def test_http_checksums(self):
+        """ DUMPER (COMMON): Checksums announced in the response headers """
+        md5 = hashlib.md5('dump').hexdigest()
+        eq_(dumper.http_checksums({'digest': 'MD5=%s, ADLER32=1a2b3c' % base64.b64encode(hashlib.md5('dump').digest())}),
+            (md5, '001a2b3c'))
+        eq_(dumper.http_checksums({'etag': '"%s"' % md5.upper()}), (md5, None))
+        eq_(dumper.http_checksums({'etag': '"%s-2"' % md5}), (None, None))
+        eq_(dumper.http_checksums({'etag': 'W/"v1"'}), (None, None))
+
+    def test_download_without_range_support(self):
+        """ DUMPER (COMMON): Single stream download when ranges are not supported """
+        self.server.ranges = False
+        path = dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', segment_size=4096, decompress=False)
+        with open(path) as dump:
+            eq_(dump.read(), self.server.content)
+        eq_(self.server.requests, [None])
+
+    def test_parallel_download_follows_redirect(self):
+        """ DUMPER (COMMON): Ranged download of a redirected dump """
+        url = self.url.replace('/dump', '/redirect')
+        path = dumper.http_parallel_download(url, self.tmp_dir, 'dump', threads=2, segment_size=4096)
+        with open(path) as dump:
+            eq_(dump.read(), self.plain)
+        ok_(len(self.server.requests) > 1)
+        ok_(all(self.server.requests))
+
+    def test_parallel_download_worker_failure(self):
+        """ DUMPER (COMMON): An unexpected error of a download thread is raised """
+        def fail(*args):
+            raise IOError('No space left on device')
+
+        with stubbed(dumper._save_download_state, fail):
+            try:
+                dumper.http_parallel_download(self.url, self.tmp_dir, 'dump', threads=2, segment_size=4096)
+            except IOError:
+                pass
+            else:
+                raise AssertionError('IOError not raised')
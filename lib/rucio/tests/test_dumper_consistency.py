@@ -198,7 +198,7 @@ class TestConsistency(object):
         )
         sd = make_temp_file(self.tmp_dir, storage_dump)
 
-        def fake_get(slf, url, stream=False):
+        def fake_get(slf, url, stream=False, **kwargs):
             response = requests.Response()
             response.status_code = 200
             if '29-09-2015' in url:
@@ -207,7 +207,7 @@ class TestConsistency(object):
                 response.iter_content = lambda _: [rucio_dump_2]
             return response
 
-        def fake_head(slf, url):
+        def fake_head(slf, url, **kwargs):
             response = requests.Response()
             response.status_code = 200
             return response
@@ -152,8 +152,8 @@ CERN-PROD_DATADISK	data12_8TeV	ESD.04972924._000218.pool.root.1	a6152bbc	2498690
         response._content = 'content'
         response.iter_content = lambda _: [response._content]
 
-        with stubbed(requests.Session.get, lambda _, __: response):
-            with stubbed(requests.Session.head, lambda _, __: response):
+        with stubbed(requests.Session.get, lambda _, __, **kwargs: response):
+            with stubbed(requests.Session.head, lambda _, __, **kwargs: response):
                 self._DataConcrete.download(
                     'SOMEENDPOINT',
                     date=datetime.strptime('01-01-2015', '%d-%m-%Y'),
@@ -177,7 +177,7 @@ CERN-PROD_DATADISK	data12_8TeV	ESD.04972924._000218.pool.root.1	a6152bbc	2498690
         response.headers['content-disposition'] = 'filename=01-01-2015'
         response.iter_content = lambda _: [response._content]
 
-        def fake_head(slf, url):
+        def fake_head(slf, url, **kwargs):
             """ fake head method """
             eq_(
                 url,
@@ -186,7 +186,7 @@ CERN-PROD_DATADISK	data12_8TeV	ESD.04972924._000218.pool.root.1	a6152bbc	2498690
             return response
 
         with stubbed(requests.Session.get, fake_head):
-            with stubbed(requests.Session.head, lambda _, __: response):
+            with stubbed(requests.Session.head, lambda _, __, **kwargs: response):
                 self._DataConcrete.download(
                     'SOMEENDPOINT',
                     date='latest',
@@ -208,8 +208,8 @@ CERN-PROD_DATADISK	data12_8TeV	ESD.04972924._000218.pool.root.1	a6152bbc	2498690
         response = requests.Response()
         response.status_code = 500
 
-        with stubbed(requests.Session.get, lambda _, __: response):
-            with stubbed(requests.Session.head, lambda _, __: response):
+        with stubbed(requests.Session.get, lambda _, __, **kwargs: response):
+            with stubbed(requests.Session.head, lambda _, __, **kwargs: response):
                 self._DataConcrete.download(
                     'SOMEENDPOINT',
                     date=datetime.strptime('01-01-2015', '%d-%m-%Y'),
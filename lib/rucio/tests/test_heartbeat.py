@@ -13,7 +13,7 @@ import threading
 
 from nose.tools import assert_equal
 
-from rucio.core.heartbeat import live, die, cardiac_arrest
+from rucio.core.heartbeat import live, die, cardiac_arrest, owns
 
 
 class TestHeartbeat:
@@ -70,5 +70,29 @@ class TestHeartbeat:
         die('test0', 'host2', pids[2], threads[2])
         assert_equal(live('test0', 'host3', pids[3], threads[3]), {'assign_thread': 1, 'nr_threads': 2})
 
+    def test_heartbeat_consistent_hashing(self):
+        """ HEARTBEAT (CORE): Consistent hashing assignment with removal"""
+
+        pids = [self.__pid() for _ in range(4)]
+        threads = [self.__thread() for _ in range(4)]
+        keys = [str(key) for key in range(1000)]
+        for i in range(4):
+            live('test0', 'host%s' % i, pids[i], threads[i], consistent_hashing=True)
+        heartbeats = [live('test0', 'host%s' % i, pids[i], threads[i], consistent_hashing=True) for i in range(4)]
+        before = {}
+        for key in keys:
+            owners = [i for i in range(4) if owns(heartbeats[i], key)]
+            assert_equal(len(owners), 1)
+            before[key] = owners[0]
+
+        die('test0', 'host0', pids[0], threads[0])
+        heartbeats = [live('test0', 'host%s' % i, pids[i], threads[i], consistent_hashing=True) for i in range(1, 4)]
+        for key in keys:
+            owners = [i for i in range(1, 4) if owns(heartbeats[i - 1], key)]
+            assert_equal(len(owners), 1)
+            if before[key] != 0:
+                # only the keys of the dead thread move
+                assert_equal(owners[0], before[key])
+
     def tearDown(self):
         cardiac_arrest()
@@ -9,9 +9,7 @@
 # - Martin Barisits, <martin.barisits@cern.ch>, 2014-2017
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2014
 
-from dogpile.cache import make_region
-from hashlib import sha256
-
+from rucio.common.cache import invalidate
 from rucio.common.utils import generate_uuid as uuid
 from rucio.core.account_limit import set_account_limit
 from rucio.core.did import add_did, attach_dids
@@ -292,10 +290,7 @@ class TestJudgeRepairer():
         # Stil assert STUCK because of ignore_availability:
         assert(RuleState.STUCK == get_rule(rule_id)['state'])
 
-        region = make_region().configure('dogpile.cache.memcached',
-                                         expiration_time=3600,
-                                         arguments={'url': "127.0.0.1:11211", 'distributed_lock': True})
-        region.delete(sha256(rse).hexdigest())
+        invalidate('rse_expression')
 
         update_rse(rse, {'availability_write': True})
         rule_repairer(once=True)
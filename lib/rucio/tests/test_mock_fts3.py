@@ -0,0 +1,67 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from time import sleep
+
+from nose.tools import assert_equal, assert_in, assert_is_none, assert_true
+
+from rucio.common.utils import generate_uuid
+from rucio.daemons.mock.fts3 import FakeFTS3
+from rucio.transfertool import fts3
+
+
+class TestFakeFTS3:
+
+    def setup(self):
+        self.fts = FakeFTS3(transfer_time=0.5, seed=42).start()
+
+    def teardown(self):
+        self.fts.stop()
+
+    def submit(self, nr_files):
+        files = [{'sources': ['mock://localhost/src/file_%s' % i],
+                  'destinations': ['mock://localhost/dst/file_%s' % i],
+                  'metadata': {'request_id': generate_uuid(), 'scope': 'mock', 'name': 'file_%s' % i},
+                  'filesize': 1024,
+                  'checksum': 'ADLER32:0cc737eb'} for i in xrange(nr_files)]
+        return fts3.submit_bulk_transfers(self.fts.url, files, {'job_metadata': {'issuer': 'rucio'}, 'priority': 3}), files
+
+    def test_submit_and_query(self):
+        """ FAKE FTS3 (DAEMONS): Jobs submitted with the FTS3 transfertool finish and are queried in bulk """
+        job_id, files = self.submit(3)
+        other_job_id, _ = self.submit(1)
+        responses = fts3.bulk_query([job_id], self.fts.url)
+        assert_equal(responses[job_id], {})
+
+        sleep(1)
+        responses = fts3.bulk_query([job_id, other_job_id, generate_uuid()], self.fts.url)
+        assert_equal(len(responses), 3)
+        assert_equal(sorted(responses[job_id].keys()), sorted(file['metadata']['request_id'] for file in files))
+        for response in responses[job_id].values():
+            assert_equal(response['file_state'], 'FINISHED')
+            assert_equal(response['external_host'], self.fts.url)
+        assert_equal(len(responses[other_job_id]), 1)
+        assert_in(None, responses.values())
+        assert_equal(self.fts.stats()['FINISHED'], 4)
+
+    def test_failures_and_cancel(self):
+        """ FAKE FTS3 (DAEMONS): Transfers fail with the failure rate and jobs can be cancelled """
+        self.fts.failure_rate = 1
+        job_id, _ = self.submit(2)
+        sleep(1)
+        for response in fts3.bulk_query([job_id], self.fts.url)[job_id].values():
+            assert_equal(response['file_state'], 'FAILED')
+            assert_true(response['reason'])
+
+        self.fts.transfer_time = 60
+        job_id, _ = self.submit(2)
+        assert_equal(fts3.cancel(job_id, self.fts.url)['job_state'], 'CANCELED')
+
+        self.fts.submit_failure_rate = 1
+        job_id, _ = self.submit(1)
+        assert_is_none(job_id)
+        assert_equal(self.fts.stats()['submission_failures'], 1)
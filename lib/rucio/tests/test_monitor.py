@@ -9,6 +9,13 @@
 # - Luis Rodrigues, <luis.rodrigues@cern.ch>, 2013
 # - Martin Barisits, <martin.barisits@cern.ch>, 2017
 
+import os
+import socket
+
+from urllib2 import urlopen
+
+from nose.tools import assert_equal, assert_in, assert_not_in, assert_true
+
 from rucio.core import monitor
 
 
@@ -51,3 +58,62 @@ class TestMonitor(object):
         with monitor.record_timer_block(['test.context_timer', ('test.context_timer_normal10', 10)]):
             var_a = 2 * 100
             var_a = var_a * 1
+
+    @staticmethod
+    def test_flush_aggregates():
+        """MONITOR (CORE): Counters and timers are aggregated until the flush """
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        monitor.flush()
+        addr, monitor.CLIENT.addr = monitor.CLIENT.addr, receiver.getsockname()
+        try:
+            for _ in xrange(1000):
+                monitor.record_counter('test.aggregated_counter', 2)
+                monitor.record_timer('test.aggregated_timer', 3)
+            monitor.flush()
+            lines = []
+            while not any(line.endswith('aggregated_counter:2000|c') for line in lines):
+                lines.extend(receiver.recv(65536).split('\n'))
+            while len([line for line in lines if 'aggregated_timer' in line]) < monitor.TIMER_SAMPLES:
+                lines.extend(receiver.recv(65536).split('\n'))
+        finally:
+            monitor.CLIENT.addr = addr
+            receiver.close()
+        timers = [line for line in lines if 'aggregated_timer' in line]
+        assert_equal(len(timers), monitor.TIMER_SAMPLES)
+        assert_true(timers[0].endswith('|ms|@%f' % (monitor.TIMER_SAMPLES / 1000.0)))
+
+    @staticmethod
+    def test_fork_drops_pending():
+        """MONITOR (CORE): A forked process does not send the values aggregated by its parent """
+        monitor.record_counter('test.parent_counter')
+        pid, monitor.PID = monitor.PID, -1  # as in a process forked with the counter pending
+        try:
+            monitor.record_counter('test.child_counter')
+            with monitor.LOCK:
+                counters = dict(monitor.COUNTERS)
+            assert_not_in('test.parent_counter', counters)
+            assert_equal(monitor.PID, os.getpid())
+        finally:
+            monitor.PID = pid
+
+    @staticmethod
+    def test_prometheus_metrics():
+        """MONITOR (CORE): Counters, gauges and timers are served in the Prometheus format """
+        monitor.record_counter(['test.prometheus_counter', 'test.prometheus_counter'], 3)
+        monitor.record_gauge('test.prometheus_gauge', 7)
+        monitor.record_timer('test.prometheus_timer', 20)
+        monitor.record_timer('test.prometheus_timer', 20000)
+        server = monitor.start_metrics_server(ports=0, host='127.0.0.1')
+        try:
+            text = urlopen('http://127.0.0.1:%s/metrics' % server.server_address[1]).read().replace('%s_test' % monitor.SCOPE, 'rucio_test')
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert_in('# TYPE rucio_test_prometheus_counter counter\nrucio_test_prometheus_counter 6\n', text)
+        assert_in('rucio_test_prometheus_gauge 7\n', text)
+        assert_in('rucio_test_prometheus_timer_bucket{le="10"} 0\n', text)
+        assert_in('rucio_test_prometheus_timer_bucket{le="25"} 1\n', text)
+        assert_in('rucio_test_prometheus_timer_bucket{le="+Inf"} 2\n', text)
+        assert_in('rucio_test_prometheus_timer_sum 20020\nrucio_test_prometheus_timer_count 2\n', text)
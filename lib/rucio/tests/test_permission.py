@@ -13,10 +13,11 @@
 Test the Permission Core and API
 """
 
-from nose.tools import assert_true, assert_false
+from nose.tools import assert_equal, assert_true, assert_false
 
-from rucio.api.permission import has_permission
+from rucio.api.permission import has_permission, has_permissions
 from rucio.common.config import config_get
+from rucio.core.account import add_account_attribute, del_account_attribute
 from rucio.core.scope import add_scope
 from rucio.tests.common import scope_name_generator
 
@@ -68,3 +69,24 @@ class TestPermissionCoreApi(object):
         gsscred = 'ddmlab@CERN.CH'
         assert_true(has_permission(issuer='root', action='get_auth_token_gss', kwargs={'account': 'root', 'gsscred': gsscred}))
         assert_false(has_permission(issuer='root', action='get_auth_token_gss', kwargs={'account': self.usr, 'gsscred': gsscred}))
+
+    def test_permission_batch(self):
+        """ PERMISSION(CORE): Check permissions for a batch of items """
+        scope = scope_name_generator()
+        add_scope(scope=scope, account=self.usr)
+        other_scope = scope_name_generator()
+        add_scope(scope=other_scope, account='root')
+        kwargs_list = [{'attachments': [{'scope': s, 'name': 'dataset'}]} for s in (scope, other_scope, scope)]
+        assert_equal(has_permissions(issuer=self.usr, action='attach_dids_to_dids', kwargs_list=kwargs_list), [True, False, True])
+        assert_equal(has_permissions(issuer='root', action='attach_dids_to_dids', kwargs_list=kwargs_list), [True, True, True])
+        assert_equal(has_permissions(issuer=self.usr, action='attach_dids_to_dids', kwargs_list=[]), [])
+
+    def test_permission_cached_account_attributes(self):
+        """ PERMISSION(CORE): Check the cached account attributes are invalidated by their changes """
+        assert_false(has_permission(issuer=self.usr, action='add_rse', kwargs={'rse': 'MOCK'}))
+        add_account_attribute(account=self.usr, key='admin', value=True)
+        try:
+            assert_true(has_permission(issuer=self.usr, action='add_rse', kwargs={'rse': 'MOCK'}))
+        finally:
+            del_account_attribute(account=self.usr, key='admin')
+        assert_false(has_permission(issuer=self.usr, action='add_rse', kwargs={'rse': 'MOCK'}))
@@ -0,0 +1,80 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+
+from nose.tools import assert_equal, assert_in, assert_true
+
+from rucio.core import monitor, profiling
+
+
+class TestProfiling(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = profiling.DIRECTORY, profiling.FORMAT, profiling.ITERATIONS, profiling.SETUP
+        profiling.DIRECTORY = self.directory
+
+    def teardown(self):
+        profiling.DIRECTORY, profiling.FORMAT, profiling.ITERATIONS, profiling.SETUP = self.saved
+        shutil.rmtree(self.directory)
+
+    def test_sample_stacks(self):
+        """ PROFILING (CORE): The stacks of the other threads are sampled as collapsed stacks """
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(xrange(1000))
+
+        thread = threading.Thread(target=busy_loop, name='busy')
+        thread.start()
+        try:
+            path = profiling.sample_stacks(duration=0.2, interval=0.01)
+        finally:
+            stop.set()
+            thread.join()
+        with open(path) as f:
+            stacks = [line.rsplit(' ', 1) for line in f.read().splitlines()]
+        busy = [stack for stack, count in stacks if stack.startswith('busy;')]
+        assert_true(busy)
+        assert_true(any('busy_loop (%s' % __file__.replace('.pyc', '.py') in stack for stack in busy))
+        assert_true(all(int(count) > 0 for _, count in stacks))
+
+    def test_iterations(self):
+        """ PROFILING (CORE): Daemon iterations are timed, and profiled with cProfile on request """
+        profiling.ITERATIONS = True
+        profiling.FORMAT = 'pstats'
+        profiling.SETUP = True
+        thread = threading.current_thread()
+        executable = '/usr/bin/rucio-test-daemon --run-once'
+        profiling.iteration(executable, thread)
+        profiling.iteration(executable, thread)
+        assert_in('daemons.rucio-test-daemon.iteration.wall', monitor.HISTOGRAMS)
+        assert_in('daemons.rucio-test-daemon.iteration.cpu', monitor.HISTOGRAMS)
+        assert_equal(os.listdir(self.directory), [])
+
+        profiling.profile()
+        profiling.iteration(executable, thread)
+        sorted(xrange(1000))
+        profiling.iteration(executable, thread)
+        files = os.listdir(self.directory)
+        assert_equal(len(files), 1)
+        assert_true(files[0].endswith('.pstats'))
+        pstats.Stats(os.path.join(self.directory, files[0]))
+
+    def test_write_memory(self):
+        """ PROFILING (CORE): The memory snapshot lists the objects by type without tracemalloc """
+        path = profiling.write_memory()
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert_true(lines)
+        assert_in('dict', [line.split()[1] for line in lines])
@@ -22,20 +22,25 @@ from nose.tools import assert_equal, assert_in, assert_raises
 from paste.fixture import TestApp
 
 
-from rucio.db.sqla.constants import DIDType, ReplicaState
+from rucio.db.sqla.constants import DIDType, ReplicaState, DIDAvailability, LockState, OBSOLETE
 from rucio.client.baseclient import BaseClient
 from rucio.client.didclient import DIDClient
 from rucio.client.replicaclient import ReplicaClient
 from rucio.common.config import config_get
 from rucio.common.exception import DataIdentifierNotFound, AccessDenied, UnsupportedOperation
 from rucio.common.utils import generate_uuid
-from rucio.core.did import add_did, attach_dids, get_did, set_status, list_files, get_did_atime
+from rucio.core.account_limit import set_account_limit
+from rucio.core.did import add_did, attach_dids, get_did, get_metadata, set_status, list_files, get_did_atime
+from rucio.core.lock import get_replica_locks
 from rucio.core.replica import (add_replica, add_replicas, delete_replicas,
                                 update_replica_lock_counter, get_replica, list_replicas,
                                 declare_bad_file_replicas, list_bad_replicas,
+                                list_bad_replicas_sources,
                                 update_replicas_paths, update_replica_state,
                                 get_replica_atime, touch_replica)
-from rucio.core.rse import add_rse, add_protocol
+from rucio.core.request import get_request_by_did
+from rucio.core.rse import add_rse, add_protocol, get_rse_id
+from rucio.core.rule import add_rule, update_rules_for_bad_replicas, update_rules_for_lost_replicas
 from rucio.daemons.necromancer import run
 from rucio.rse import rsemanager as rsemgr
 from rucio.tests.common import execute, rse_name_generator
@@ -332,6 +337,47 @@ class TestReplicaCore:
             assert_in('/i/prefer/the/wan', stdout)
             assert_in('/i/prefer/the/lan', stdout)
 
+    def test_bulk_recovery_of_bad_replicas(self):
+        """ REPLICA (CORE): Recover or mark as lost bad replicas in bulk """
+        tmp_scope = 'mock'
+        nbfiles = 4
+        rse_id = get_rse_id('MOCK')
+        set_account_limit('root', rse_id, -1)
+
+        files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1L, 'adler32': '0cc737eb', 'meta': {'events': 10}} for i in range(nbfiles)]
+        dsn = 'dataset_%s' % generate_uuid()
+        add_did(scope=tmp_scope, name=dsn, type=DIDType.DATASET, account='root')
+        attach_dids(scope=tmp_scope, name=dsn, rse='MOCK', dids=files, account='root')
+        add_rule(dids=[{'scope': tmp_scope, 'name': dsn}], account='root', copies=1, rse_expression='MOCK', grouping='DATASET',
+                 weight=None, lifetime=None, locked=False, subscription_id=None)
+
+        # Half of the files have another source
+        recoverable, lost = files[:2], files[2:]
+        add_replicas(rse='MOCK3', files=recoverable, account='root')
+        for f in files:
+            update_replica_state('MOCK', f['scope'], f['name'], ReplicaState.BAD)
+
+        sources = list_bad_replicas_sources([{'scope': f['scope'], 'name': f['name'], 'rse_id': rse_id} for f in files])
+        for f in recoverable:
+            assert_equal(sources[(f['scope'], f['name'], rse_id)], ['MOCK3'])
+        for f in lost:
+            assert_equal(sources[(f['scope'], f['name'], rse_id)], [])
+
+        update_rules_for_bad_replicas(replicas=recoverable, rse_id=rse_id)
+        update_rules_for_lost_replicas(replicas=lost, rse_id=rse_id)
+
+        for f in recoverable:
+            assert_equal(get_replica('MOCK', f['scope'], f['name'])['state'], ReplicaState.COPYING)
+            assert_equal([lock['state'] for lock in get_replica_locks(f['scope'], f['name'])], [LockState.REPLICATING])
+            assert_equal(get_request_by_did(f['scope'], f['name'], 'MOCK')['dest_rse_id'], rse_id)
+        for f in lost:
+            replica = get_replica('MOCK', f['scope'], f['name'])
+            assert_equal(replica['state'], ReplicaState.UNAVAILABLE)
+            assert_equal(replica['tombstone'], OBSOLETE)
+            assert_equal(replica['lock_cnt'], 0)
+            assert_equal(get_metadata(f['scope'], f['name'])['availability'], DIDAvailability.LOST)
+        assert_equal(sorted(f['name'] for f in list_files(tmp_scope, dsn)), sorted(f['name'] for f in recoverable))
+
 
 class TestReplicaClients:
 
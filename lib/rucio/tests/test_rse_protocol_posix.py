@@ -25,6 +25,7 @@ from uuid import uuid4 as uuid
 from nose.tools import raises
 
 from rucio.common import exception
+from rucio.common.utils import adler32
 from rucio.rse import rsemanager as mgr
 from rucio.tests.rsemgr_api_test import MgrTestCases
 
@@ -234,3 +235,38 @@ class TestRsePOSIX(object):
     def test_change_scope_mgr_ok_single_pfn(self):
         """POSIX (RSE/PROTOCOLS): Change the scope of a single file on storage using PFN (Success)"""
         self.mtc.test_change_scope_mgr_ok_single_pfn()
+
+    def test_get_mgr_segmented(self):
+        """POSIX (RSE/PROTOCOLS): Get a single file from storage in parallel byte ranges (Success)"""
+        rse_settings = mgr.get_rse_info(self.rse_id)
+        dest_dir = tempfile.mkdtemp()
+        segment_min_size, mgr.SEGMENT_MIN_SIZE = mgr.SEGMENT_MIN_SIZE, 300 * 1024
+        try:
+            lfn = {'name': '1_rse_remote_get.raw', 'scope': 'user.%s' % self.user, 'adler32': adler32(self.static_file), 'bytes': 1024 * 1024}
+            assert mgr.download(rse_settings, [lfn], dest_dir=dest_dir, segments=4)
+            assert adler32('%s/1_rse_remote_get.raw' % dest_dir) == lfn['adler32']
+        finally:
+            mgr.SEGMENT_MIN_SIZE = segment_min_size
+            shutil.rmtree(dest_dir)
+
+    @raises(exception.FileConsistencyMismatch)
+    def test_get_mgr_segmented_FileConsistencyMismatch(self):
+        """POSIX (RSE/PROTOCOLS): Get a single file from storage in parallel byte ranges (FileConsistencyMismatch)"""
+        rse_settings = mgr.get_rse_info(self.rse_id)
+        dest_dir = tempfile.mkdtemp()
+        try:
+            lfn = {'name': '2_rse_remote_get.raw', 'scope': 'user.%s' % self.user, 'adler32': '00000001', 'bytes': 1024 * 1024}
+            mgr.download(rse_settings, [lfn], dest_dir=dest_dir, segments=4)
+        finally:
+            shutil.rmtree(dest_dir)
+
+    def test_get_mgr_not_segmented(self):
+        """POSIX (RSE/PROTOCOLS): Get a single file from storage whole by default, whatever its recorded size (Success)"""
+        rse_settings = mgr.get_rse_info(self.rse_id)
+        dest_dir = tempfile.mkdtemp()
+        try:
+            lfn = {'name': '1_rse_remote_get.raw', 'scope': 'user.%s' % self.user, 'adler32': adler32(self.static_file), 'bytes': 1}
+            assert mgr.download(rse_settings, [lfn], dest_dir=dest_dir)
+            assert adler32('%s/1_rse_remote_get.raw' % dest_dir) == lfn['adler32']
+        finally:
+            shutil.rmtree(dest_dir)
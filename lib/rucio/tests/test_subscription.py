@@ -26,11 +26,11 @@ from rucio.client.didclient import DIDClient
 from rucio.common.exception import InvalidObject, SubscriptionNotFound, SubscriptionDuplicate
 from rucio.common.utils import generate_uuid as uuid
 from rucio.core.account_limit import set_account_limit
-from rucio.core.did import add_did, set_new_dids
+from rucio.core.did import add_did, set_new_dids, get_metadata
 from rucio.core.rse import add_rse, get_rse_id
-from rucio.core.rule import add_rule
+from rucio.core.rule import add_rule, list_rules
 from rucio.core.scope import add_scope
-from rucio.daemons.transmogrifier import run
+from rucio.daemons.transmogrifier import run, is_matching_subscription, SubscriptionMatcher
 from rucio.db.sqla.constants import DIDType
 from rucio.web.rest.authentication import APP as auth_app
 from rucio.web.rest.subscription import APP as subs_app
@@ -123,6 +123,66 @@ class TestSubscriptionCoreApi():
         for rule in list_subscription_rule_states(account='root', name=subscription_name):
             assert_equal(rule[3], 2)
 
+    def test_run_transmogrifier_bulk(self):
+        """ SUBSCRIPTION (DAEMON): Test the bulk rule creation of the transmogrifier """
+        tmp_scope = 'mock_' + uuid()[:8]
+        add_scope(tmp_scope, 'root')
+        set_account_limit('root', get_rse_id('MOCK'), -1)
+        set_account_limit('root', get_rse_id('MOCK2'), -1)
+        set_account_limit('root', get_rse_id('MOCK3'), -1)
+        dsns = ['dataset-%s' % uuid() for _ in range(3)]
+        for dsn in dsns:
+            add_did(scope=tmp_scope, name=dsn, type=DIDType.DATASET, account='root')
+        # A rule already exists for the last dataset, the bulk insertion fails and the DIDs are processed one by one
+        subid = add_subscription(name=uuid(), account='root', filter={'scope': [tmp_scope, ], 'pattern': 'dataset-.*'},
+                                 replication_rules=[{'rse_expression': 'MOCK', 'copies': 1, 'activity': 'Data Brokering'},
+                                                    {'rse_expression': 'MOCK2', 'copies': 1, 'activity': 'Data Brokering'}],
+                                 lifetime=None, retroactive=0, dry_run=0, comments='Ni ! Ni!', issuer='root')
+        subid2 = add_subscription(name=uuid(), account='root', filter={'scope': [tmp_scope, ], 'pattern': 'dataset-.*'},
+                                  replication_rules=[{'rse_expression': 'MOCK3', 'copies': 1, 'activity': 'Data Brokering'}],
+                                  lifetime=None, retroactive=0, dry_run=0, comments='Ni ! Ni!', issuer='root')
+        add_rule(dids=[{'scope': tmp_scope, 'name': dsns[-1]}], account='root', copies=1, rse_expression='MOCK3', grouping='DATASET', weight=None,
+                 lifetime=None, locked=False, subscription_id=subid2, comment='Ni ! Ni!', activity='Data Brokering')
+        run(threads=1, bulk=1000000, once=True)
+        for dsn in dsns:
+            rules = [rule for rule in list_rules(filters={'scope': tmp_scope, 'name': dsn}) if str(rule['subscription_id']) == str(subid)]
+            assert_equal(len(rules), 2)
+            rules = [rule for rule in list_rules(filters={'scope': tmp_scope, 'name': dsn}) if str(rule['subscription_id']) == str(subid2)]
+            assert_equal(len(rules), 1)
+            assert_equal(get_metadata(tmp_scope, dsn)['is_new'], None)
+
+
+class TestSubscriptionMatcher():
+
+    @classmethod
+    def setUpClass(cls):
+        filters = [{'project': ['data12_900GeV', 'data12_8TeV'], 'datatype': ['AOD', ]},
+                   {'scope': ['mc15_13TeV', 'user.*'], 'excluded_pattern': '.*_tid.*'},
+                   {'scope': ['data12'], 'datatype': 'ESD', 'pattern': r'.*physics_Muons.*'},
+                   {'project': ['data1.*'], 'stream_name': ['physics_Muons', 'express.*'], 'split_rule': 'true'},
+                   {'datatype': ['AOD', 'ESD'], 'events': [1000, ]},
+                   {'pattern': '(unbalanced'}]
+        cls.subscriptions = [{'id': str(i), 'name': 'sub%i' % i, 'filter': dumps(f)} for i, f in enumerate(filters)]
+        cls.dids = []
+        for scope in ['data12_8TeV', 'data12_900GeV', 'mc15_13TeV', 'user.jdoe', 'data13_8TeV']:
+            for datatype in ['AOD', 'ESD', 'AODX', None]:
+                for name in ['ds.physics_Muons.%s' % datatype, 'ds.express.%s_tid01' % datatype]:
+                    metadata = {'hidden': False, 'project': scope, 'datatype': datatype, 'stream_name': name.split('.')[1], 'events': 1000}
+                    cls.dids.append(({'scope': scope, 'name': name}, metadata))
+        cls.dids.append(({'scope': 'data12_8TeV', 'name': 'hidden.AOD'}, {'hidden': True, 'project': 'data12_8TeV', 'datatype': 'AOD'}))
+
+    def test_matcher_is_equivalent_to_is_matching_subscription(self):
+        """ SUBSCRIPTION (DAEMON): Test the precompiled subscription matcher """
+        valid_subscriptions = self.subscriptions[:-1]
+        matcher = SubscriptionMatcher(self.subscriptions)
+        assert_equal(matcher.unindexed, [1, 3])
+        nb_matches = 0
+        for did, metadata in self.dids:
+            expected = [sub for sub in valid_subscriptions if is_matching_subscription(sub, did, metadata)]
+            assert_equal(matcher.match(did, metadata), expected)
+            nb_matches += len(expected)
+        assert_true(nb_matches > 0)
+
 
 class TestSubscriptionRestApi():
 
@@ -11,8 +11,9 @@
 
 from datetime import datetime, timedelta
 
-from nose.tools import assert_not_equal
+from nose.tools import assert_equal, assert_not_equal, assert_raises
 
+from rucio.common.exception import DataIdentifierNotFound
 from rucio.common.utils import generate_uuid
 from rucio.core.account_limit import set_account_limit
 from rucio.core.did import add_dids, attach_dids, list_expired_dids, get_did
@@ -62,6 +63,54 @@ class TestUndertaker:
         for replica in replicas:
             assert_not_equal(get_replica(scope=replica['scope'], name=replica['name'], rse='MOCK')['tombstone'], None)
 
+    def test_undertaker_bulk(self):
+        """ UNDERTAKER (CORE): Test the undertaker in bulk mode. """
+        tmp_scope = 'mock'
+        nbdatasets = 5
+        nbfiles = 5
+
+        set_account_limit('jdoe', get_rse_id('MOCK'), -1)
+
+        dsns = [{'name': 'dsn_%s' % generate_uuid(),
+                 'scope': tmp_scope,
+                 'type': 'DATASET',
+                 'lifetime': -1,
+                 'rules': [{'account': 'jdoe', 'copies': 1,
+                            'rse_expression': 'MOCK',
+                            'grouping': 'DATASET'}]} for i in range(nbdatasets)]
+        add_dids(dids=dsns, account='root')
+
+        # One of the datasets is still attached to a container
+        container = 'container_%s' % generate_uuid()
+        add_dids(dids=[{'name': container, 'scope': tmp_scope, 'type': 'CONTAINER'}], account='root')
+        attach_dids(scope=tmp_scope, name=container, dids=[{'scope': tmp_scope, 'name': dsns[0]['name']}], account='root')
+
+        replicas = list()
+        for dsn in dsns:
+            files = [{'scope': tmp_scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 1L, 'adler32': '0cc737eb', 'tombstone': datetime.utcnow() + timedelta(weeks=2), 'meta': {'events': 10}} for i in range(nbfiles)]
+            attach_dids(scope=tmp_scope, name=dsn['name'], rse='MOCK', dids=files, account='root')
+            replicas += files
+
+        undertaker(worker_number=1, total_workers=1, chunk_size=1000, once=True, bulk=True)
+
+        for replica in replicas:
+            replica = get_replica(scope=replica['scope'], name=replica['name'], rse='MOCK')
+            assert_not_equal(replica['tombstone'], None)
+            assert_equal(replica['lock_cnt'], 0)
+
+        for dsn in dsns:
+            assert_equal(len([x for x in list_rules(filters={'scope': tmp_scope, 'name': dsn['name']})]), 0)
+
+        # Only the detached dataset is kept for the next cycle
+        assert_equal(get_did(scope=tmp_scope, name=dsns[0]['name'])['name'], dsns[0]['name'])
+        for dsn in dsns[1:]:
+            with assert_raises(DataIdentifierNotFound):
+                get_did(scope=tmp_scope, name=dsn['name'])
+
+        undertaker(worker_number=1, total_workers=1, chunk_size=1000, once=True, bulk=True)
+        with assert_raises(DataIdentifierNotFound):
+            get_did(scope=tmp_scope, name=dsns[0]['name'])
+
     def test_list_expired_dids_with_locked_rules(self):
         """ UNDERTAKER (CORE): Test that the undertaker does not list expired dids with locked rules"""
         tmp_scope = 'mock'
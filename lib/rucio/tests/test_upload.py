@@ -0,0 +1,100 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+import json
+
+from os import remove
+from os.path import basename
+
+from nose.tools import assert_equal, assert_false, assert_in, assert_raises
+
+from rucio.client.didclient import DIDClient
+from rucio.client.replicaclient import ReplicaClient
+from rucio.client.uploadclient import UploadClient
+from rucio.common.exception import NotAllFilesUploaded
+from rucio.common.utils import adler32, generate_uuid
+from rucio.core.account_limit import set_account_limit
+from rucio.core.rse import get_rse_id
+from rucio.db.sqla.constants import ReplicaState
+from rucio.rse import rsemanager as rsemgr
+from rucio.tests.common import file_generator
+
+
+class TestUploadClient:
+
+    def setup(self):
+        self.rse = 'MOCK4'
+        self.scope = 'mock'
+        self.did_client = DIDClient()
+        self.replica_client = ReplicaClient()
+        self.upload_client = UploadClient()
+        set_account_limit('root', get_rse_id(self.rse), -1)
+
+    def test_upload_pipelined(self):
+        """ UPLOAD (CLIENT): Upload files into a dataset with several threads """
+        files = [file_generator() for _ in range(5)]
+        dataset = 'dataset_%s' % generate_uuid()
+        summary_file_path = '/tmp/summary_%s.json' % generate_uuid()
+        sources = [{'path': path, 'rse': self.rse, 'did_scope': self.scope,
+                    'dataset_scope': self.scope, 'dataset_name': dataset} for path in files]
+        try:
+            self.upload_client.upload(sources, summary_file_path=summary_file_path, threads=3)
+
+            content = [did['name'] for did in self.did_client.list_content(self.scope, dataset)]
+            assert_equal(sorted(content), sorted(basename(path) for path in files))
+            replicas = self.replica_client.list_replicas([{'scope': self.scope, 'name': basename(path)} for path in files])
+            for replica in replicas:
+                assert_in(self.rse, replica['rses'])
+
+            with open(summary_file_path) as summary_file:
+                summary = json.load(summary_file)
+            assert_equal(len(summary), len(files))
+            for path in files:
+                entry = summary['%s:%s' % (self.scope, basename(path))]
+                assert_equal(entry['rse'], self.rse)
+                assert_equal(entry['adler32'], adler32(path))
+        finally:
+            for path in files:
+                remove(path)
+            remove(summary_file_path)
+
+    def test_upload_pipelined_existing_file(self):
+        """ UPLOAD (CLIENT): Register a file already on the RSE as available with several threads """
+        files = [file_generator() for _ in range(2)]
+        sources = [{'path': path, 'rse': self.rse, 'did_scope': self.scope} for path in files]
+        try:
+            # put the first file on the RSE without registering it
+            self.upload_client.upload([dict(sources[0], no_register=True)])
+
+            self.upload_client.upload(sources, threads=2)
+
+            replicas = self.replica_client.list_replicas([{'scope': self.scope, 'name': basename(path)} for path in files], all_states=True)
+            for replica in replicas:
+                assert_equal(replica['states'][self.rse], str(ReplicaState.AVAILABLE))
+        finally:
+            for path in files:
+                remove(path)
+
+    def test_upload_pipelined_registration_failure(self):
+        """ UPLOAD (CLIENT): Delete the files which could not be registered after the transfer with several threads """
+        files = [file_generator() for _ in range(2)]
+        sources = [{'path': path, 'rse': self.rse, 'did_scope': self.scope} for path in files]
+
+        def add_replicas(rse, files):
+            raise Exception('Catalog unavailable')
+
+        self.upload_client.client.add_replicas = add_replicas
+        try:
+            with assert_raises(NotAllFilesUploaded):
+                self.upload_client.upload(sources, threads=2)
+            rse_settings = rsemgr.get_rse_info(self.rse)
+            for path in files:
+                assert_false(rsemgr.exists(rse_settings, {'scope': self.scope, 'name': basename(path)}))
+        finally:
+            del self.upload_client.client.add_replicas
+            for path in files:
+                remove(path)
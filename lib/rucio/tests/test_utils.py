@@ -9,12 +9,15 @@
  - Frank Berghaus, <frank.berghaus@cern.ch>, 2018
 '''
 
+import hashlib
+import os
 import unittest
 import tempfile
+import zlib
 
-from nose.tools import assert_equal, assert_is_instance, assert_is_not_none
+from nose.tools import assert_equal, assert_is_instance, assert_is_not_none, assert_raises
 from re import match
-from rucio.common.utils import md5
+from rucio.common.utils import adler32, adler32_combine, calculate_checksums, calculate_checksums_parallel, md5
 
 
 class TestUtils(unittest.TestCase):
@@ -37,3 +40,41 @@ class TestUtils(unittest.TestCase):
         assert_is_not_none(match('[a-fA-F0-9]{32}', ret), msg="String returned by utils.md5 is not a md5 hex digest")
         assert_equal(ret, '31d50dd6285b9ff9f8611d0762265d04',
                      msg="Hex digest returned by utils.md5 is the MD5 checksum")
+
+    def test_utils_calculate_checksums(self):
+        """(COMMON/UTILS): test calculating several checksums of a file in one pass"""
+        data = os.urandom(1024 * 1024 + 17)
+        with tempfile.NamedTemporaryFile() as binary_file:
+            binary_file.write(data)
+            binary_file.flush()
+            expected = {'adler32': '%08x' % (zlib.adler32(data) & 0xffffffff),
+                        'md5': hashlib.md5(data).hexdigest(),
+                        'sha256': hashlib.sha256(data).hexdigest()}
+            for block_size in (4096, 1000, 8 * 1024 * 1024):
+                assert_equal(calculate_checksums(binary_file.name, algorithms=('adler32', 'md5', 'sha256'), block_size=block_size), expected)
+            assert_equal(adler32(binary_file.name), expected['adler32'])
+            assert_equal(md5(binary_file.name), expected['md5'])
+            with assert_raises(ValueError):
+                calculate_checksums(binary_file.name, algorithms=('crc32', ))
+
+    def test_utils_calculate_checksums_parallel(self):
+        """(COMMON/UTILS): test calculating the checksums of several files at once"""
+        files = [tempfile.NamedTemporaryFile() for _ in range(5)]
+        try:
+            for i, temp_file in enumerate(files):
+                temp_file.write('file %s\n' % i)
+                temp_file.flush()
+            checksums = calculate_checksums_parallel([temp_file.name for temp_file in files], threads=3)
+            for temp_file in files:
+                assert_equal(checksums[temp_file.name], calculate_checksums(temp_file.name))
+        finally:
+            for temp_file in files:
+                temp_file.close()
+
+    def test_utils_adler32_combine(self):
+        """(COMMON/UTILS): test combining the adler32 checksums of consecutive blocks"""
+        data = os.urandom(200000)
+        for split in (0, 1, 65521, 100000, 200000):
+            head, tail = data[:split], data[split:]
+            assert_equal(adler32_combine(zlib.adler32(head) & 0xffffffff, zlib.adler32(tail) & 0xffffffff, len(tail)),
+                         zlib.adler32(data) & 0xffffffff)
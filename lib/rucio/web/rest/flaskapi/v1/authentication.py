@@ -17,7 +17,7 @@ from re import search
 from traceback import format_exc
 
 from rucio.api.authentication import get_auth_token_user_pass, get_auth_token_gss, get_auth_token_x509, get_auth_token_ssh, get_ssh_challenge_token, validate_auth_token
-from rucio.common.exception import AccessDenied, IdentityError, RucioException
+from rucio.common.exception import AccessDenied, IdentityError, RucioException, ServiceUnavailable
 from rucio.common.utils import generate_http_error_flask
 
 from flask import Flask, Blueprint, request, Response
@@ -488,7 +488,10 @@ class Validate(MethodView):
 
         token = request.environ.get('HTTP_X_RUCIO_AUTH_TOKEN')
 
-        result = validate_auth_token(token)
+        try:
+            result = validate_auth_token(token)
+        except ServiceUnavailable, e:
+            return generate_http_error_flask(503, e.__class__.__name__, e.args[0][0])
         if not result:
             return generate_http_error_flask(401, 'CannotAuthenticate', 'Cannot authenticate to account %(account)s with given credentials' % locals())
 
@@ -16,8 +16,11 @@ from time import time
 from traceback import format_exc
 
 from rucio.api.authentication import validate_auth_token
-from rucio.common.exception import RucioException
+from rucio.common.exception import RucioException, ServiceUnavailable
 from rucio.common.utils import generate_http_error_flask, generate_uuid
+from rucio.core.profiling import setup as setup_profiling
+
+setup_profiling()
 
 
 def before_request():
@@ -28,6 +31,8 @@ def before_request():
 
     try:
         auth = validate_auth_token(auth_token)
+    except ServiceUnavailable, e:
+        return generate_http_error_flask(503, e.__class__.__name__, e.args[0][0])
     except RucioException, e:
         return generate_http_error_flask(500, e.__class__.__name__, e.args[0][0])
     except Exception, e:
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+from flask import Flask, Blueprint, Response
+from flask.views import MethodView
+
+from rucio.core.monitor import CONTENT_TYPE, prometheus_text
+
+
+class Metrics(MethodView):
+    '''
+    Metrics class
+    '''
+
+    def get(self):
+        """
+        Retrieve the counters, gauges and timers of this server process.
+
+        .. :quickref: Metrics; Prometheus metrics.
+
+        **Example request**:
+
+        .. sourcecode:: http
+
+            GET /metrics HTTP/1.1
+            Host: rucio-server.com
+
+        **Example response**:
+
+        .. sourcecode:: http
+
+            HTTP/1.1 200 OK
+            Content-Type: text/plain; version=0.0.4; charset=utf-8
+
+            # TYPE rucio_core_db_replays counter
+            rucio_core_db_replays 2
+
+        :status 200: OK.
+        :returns: The metrics in the Prometheus text format.
+        """
+        return Response(prometheus_text(), content_type=CONTENT_TYPE)
+
+
+# ----------------------
+#   Web service startup
+# ----------------------
+bp = Blueprint('metrics', __name__)
+
+metrics_view = Metrics.as_view('metrics')
+bp.add_url_rule('/', view_func=metrics_view, methods=['get', ])
+
+application = Flask(__name__)
+application.register_blueprint(bp)
+
+
+def make_doc():
+    """ Only used for sphinx documentation to add the prefix """
+    doc_app = Flask(__name__)
+    doc_app.register_blueprint(bp, url_prefix='/metrics')
+    return doc_app
+
+
+if __name__ == "__main__":
+    application.run()
@@ -19,7 +19,7 @@ from traceback import format_exc
 from web import application, ctx, OK, BadRequest, header, InternalError
 
 from rucio.api.authentication import get_auth_token_user_pass, get_auth_token_gss, get_auth_token_x509, get_auth_token_ssh, get_ssh_challenge_token, validate_auth_token
-from rucio.common.exception import AccessDenied, IdentityError, RucioException
+from rucio.common.exception import AccessDenied, IdentityError, RucioException, ServiceUnavailable
 from rucio.common.utils import generate_http_error
 from rucio.web.rest.common import RucioController
 
@@ -456,7 +456,10 @@ class Validate(RucioController):
 
         token = ctx.env.get('HTTP_X_RUCIO_AUTH_TOKEN')
 
-        result = validate_auth_token(token)
+        try:
+            result = validate_auth_token(token)
+        except ServiceUnavailable, e:
+            raise generate_http_error(503, e.__class__.__name__, e.args[0][0])
         if not result:
             raise generate_http_error(401, 'CannotAuthenticate', 'Cannot authenticate to account %(account)s with given credentials' % locals())
 
@@ -20,9 +20,12 @@ from web import BadRequest, ctx, data, header, InternalError
 from web.webapi import Created, HTTPError, OK, seeother
 
 from rucio.api.authentication import validate_auth_token
-from rucio.common.exception import RucioException
+from rucio.common.exception import RucioException, ServiceUnavailable
 from rucio.common.utils import generate_http_error, generate_uuid
 from rucio.core.monitor import record_timer
+from rucio.core.profiling import setup as setup_profiling
+
+setup_profiling()
 
 
 def rucio_loadhook():
@@ -47,6 +50,8 @@ def rucio_loadhook():
     auth_token = ctx.env.get('HTTP_X_RUCIO_AUTH_TOKEN')
     try:
         auth = validate_auth_token(auth_token)
+    except ServiceUnavailable, e:
+        raise generate_http_error(503, e.__class__.__name__, e.args[0][0])
     except RucioException, e:
         raise generate_http_error(500, e.__class__.__name__, e.args[0][0])
     except Exception, e:
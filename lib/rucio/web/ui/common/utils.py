@@ -17,6 +17,7 @@ from rucio import version
 from rucio.api import authentication, identity
 from rucio.api.account import get_account_info, list_account_attributes
 from rucio.common.config import config_get
+from rucio.common.exception import ServiceUnavailable
 from rucio.db.sqla.constants import AccountType
 
 
@@ -76,7 +77,10 @@ def check_token(rendered_tpl):
 
     # try to get and check the rucio session token from cookie
     session_token = cookies().get('x-rucio-auth-token')
-    validate_token = authentication.validate_auth_token(session_token)
+    try:
+        validate_token = authentication.validate_auth_token(session_token)
+    except ServiceUnavailable:
+        return render.problem("Too many requests are being authenticated at the moment. Please reload the page in a few seconds.")
 
     # check if ui_account param is set and if yes, force new token
     if ui_account:
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Simulate the churn of daemon work partitions when threads join and die.
+
+Compares the row number assignment of heartbeat.live, where a key belongs to
+thread hash(key) % nr_threads, with the consistent hash ring of heartbeat.HashRing.
+For every membership change the fraction of keys changing owner is reported,
+together with the imbalance (largest partition / average partition).
+"""
+
+import argparse
+import hashlib
+import random
+import time
+
+from rucio.core.heartbeat import HashRing, _ring_hash
+
+
+def modulo_assignment(nodes, keys):
+    """ Owner of every key with the row number assignment """
+    nodes = sorted(nodes)
+    return dict((key, nodes[_ring_hash(key) % len(nodes)]) for key in keys)
+
+
+def ring_assignment(nodes, keys, vnodes):
+    """ Owner of every key with the hash ring """
+    ring = HashRing(nodes, vnodes=vnodes)
+    return dict((key, ring.get_node(key)) for key in keys)
+
+
+def imbalance(assignment, nodes):
+    """ Largest partition relative to the average partition """
+    sizes = dict((node, 0) for node in nodes)
+    for node in assignment.values():
+        sizes[node] += 1
+    return max(sizes.values()) / (float(len(assignment)) / len(nodes))
+
+
+def moved(before, after):
+    """ Fraction of keys with a different owner """
+    return sum(1 for key in before if before[key] != after[key]) / float(len(before))
+
+
+def simulate(threads, keys, events, vnodes, seed):
+    rng = random.Random(seed)
+    keys = [hashlib.sha1(str(i)).hexdigest() for i in xrange(keys)]
+    nodes = ['host%s:%s:%s' % (i % 4, 1000 + i, i) for i in xrange(threads)]
+    next_node = threads
+
+    totals = {'modulo': [0.0, 0.0, 0.0], 'ring': [0.0, 0.0, 0.0]}
+    before = {'modulo': modulo_assignment(nodes, keys), 'ring': ring_assignment(nodes, keys, vnodes)}
+
+    print '%-6s %-24s %8s %8s %10s %10s' % ('event', 'thread', 'modulo', 'ring', 'imb.mod', 'imb.ring')
+    for event in xrange(events):
+        if len(nodes) > 1 and rng.random() < 0.5:
+            node = nodes.pop(rng.randrange(len(nodes)))
+            kind = 'die'
+        else:
+            node = 'host%s:%s:%s' % (next_node % 4, 1000 + next_node, next_node)
+            next_node += 1
+            nodes.append(node)
+            kind = 'join'
+
+        row = []
+        for strategy in ('modulo', 'ring'):
+            start = time.time()
+            if strategy == 'modulo':
+                after = modulo_assignment(nodes, keys)
+            else:
+                after = ring_assignment(nodes, keys, vnodes)
+            totals[strategy][2] += time.time() - start
+            fraction = moved(before[strategy], after)
+            totals[strategy][0] += fraction
+            totals[strategy][1] += imbalance(after, nodes)
+            before[strategy] = after
+            row.append((fraction, imbalance(after, nodes)))
+        print '%-6s %-24s %7.1f%% %7.1f%% %10.2f %10.2f' % (kind, node, row[0][0] * 100, row[1][0] * 100, row[0][1], row[1][1])
+
+    print
+    for strategy in ('modulo', 'ring'):
+        moved_keys, mean_imbalance, duration = [total / events for total in totals[strategy]]
+        print '%-6s mean keys moved %5.1f%%, mean imbalance %.2f, %.3fs per assignment of %s keys' % (strategy, moved_keys * 100, mean_imbalance, duration, len(keys))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate the churn of daemon work partitions')
+    parser.add_argument('--threads', type=int, default=16, help='Initial number of live threads')
+    parser.add_argument('--keys', type=int, default=100000, help='Number of keys to partition')
+    parser.add_argument('--events', type=int, default=20, help='Number of threads joining or dying')
+    parser.add_argument('--vnodes', type=int, default=64, help='Positions of every thread on the hash ring')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the membership changes')
+    args = parser.parse_args()
+    simulate(args.threads, args.keys, args.events, args.vnodes, args.seed)
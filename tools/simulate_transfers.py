@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Simulate the transfer pipeline of the judge and conveyor daemons against a fake FTS3.
+
+Datasets with files at a source RSE get asynchronous rules to a destination
+RSE, whose fts attribute points to a fake FTS3 (rucio.daemons.mock.fts3),
+started in this process unless --fts is given. The judge-injector and the
+conveyor submitter, poller and finisher are then started as processes from
+bin/, as in production, with a copy of rucio.cfg pointing to the simulation
+database. Several processes of the same daemon share the work through their
+heartbeats, so --submitters, --pollers and --finishers show how the pipeline
+scales.
+
+Every --interval seconds the requests table is read, to follow the queue
+depths and the time every request spent in every state. The report gives the
+end-to-end requests per second, the latency of the transitions QUEUED ->
+SUBMITTED (submitter), SUBMITTED -> DONE/FAILED (FTS3 and poller) and
+DONE/FAILED -> archived (finisher), and the largest queues.
+
+By default everything runs in a new SQLite database in a temporary directory,
+with --dsn in the given database. The receiver is not simulated, the states
+of the transfers are only polled.
+"""
+
+import argparse
+import ConfigParser
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from rucio.common.config import config_add_section, config_has_section, config_set
+from rucio.common.utils import generate_uuid
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin')
+TRANSITIONS = (('QUEUED', 'SUBMITTED'), ('SUBMITTED', 'TERMINAL'), ('TERMINAL', 'ARCHIVED'), ('QUEUED', 'ARCHIVED'))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def write_config(directory, dsn):
+    """ Writes a copy of the rucio.cfg in use, with the simulation database and the mock scheme, to directory/etc """
+    configfiles = []
+    if 'RUCIO_HOME' in os.environ:
+        configfiles.append('%s/etc/rucio.cfg' % os.environ['RUCIO_HOME'])
+    configfiles.append('/opt/rucio/etc/rucio.cfg')
+    if 'VIRTUAL_ENV' in os.environ:
+        configfiles.append('%s/etc/rucio.cfg' % os.environ['VIRTUAL_ENV'])
+    configfile = [configfile for configfile in configfiles if os.path.exists(configfile)][0]
+
+    shutil.copytree(os.path.dirname(configfile), os.path.join(directory, 'etc'))
+    config = ConfigParser.RawConfigParser()
+    config.read(configfile)
+    for section, option, value in (('database', 'default', dsn), ('database', 'read_replicas', ''),
+                                   ('conveyor', 'scheme', 'mock'), ('conveyor', 'failover_scheme', 'mock')):
+        if not config.has_section(section):
+            config.add_section(section)
+        config.set(section, option, value)
+        if not config_has_section(section):
+            config_add_section(section)
+        config_set(section, option, value)
+    with open(os.path.join(directory, 'etc', 'rucio.cfg'), 'w') as f:
+        config.write(f)
+
+
+class Simulation(object):
+    """ Injects the load, runs the daemons and follows the requests """
+
+    def __init__(self, fts_url, datasets, files):
+        self.fts_url = fts_url
+        self.run = generate_uuid()[:8]
+        self.scope = 'sim_%s' % self.run
+        self.src = 'SIM_%s_SRC' % self.run.upper()
+        self.dst = 'SIM_%s_DST' % self.run.upper()
+        self.nr_datasets = datasets
+        self.nr_files = files
+        self.seen = {}        # request id -> {state: first time seen}
+        self.depths = {}      # state -> largest number of requests
+        self.last_states = {}
+        self.processes = []
+
+    def inject(self):
+        """ Adds the RSEs, the datasets and the asynchronous rules """
+        from rucio.core.account_limit import set_account_limit
+        from rucio.core.did import add_did, attach_dids
+        from rucio.core.distance import add_distance
+        from rucio.core.replica import add_replicas
+        from rucio.core.rse import add_protocol, add_rse, add_rse_attribute
+        from rucio.core.rule import add_rule
+        from rucio.core.scope import add_scope
+
+        add_scope(scope=self.scope, account='root')
+        rse_ids = []
+        for rse in (self.src, self.dst):
+            rse_id = add_rse(rse)
+            add_protocol(rse, {'scheme': 'mock', 'hostname': 'localhost', 'port': 17, 'prefix': '/simulation',
+                               'impl': 'rucio.rse.protocols.mock.Default',
+                               'domains': {'lan': {'read': 1, 'write': 1, 'delete': 1},
+                                           'wan': {'read': 1, 'write': 1, 'delete': 1, 'third_party_copy': 1}}})
+            add_rse_attribute(rse, 'fts', self.fts_url)
+            set_account_limit(account='root', rse_id=rse_id, bytes=-1)
+            rse_ids.append(rse_id)
+        add_distance(rse_ids[0], rse_ids[1], ranking=1)
+
+        for i in xrange(self.nr_datasets):
+            dataset = 'dataset_%s' % i
+            files = [{'scope': self.scope, 'name': '%s_file_%s' % (dataset, j), 'bytes': 1024, 'adler32': '0cc737eb'} for j in xrange(self.nr_files)]
+            add_replicas(rse=self.src, files=files, account='root')
+            add_did(scope=self.scope, name=dataset, type='DATASET', account='root')
+            attach_dids(scope=self.scope, name=dataset, dids=files, account='root')
+            add_rule(dids=[{'scope': self.scope, 'name': dataset}], account='root', copies=1, rse_expression=self.dst,
+                     grouping='DATASET', weight=None, lifetime=None, locked=False, subscription_id=None,
+                     activity='Simulation', asynchronous=True)
+
+    def start(self, directory, daemons, log_dir=None):
+        """ Starts every daemon script of (script, number of processes, arguments) """
+        env = dict(os.environ, RUCIO_HOME=directory)
+        if log_dir and not os.path.isdir(log_dir):
+            os.makedirs(log_dir)
+        for script, nr_processes, arguments in daemons:
+            path = os.path.join(BIN, script)
+            command = [sys.executable, path] if os.path.exists(path) else [script]
+            for i in xrange(nr_processes):
+                output = open(os.path.join(log_dir, '%s.%s.log' % (script, i)) if log_dir else os.devnull, 'w')
+                self.processes.append(subprocess.Popen(command + [str(argument) for argument in arguments], env=env,
+                                                       stdout=output, stderr=subprocess.STDOUT))
+
+    def stop(self, timeout=30):
+        """ Asks the daemons to stop, and kills the ones still running after timeout """
+        for process in self.processes:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        deadline = time.time() + timeout
+        for process in self.processes:
+            while process.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def observe(self):
+        """ Reads the requests, and remembers when every request was first seen in every state """
+        from rucio.db.sqla import models
+        from rucio.db.sqla.session import get_session
+
+        now = time.time()
+        session = get_session()
+        try:
+            states = dict((id, str(state)) for id, state in session.query(models.Request.id, models.Request.state).filter(models.Request.rule_id.isnot(None)))
+        finally:
+            session.remove()
+
+        depths = {}
+        for id, state in states.items():
+            depths[state] = depths.get(state, 0) + 1
+            seen = self.seen.setdefault(id, {'QUEUED': now})
+            seen.setdefault(state, now)
+            if state in ('DONE', 'FAILED'):
+                seen.setdefault('TERMINAL', now)
+        for id in self.last_states:
+            if id not in states:
+                self.seen[id].setdefault('ARCHIVED', now)
+                self.seen[id]['FINAL'] = self.last_states[id]
+        self.last_states = states
+        for state, depth in depths.items():
+            self.depths[state] = max(self.depths.get(state, 0), depth)
+        return depths
+
+    def simulate(self, interval, timeout):
+        """ Samples the requests until all of them are archived or timeout, returns the elapsed time """
+        start = time.time()
+        print '%8s %10s %10s %8s %8s %10s %10s' % ('time', 'QUEUED', 'SUBMITTED', 'DONE', 'FAILED', 'archived', 'daemons')
+        while time.time() - start < timeout:
+            time.sleep(interval)
+            depths = self.observe()
+            archived = sum(1 for seen in self.seen.values() if 'ARCHIVED' in seen)
+            running = sum(1 for process in self.processes if process.poll() is None)
+            print '%8.1f %10s %10s %8s %8s %10s %10s' % (time.time() - start, depths.get('QUEUED', 0), depths.get('SUBMITTED', 0),
+                                                         depths.get('DONE', 0), depths.get('FAILED', 0), archived, running)
+            if (self.seen and not depths) or not running:
+                break
+        return time.time() - start
+
+    def report(self, elapsed, fts_stats=None):
+        done = sum(1 for seen in self.seen.values() if seen.get('FINAL') == 'DONE')
+        failed = sum(1 for seen in self.seen.values() if seen.get('FINAL') == 'FAILED')
+        print
+        pending = sum(1 for seen in self.seen.values() if 'ARCHIVED' not in seen)
+        print 'Requests: %s seen, %s done, %s failed attempts, %s still in the pipeline' % (len(self.seen), done, failed, pending)
+        print 'End-to-end: %.1f requests/s done over %.1f s' % (done / elapsed if elapsed else 0, elapsed)
+        print
+        print '%-24s %8s %10s %10s %10s %10s' % ('transition', 'requests', 'mean s', 'p50 s', 'p95 s', 'max s')
+        for before, after in TRANSITIONS:
+            latencies = [seen[after] - seen[before] for seen in self.seen.values() if before in seen and after in seen]
+            if latencies:
+                print '%-24s %8s %10.2f %10.2f %10.2f %10.2f' % ('%s -> %s' % (before, after), len(latencies), sum(latencies) / len(latencies),
+                                                                 percentile(latencies, 0.5), percentile(latencies, 0.95), max(latencies))
+        print
+        print 'Largest queues: %s' % ', '.join('%s %s' % (state, depth) for state, depth in sorted(self.depths.items()))
+        if fts_stats:
+            print 'Fake FTS3: %s' % ', '.join('%s %s' % (key, value) for key, value in sorted(fts_stats.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the transfer pipeline against a fake FTS3')
+    parser.add_argument('--dsn', help='Database to use, by default a new SQLite database')
+    parser.add_argument('--fts', help='URL of a running fake FTS3, by default one is started in this process')
+    parser.add_argument('--datasets', type=int, default=10, help='Number of datasets to transfer')
+    parser.add_argument('--files', type=int, default=10, help='Number of files per dataset')
+    parser.add_argument('--submitters', type=int, default=1, help='Number of submitter processes')
+    parser.add_argument('--pollers', type=int, default=1, help='Number of poller processes')
+    parser.add_argument('--finishers', type=int, default=1, help='Number of finisher processes')
+    parser.add_argument('--bulk', type=int, default=100, help='Number of requests handled by every daemon pass')
+    parser.add_argument('--group-bulk', type=int, default=10, help='Number of files per FTS3 job')
+    parser.add_argument('--sleep-time', type=int, default=1, help='Seconds the daemons sleep when they have too little work')
+    parser.add_argument('--transfer-time', type=float, default=2, help='Average seconds of a transfer in the fake FTS3')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='Fraction of the transfers failing in the fake FTS3')
+    parser.add_argument('--submit-latency', type=float, default=0.0, help='Seconds taken by a submission to the fake FTS3')
+    parser.add_argument('--query-latency', type=float, default=0.0, help='Seconds taken by a query to the fake FTS3')
+    parser.add_argument('--submit-failure-rate', type=float, default=0.0, help='Fraction of the submissions failing in the fake FTS3')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the fake FTS3')
+    parser.add_argument('--interval', type=float, default=2, help='Seconds between two samples of the requests')
+    parser.add_argument('--timeout', type=float, default=300, help='Seconds after which the simulation stops')
+    parser.add_argument('--log-dir', help='Directory for the logs of the daemons, by default they are discarded')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='rucio_simulation_')
+    dsn = args.dsn or 'sqlite:///%s' % os.path.join(directory, 'rucio.db')
+    # The engine is created on first use, so the configuration can still be changed here
+    write_config(directory, dsn)
+
+    from rucio.daemons.mock.fts3 import FakeFTS3
+    from rucio.db.sqla import models
+    from rucio.db.sqla.session import get_engine
+    from rucio.db.sqla.util import create_root_account
+
+    # The core modules configure the logging on import and log every rule evaluation
+    logging.disable(logging.WARNING)
+
+    fts = None
+    simulation = None
+    try:
+        models.register_models(get_engine())
+        if not args.dsn:
+            create_root_account()
+        if args.fts:
+            fts_url = args.fts
+        else:
+            fts = FakeFTS3(transfer_time=args.transfer_time, failure_rate=args.failure_rate,
+                           submit_latency=args.submit_latency, query_latency=args.query_latency,
+                           submit_failure_rate=args.submit_failure_rate, seed=args.seed).start()
+            fts_url = fts.url
+        simulation = Simulation(fts_url, args.datasets, args.files)
+        simulation.inject()
+        simulation.start(directory, (('rucio-judge-injector', 1, []),
+                                     ('rucio-conveyor-submitter', args.submitters, ['--bulk', args.bulk, '--group-bulk', args.group_bulk,
+                                                                                    '--sleep-time', args.sleep_time]),
+                                     ('rucio-conveyor-poller', args.pollers, ['--older-than', 0, '--fts-bulk', args.bulk, '--db-bulk', args.bulk,
+                                                                              '--sleep-time', args.sleep_time]),
+                                     ('rucio-conveyor-finisher', args.finishers, ['--bulk', args.bulk, '--db-bulk', args.bulk,
+                                                                                  '--sleep-time', args.sleep_time])),
+                         log_dir=args.log_dir)
+        elapsed = simulation.simulate(args.interval, args.timeout)
+        simulation.report(elapsed, fts.stats() if fts else None)
+    finally:
+        if simulation:
+            simulation.stop()
+        if fts:
+            fts.stop()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()